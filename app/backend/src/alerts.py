@@ -0,0 +1,443 @@
+"""Price alerts stored in SQLite and matched against listings diffs through sorted threshold indexes."""
+import logging
+import sqlite3
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ThreadPoolExecutor
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .database import ThreadConnections, open_database
+from .diff import SnapshotDiff
+from .market import MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Alert kinds
+ABOVE = "above"    # price at or above the threshold
+BELOW = "below"    # price at or below the threshold
+CHANGE = "change"  # price change over a period of at least the threshold, in percent, either way
+ALERT_KINDS: Tuple[str, ...] = (ABOVE, BELOW, CHANGE)
+
+# Periods of change alerts and the listings columns holding them
+CHANGE_PERIODS: Dict[str, str] = {
+    "1h": "percent_change_1h",
+    "24h": "percent_change_24h",
+    "7d": "percent_change_7d",
+}
+
+# Seconds deletions are logged for a matching worker to catch up with; one
+# that has not matched for half of it reloads every alert instead
+_DELETION_LOG_RETENTION = 86400
+
+# Most bound parameters per SQLite statement
+_SQL_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    coin_id INTEGER NOT NULL,
+    convert TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    period TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alerts_by_user ON alerts (user_id);
+CREATE TABLE IF NOT EXISTS deleted_alerts (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id INTEGER NOT NULL,
+    coin_id INTEGER NOT NULL,
+    convert TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    period TEXT,
+    deleted_at REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS log_deleted_alert AFTER DELETE ON alerts BEGIN
+    INSERT INTO deleted_alerts (alert_id, coin_id, convert, kind, threshold, period, deleted_at)
+    VALUES (old.id, old.coin_id, old.convert, old.kind, old.threshold, old.period, julianday('now') * 86400 - 210866760000);
+END;
+CREATE TABLE IF NOT EXISTS notifications (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    alert_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    coin_id INTEGER NOT NULL,
+    convert TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    threshold REAL NOT NULL,
+    period TEXT,
+    symbol TEXT,
+    value REAL,
+    fired_at REAL NOT NULL
+);
+"""
+
+_ALERT_COLUMNS = "id, user_id, coin_id, convert, kind, threshold, period, created_at"
+
+
+class Alert(NamedTuple):
+    """One user's alert on one coin."""
+    id: int
+    user_id: int
+    coin_id: int
+    convert: str
+    kind: str
+    threshold: float
+    period: Optional[str]
+    created_at: float
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+
+def validate_alert(kind: str, threshold: float, period: Optional[str]) -> Optional[str]:
+    """Check an alert's condition; return its period (None unless a change alert).
+
+    Raises:
+        ValueError: If the kind, threshold or period is invalid
+    """
+    if kind not in ALERT_KINDS:
+        raise ValueError(f"Unknown alert kind: {kind}. Choose from {', '.join(ALERT_KINDS)}")
+    if not threshold > 0 or threshold == float("inf"):
+        raise ValueError("threshold must be a positive number")
+    if kind != CHANGE:
+        return None
+    period = period or "1h"
+    if period not in CHANGE_PERIODS:
+        raise ValueError(f"Unknown period: {period}. Choose from {', '.join(CHANGE_PERIODS)}")
+    return period
+
+
+class _ThresholdIndex:
+    """Alert IDs of one coin and condition, sorted by threshold.
+
+    Triggered alerts are a prefix or a suffix of the thresholds, found by
+    binary search and cut off in one slice, so matching costs
+    O(log n + triggered) however many alerts the coin has.
+    """
+
+    __slots__ = ("thresholds", "ids")
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entries: List[Tuple[float, int]]) -> None:
+        """Insert ``(threshold, alert_id)`` pairs."""
+        if len(entries) == 1:
+            threshold, alert_id = entries[0]
+            i = bisect_right(self.thresholds, threshold)
+            self.thresholds.insert(i, threshold)
+            self.ids.insert(i, alert_id)
+            return
+        # Many at once (e.g. loading the database): one sort rather than an insertion each
+        merged = list(zip(self.thresholds, self.ids))
+        merged.extend(entries)
+        merged.sort(key=itemgetter(0))
+        self.thresholds = [threshold for threshold, _ in merged]
+        self.ids = [alert_id for _, alert_id in merged]
+
+    def discard(self, threshold: float, alert_id: int) -> None:
+        i = bisect_left(self.thresholds, threshold)
+        while i < len(self.ids) and self.thresholds[i] == threshold:
+            if self.ids[i] == alert_id:
+                del self.thresholds[i], self.ids[i]
+                return
+            i += 1
+
+    def pop_up_to(self, value: float) -> List[int]:
+        """Remove and return the alerts with thresholds at or below ``value``."""
+        i = bisect_right(self.thresholds, value)
+        ids = self.ids[:i]
+        del self.thresholds[:i], self.ids[:i]
+        return ids
+
+    def pop_from(self, value: float) -> List[int]:
+        """Remove and return the alerts with thresholds at or above ``value``."""
+        i = bisect_left(self.thresholds, value)
+        ids = self.ids[i:]
+        del self.thresholds[i:], self.ids[i:]
+        return ids
+
+
+# Condition of an index: alert kind and period
+_Condition = Tuple[str, Optional[str]]
+
+
+class AlertEngine:
+    """Price alerts persisted in SQLite, matched at every listings refresh.
+
+    Every worker creates, lists and deletes alerts in the database; the
+    worker that refreshes matches them. It keeps a :class:`_ThresholdIndex`
+    per convert currency, condition and coin, brought up to date from the
+    database before each match: alerts created since (by ID) are added and
+    deletions, logged by a trigger, are removed. A match looks up the rows
+    of the indexed coins in the new snapshot at once and pops the triggered
+    alerts, so its cost follows the number of coins with alerts and the
+    number of alerts triggered, not the number of alerts.
+
+    Triggered alerts fire once: each is moved to the ``notifications``
+    outbox in one transaction, from which the bot delivers them. If that
+    transaction fails, the indexes are reloaded from the database before
+    the next match, so the alerts popped from them are matched again.
+
+    Matching runs on a thread of its own, with its own connection, so that
+    waiting for the database's write lock never stalls the event loop;
+    being a single thread, it also matches snapshots in order. The other
+    methods are called from request threads, each using a connection of
+    its own.
+    """
+
+    def __init__(self, path: str, max_per_user: int = 100):
+        self.path = path
+        self.max_per_user = max_per_user
+        self.fired = 0
+        self.matches = 0
+        self.errors = 0
+        self._connections = ThreadConnections(path, _SCHEMA)
+        self._match_db: Optional[sqlite3.Connection] = None
+        self._matcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="alert-matcher")
+        self._indexes: Dict[str, Dict[_Condition, Dict[int, _ThresholdIndex]]] = {}
+        self._indexed = 0
+        self._last_id = 0
+        self._last_deletion = 0
+        self._synced_at = 0.0
+        self._pruned_at = 0.0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """The calling thread's connection."""
+        return self._connections.get()
+
+    # Alerts, from any worker and thread; they block on the database, so not from the event loop
+
+    def create(
+        self,
+        user_id: int,
+        coin_id: int,
+        convert: str,
+        kind: str,
+        threshold: float,
+        period: Optional[str] = None
+    ) -> Alert:
+        """Save a new alert.
+
+        Raises:
+            ValueError: If the condition is invalid or the user has
+                ``max_per_user`` alerts already
+        """
+        period = validate_alert(kind, threshold, period)
+        if not convert.isalnum():
+            raise ValueError(f"Invalid convert currency: {convert!r}")
+        db = self.db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            (count,) = db.execute("SELECT COUNT(*) FROM alerts WHERE user_id = ?", (user_id,)).fetchone()
+            if count >= self.max_per_user:
+                raise ValueError(f"At most {self.max_per_user} alerts per user; delete one first")
+            created_at = time.time()
+            cursor = db.execute(
+                "INSERT INTO alerts (user_id, coin_id, convert, kind, threshold, period, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (user_id, coin_id, convert, kind, threshold, period, created_at)
+            )
+        return Alert(cursor.lastrowid, user_id, coin_id, convert, kind, threshold, period, created_at)
+
+    def user_alerts(self, user_id: int) -> List[Alert]:
+        """A user's alerts, oldest first."""
+        rows = self.db.execute(
+            f"SELECT {_ALERT_COLUMNS} FROM alerts WHERE user_id = ? ORDER BY id", (user_id,)
+        ).fetchall()
+        return [Alert(*row) for row in rows]
+
+    def delete(self, user_id: int, alert_id: int) -> bool:
+        """Delete one of a user's alerts; return whether it existed."""
+        with self.db as db:
+            cursor = db.execute("DELETE FROM alerts WHERE id = ? AND user_id = ?", (alert_id, user_id))
+        return cursor.rowcount > 0
+
+    def notifications(self, limit: int = 500) -> List[dict]:
+        """Fired alerts not yet acknowledged, oldest first."""
+        cursor = self.db.execute(
+            "SELECT seq, alert_id, user_id, coin_id, convert, kind, threshold, period, symbol, value, fired_at "
+            "FROM notifications ORDER BY seq LIMIT ?", (limit,)
+        )
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def acknowledge(self, up_to: int) -> int:
+        """Drop delivered notifications up to sequence number ``up_to``; return how many."""
+        with self.db as db:
+            cursor = db.execute("DELETE FROM notifications WHERE seq <= ?", (up_to,))
+        return cursor.rowcount
+
+    # Matching, on the refreshing worker
+
+    def on_diff(self, diff: SnapshotDiff) -> "Future[int]":
+        """Match alerts against a new listings snapshot on the matching thread."""
+        return self._matcher.submit(self._match_logged, diff.convert, diff.current)
+
+    def _match_logged(self, convert: str, snapshot: MarketSnapshot) -> int:
+        try:
+            return self.match(convert, snapshot)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"Matching {convert} alerts failed: {e}")
+            return 0
+
+    def match(self, convert: str, snapshot: MarketSnapshot) -> int:
+        """Fire every alert of ``convert`` whose condition ``snapshot`` meets; return how many fired.
+
+        Runs on the matching thread (see :meth:`on_diff`), whose connection it uses.
+
+        Raises:
+            sqlite3.Error: If the database cannot be read or the alerts not fired
+        """
+        if self._match_db is None:
+            self._match_db = open_database(self.path, _SCHEMA)
+        self._sync()
+        conditions = self._indexes.get(convert)
+        if not conditions:
+            return 0
+        self.matches += 1
+        candidates: List[int] = []
+        values: List[float] = []
+        for (kind, period), coins in conditions.items():
+            column = CHANGE_PERIODS[period] if kind == CHANGE else "price"
+            if not coins or not snapshot.has_column(column):
+                continue
+            coin_ids = np.fromiter(coins, dtype=np.int64, count=len(coins))
+            rows = snapshot.indices_of(coin_ids)
+            listed = rows >= 0
+            current = np.full(len(rows), np.nan)
+            current[listed] = snapshot.column(column)[rows[listed]]
+            levels = np.abs(current) if kind == CHANGE else current
+            for coin_id, value, level in zip(coin_ids.tolist(), current.tolist(), levels.tolist()):
+                if level != level:
+                    continue  # Not listed, or no value this time
+                index = coins[coin_id]
+                if kind == BELOW:
+                    ids = index.pop_from(level) if index.thresholds[-1] >= level else []
+                else:
+                    ids = index.pop_up_to(level) if index.thresholds[0] <= level else []
+                if ids:
+                    candidates.extend(ids)
+                    values.extend([value] * len(ids))
+                if not index:
+                    del coins[coin_id]
+        self._indexed -= len(candidates)
+        if not candidates:
+            return 0
+        try:
+            return self._fire(candidates, values, snapshot)
+        except sqlite3.Error:
+            # Popped from the indexes but still in the database: reload them before the next match
+            self._synced_at = 0.0
+            raise
+
+    def _fire(self, alert_ids: List[int], values: List[float], snapshot: MarketSnapshot) -> int:
+        """Move triggered alerts still in the database to the outbox, with the values that triggered them."""
+        value_of = dict(zip(alert_ids, values))
+        fired_at = time.time()
+        fired = 0
+        with self._match_db as db:
+            db.execute("BEGIN IMMEDIATE")
+            for i in range(0, len(alert_ids), _SQL_BATCH):
+                batch = alert_ids[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = db.execute(f"SELECT {_ALERT_COLUMNS} FROM alerts WHERE id IN ({marks})", batch).fetchall()
+                if not rows:
+                    continue  # Deleted meanwhile
+                db.execute(f"DELETE FROM alerts WHERE id IN ({marks})", batch)
+                alerts = [Alert(*row) for row in rows]
+                symbols = snapshot.column("symbol")[snapshot.indices_of([alert.coin_id for alert in alerts])]
+                db.executemany(
+                    "INSERT INTO notifications "
+                    "(alert_id, user_id, coin_id, convert, kind, threshold, period, symbol, value, fired_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (alert.id, alert.user_id, alert.coin_id, alert.convert, alert.kind,
+                         alert.threshold, alert.period, symbol, value_of[alert.id], fired_at)
+                        for alert, symbol in zip(alerts, symbols.tolist())
+                    ]
+                )
+                fired += len(rows)
+        self.fired += fired
+        if fired:
+            logger.info(f"{fired} price alerts fired")
+        return fired
+
+    def _sync(self) -> None:
+        """Bring the indexes up to date with the alerts created and deleted since the last match."""
+        db = self._match_db
+        now = time.time()
+        if now - self._synced_at > _DELETION_LOG_RETENTION / 2:
+            # Never synced, or deletions since may be pruned soon: start over
+            self._indexes.clear()
+            self._indexed = 0
+            self._last_id = 0
+            (self._last_deletion,) = db.execute("SELECT COALESCE(MAX(seq), 0) FROM deleted_alerts").fetchone()
+        if now - self._pruned_at > 3600:
+            with db:
+                db.execute("DELETE FROM deleted_alerts WHERE deleted_at < ?", (now - _DELETION_LOG_RETENTION,))
+            self._pruned_at = now
+
+        added: Dict[Tuple[str, str, Optional[str], int], List[Tuple[float, int]]] = {}
+        rows = db.execute(
+            "SELECT id, coin_id, convert, kind, threshold, period FROM alerts WHERE id > ? ORDER BY id",
+            (self._last_id,)
+        )
+        for alert_id, coin_id, convert, kind, threshold, period in rows:
+            added.setdefault((convert, kind, period, coin_id), []).append((threshold, alert_id))
+            self._last_id = alert_id
+        for (convert, kind, period, coin_id), entries in added.items():
+            coins = self._indexes.setdefault(convert, {}).setdefault((kind, period), {})
+            index = coins.get(coin_id)
+            if index is None:
+                index = coins[coin_id] = _ThresholdIndex()
+            index.add(entries)
+            self._indexed += len(entries)
+
+        rows = db.execute(
+            "SELECT seq, alert_id, coin_id, convert, kind, threshold, period FROM deleted_alerts "
+            "WHERE seq > ? ORDER BY seq",
+            (self._last_deletion,)
+        )
+        for seq, alert_id, coin_id, convert, kind, threshold, period in rows:
+            coins = self._indexes.get(convert, {}).get((kind, period))
+            index = coins.get(coin_id) if coins is not None else None
+            if index is not None:
+                before = len(index)
+                index.discard(threshold, alert_id)
+                self._indexed -= before - len(index)
+                if not index:
+                    del coins[coin_id]
+            self._last_deletion = seq
+        self._synced_at = now
+
+    def _close_match_db(self) -> None:
+        if self._match_db is not None:
+            self._match_db.close()
+            self._match_db = None
+
+    def close(self) -> None:
+        """Finish pending matches and close the connections."""
+        # The matching connection may only be closed on its own thread
+        self._matcher.submit(self._close_match_db).result()
+        self._connections.close()
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "indexed": self._indexed,
+            "matches": self.matches,
+            "fired": self.fired,
+            "errors": self.errors,
+        }
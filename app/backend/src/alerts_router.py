@@ -0,0 +1,141 @@
+"""Endpoints managing price alerts and handing fired ones to the bot."""
+import logging
+
+from fastapi import APIRouter, HTTPException, Path, Query
+
+from . import cmc_client
+from .http_client import HTTPClientError
+from .models import AlertCreate, ErrorResponse, NotificationAck
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix='/alerts',
+    tags=["Alerts"]
+)
+
+
+def _engine():
+    if cmc_client.alert_engine is None:
+        raise HTTPException(status_code=404, detail="Price alerts are disabled")
+    return cmc_client.alert_engine
+
+
+@router.post(
+    "",
+    summary="Create Price Alert",
+    description=(
+        "Alert a user once when a coin's price reaches a level (`above`, `below`) or moves by at "
+        "least `threshold` percent over `period` (`change`). Alerts are checked at every listings refresh."
+    ),
+    responses={
+        200: {"description": "The new alert and the coin's current price"},
+        400: {"model": ErrorResponse, "description": "Invalid alert, unlisted coin or too many alerts"},
+        404: {"model": ErrorResponse, "description": "Price alerts are disabled"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def create_alert(alert: AlertCreate):
+    """Create a price alert."""
+    _engine()
+    try:
+        logger.info(f"Creating {alert.kind} alert on ID {alert.coin_id} for user {alert.user_id}")
+        return await cmc_client.create_alert(
+            alert.user_id, alert.coin_id, alert.kind.lower(), alert.threshold,
+            period=alert.period, convert=alert.convert
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPClientError as e:
+        logger.error(f"Error creating alert: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in create_alert: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.get(
+    "",
+    summary="List Price Alerts",
+    description="The alerts of one user that have not fired yet, oldest first.",
+    responses={
+        200: {"description": "The user's alerts"},
+        404: {"model": ErrorResponse, "description": "Price alerts are disabled"}
+    }
+)
+def list_alerts(
+    user_id: int = Query(..., description="Telegram chat ID of the alerts' owner")
+):
+    """List a user's price alerts."""
+    alerts = _engine().user_alerts(user_id)
+    return {
+        "data": [alert.to_dict() for alert in alerts],
+        "count": len(alerts)
+    }
+
+
+@router.get(
+    "/notifications",
+    summary="Get Fired Alerts",
+    description=(
+        "Alerts that fired and were not acknowledged yet, oldest first. The bot delivers them, "
+        "then acknowledges them up to the last `seq` delivered."
+    ),
+    responses={
+        200: {"description": "Fired alerts with the value that triggered them"},
+        404: {"model": ErrorResponse, "description": "Price alerts are disabled"}
+    }
+)
+def get_notifications(
+    limit: int = Query(
+        default=500,
+        ge=1,
+        le=5000,
+        description="Maximum number of notifications (1-5000)"
+    )
+):
+    """Get fired alerts awaiting delivery."""
+    notifications = _engine().notifications(limit)
+    return {
+        "data": notifications,
+        "count": len(notifications)
+    }
+
+
+@router.post(
+    "/notifications/ack",
+    summary="Acknowledge Fired Alerts",
+    description="Drop the notifications up to and including sequence number `up_to` once delivered.",
+    responses={
+        200: {"description": "Number of notifications dropped"},
+        404: {"model": ErrorResponse, "description": "Price alerts are disabled"}
+    }
+)
+def acknowledge_notifications(ack: NotificationAck):
+    """Acknowledge delivered notifications."""
+    return {"acknowledged": _engine().acknowledge(ack.up_to)}
+
+
+@router.delete(
+    "/{alert_id}",
+    summary="Delete Price Alert",
+    description="Delete one of a user's alerts.",
+    responses={
+        200: {"description": "The alert was deleted"},
+        404: {"model": ErrorResponse, "description": "No such alert, or price alerts are disabled"}
+    }
+)
+def delete_alert(
+    alert_id: int = Path(..., ge=1, description="ID of the alert"),
+    user_id: int = Query(..., description="Telegram chat ID of the alert's owner")
+):
+    """Delete a price alert."""
+    if not _engine().delete(user_id, alert_id):
+        raise HTTPException(status_code=404, detail=f"Alert {alert_id} not found")
+    return {"deleted": alert_id}
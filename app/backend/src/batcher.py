@@ -0,0 +1,97 @@
+"""Dataloader-style micro-batching of concurrent single-key loads."""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class MicroBatcher:
+    """Merge single-key loads arriving within a short window into one batch call.
+
+    ``batch_fn`` receives the distinct keys of a batch and returns a mapping
+    from key to value. A value that is an exception instance is raised to
+    the callers waiting on that key; keys missing from the mapping raise
+    ``KeyError``. A batch is dispatched ``window`` seconds after its first
+    key arrives, or as soon as it holds ``max_batch_size`` distinct keys.
+    """
+
+    def __init__(self, batch_fn: BatchFunction, window: float = 0.01, max_batch_size: int = 100):
+        self.batch_fn = batch_fn
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._dispatches: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.keys_loaded = 0
+
+    async def load(self, key: Hashable) -> Any:
+        """Load a single key as part of the next batch.
+
+        Args:
+            key: Key to load
+
+        Returns:
+            The value ``batch_fn`` produced for ``key``
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        """Load several keys, returning values or exceptions in key order."""
+        return await asyncio.gather(*(self.load(key) for key in keys), return_exceptions=True)
+
+    def _flush(self) -> None:
+        """Dispatch everything pending as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._dispatch(batch))
+        self._dispatches.add(task)
+        task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch: Dict[Hashable, List[asyncio.Future]]) -> None:
+        keys = list(batch)
+        self.batches += 1
+        self.keys_loaded += len(keys)
+        logger.debug(f"Dispatching batch of {len(keys)} keys")
+        try:
+            results = await self.batch_fn(keys)
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for key, futures in batch.items():
+            value = results.get(key, KeyError(key))
+            for future in futures:
+                if future.done():
+                    continue
+                if isinstance(value, BaseException):
+                    future.set_exception(value)
+                else:
+                    future.set_result(value)
+
+    def stats(self) -> Dict[str, int]:
+        """Return batching counters for monitoring."""
+        return {
+            "batches": self.batches,
+            "keys_loaded": self.keys_loaded,
+            "pending": len(self._pending),
+        }
@@ -0,0 +1,135 @@
+"""In-process caching primitives with request coalescing."""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight task."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fetch`` for ``key`` unless a call for it is already in flight.
+
+        Args:
+            key: Identity of the call
+            fetch: Coroutine factory to run when nothing is in flight
+
+        Returns:
+            The result of the shared call
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+
+        # Shield the shared call so one cancelled caller does not cancel it for everyone
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        """Free the in-flight slot and mark the task's exception as retrieved."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+
+class TTLCache:
+    """Size-bounded TTL cache that coalesces concurrent misses.
+
+    Entries expire ``ttl`` seconds after they were stored and the least
+    recently used entry is evicted once ``max_size`` entries are held.
+    Concurrent callers that miss on the same key share a single in-flight
+    fetch instead of each starting their own.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 128):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting the oldest entries if full."""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            logger.debug(f"Evicted cache entry {evicted!r}")
+
+    def invalidate(self, key: Hashable = _MISSING) -> None:
+        """Drop ``key`` from the cache, or every entry if no key is given."""
+        if key is _MISSING:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    async def get_or_fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for ``key``, fetching it on a miss.
+
+        Args:
+            key: Cache key
+            fetch: Coroutine factory producing the value on a miss
+
+        Returns:
+            The cached or freshly fetched value
+
+        Raises:
+            Whatever ``fetch`` raises; failures are not cached.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return await self._flight.do(key, lambda: self._fetch(key, fetch))
+
+    async def _fetch(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Fetch a value and store it; failures are not cached."""
+        value = await fetch()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters for monitoring."""
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self._flight.coalesced,
+            "inflight": len(self._flight),
+        }
@@ -0,0 +1,299 @@
+"""Cache backends shared by API replicas, and snapshot loading through them."""
+import asyncio
+import logging
+import secrets
+import struct
+import time
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .codec import codec
+from .market import MarketSnapshot
+from .snapshot import Fetched
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Deletes a lock only if it still holds our token, so an expired lock taken over
+# by another replica is never released by the previous holder
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class CacheBackend:
+    """Byte values with expiry plus named locks, for caching across processes."""
+
+    # Whether other processes see the same entries
+    shared = False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        """Take lock ``name`` for at most ``ttl`` seconds without waiting.
+
+        Returns:
+            Token to release the lock with, or None if it is held elsewhere
+        """
+        raise NotImplementedError
+
+    async def release_lock(self, name: str, token: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {"backend": type(self).__name__}
+
+
+class MemoryBackend(CacheBackend):
+    """In-process backend: one replica, or tests."""
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._locks: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._values.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._values[key] = (time.monotonic() + ttl, value)
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        now = time.monotonic()
+        held = self._locks.get(name)
+        if held is not None and held[0] > now:
+            return None
+        token = secrets.token_hex(8)
+        self._locks[name] = (now + ttl, token)
+        return token
+
+    async def release_lock(self, name: str, token: str) -> None:
+        held = self._locks.get(name)
+        if held is not None and held[1] == token:
+            del self._locks[name]
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {"backend": "memory", "entries": len(self._values)}
+
+
+class RedisBackend(CacheBackend):
+    """Backend on any server speaking the Redis protocol (Redis, Valkey, KeyDB...).
+
+    Locks are ``SET NX PX`` keys holding a random token; they expire on
+    their own if the holder dies.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "crypto-tracker:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND_URL points to Redis but the redis package is not installed")
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._release = self._client.register_script(_RELEASE_SCRIPT)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float) -> None:
+        await self._client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def acquire_lock(self, name: str, ttl: float) -> Optional[str]:
+        token = secrets.token_hex(8)
+        acquired = await self._client.set(self.prefix + name, token, nx=True, px=max(1, int(ttl * 1000)))
+        return token if acquired else None
+
+    async def release_lock(self, name: str, token: str) -> None:
+        await self._release(keys=[self.prefix + name], args=[token])
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {"backend": "redis"}
+
+
+def get_backend(url: str) -> CacheBackend:
+    """Backend for a ``memory://`` or ``redis://`` / ``rediss://`` / ``unix://`` URL.
+
+    Raises:
+        ValueError: If the URL scheme is not supported
+    """
+    scheme = url.split("://", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryBackend()
+    if scheme in ("redis", "rediss", "unix"):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache backend URL: {url}")
+
+
+# Envelope of cached snapshot data: format, fetched_at, then the payload
+_ENVELOPE = struct.Struct("<Bd")
+_COLUMNAR = 1
+_JSON = 2
+
+
+def encode_data(data: Any, fetched_at: float) -> bytes:
+    """Binary encoding of snapshot data: MarketSnapshot's columnar layout, JSON otherwise."""
+    if isinstance(data, MarketSnapshot):
+        buffer = BytesIO()
+        buffer.write(_ENVELOPE.pack(_COLUMNAR, fetched_at))
+        data.write(buffer)
+        return buffer.getvalue()
+    return _ENVELOPE.pack(_JSON, fetched_at) + codec.dumps(data)
+
+
+def decode_data(value: bytes) -> Fetched:
+    """Inverse of :func:`encode_data`; a MarketSnapshot's numeric columns stay views into ``value``."""
+    kind, fetched_at = _ENVELOPE.unpack_from(value)
+    payload = memoryview(value)[_ENVELOPE.size:]
+    if kind == _COLUMNAR:
+        data, _ = MarketSnapshot.from_buffer(payload)
+    else:
+        data = codec.loads(bytes(payload))
+    return Fetched(data, fetched_at)
+
+
+class SharedLoader:
+    """Snapshot loader that lets one replica at a time refresh each key.
+
+    Data that another replica fetched less than ``fresh_for`` seconds ago is
+    taken from the backend. Otherwise the replica takes the key's lock and
+    calls ``loader``, publishing the result for ``ttl`` seconds; replicas
+    that find the lock taken wait for that result as long as the lock may
+    be held (``lock_ttl``) and only then load the key themselves. If the
+    backend is unreachable, keys are loaded locally.
+
+    Next to each value a small version key holds its ``fetched_at``.
+    Freshness checks and waiting replicas poll only that key, and fetch
+    the value, which for listings is megabytes, once it has changed.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        namespace: str,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        fresh_for: float,
+        ttl: float,
+        lock_ttl: float
+    ):
+        self.backend = backend
+        self.namespace = namespace
+        self.loader = loader
+        self.fresh_for = fresh_for
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.shared_hits = 0
+        self.loads = 0
+        self.waits = 0
+        self.errors = 0
+
+    def _key(self, key: Hashable) -> str:
+        parts = key if isinstance(key, tuple) else (key,)
+        return ":".join([self.namespace, *map(str, parts)])
+
+    async def _read(self, name: str) -> Optional[Fetched]:
+        try:
+            value = await self.backend.get(name)
+            return decode_data(value) if value is not None else None
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Reading {name} from the shared cache failed: {e}")
+            return None
+
+    async def _read_version(self, name: str) -> Optional[float]:
+        """``fetched_at`` of the value cached under ``name``, without fetching the value."""
+        try:
+            value = await self.backend.get(f"version:{name}")
+            return float(value) if value is not None else None
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Reading the version of {name} from the shared cache failed: {e}")
+            return None
+
+    async def __call__(self, key: Hashable) -> Any:
+        name = self._key(key)
+        version = await self._read_version(name)
+        if version is not None and time.time() - version < self.fresh_for:
+            cached = await self._read(name)
+            if cached is not None:
+                self.shared_hits += 1
+                return cached
+
+        seen_at = version or 0.0
+        token = await self._try_lock(name)
+        if token is None:
+            self.waits += 1
+            deadline = time.monotonic() + self.lock_ttl
+            while token is None and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+                version = await self._read_version(name)
+                if version is not None and version > seen_at:
+                    cached = await self._read(name)
+                    if cached is not None:
+                        self.shared_hits += 1
+                        return cached
+                    seen_at = version  # Value gone already: do not fetch it again for this version
+                # The holder failed or died: refresh the key here instead
+                token = await self._try_lock(name)
+            if token is None:
+                logger.warning(f"Gave up waiting for another replica to refresh {name}")
+
+        try:
+            data = await self.loader(key)
+            self.loads += 1
+            try:
+                fetched_at = time.time()
+                await self.backend.set(name, encode_data(data, fetched_at), self.ttl)
+                # Published after the value, so a replica that sees the version finds the value
+                await self.backend.set(f"version:{name}", repr(fetched_at).encode(), self.ttl)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Writing {name} to the shared cache failed: {e}")
+            return data
+        finally:
+            if token:
+                try:
+                    await self.backend.release_lock(f"lock:{name}", token)
+                except Exception as e:
+                    logger.warning(f"Releasing the lock on {name} failed: {e}")
+
+    async def _try_lock(self, name: str) -> Optional[str]:
+        try:
+            return await self.backend.acquire_lock(f"lock:{name}", self.lock_ttl)
+        except Exception as e:
+            # Without the backend, refresh locally rather than not at all
+            self.errors += 1
+            logger.warning(f"Locking {name} in the shared cache failed: {e}")
+            return ""
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "shared_hits": self.shared_hits,
+            "loads": self.loads,
+            "waits": self.waits,
+            "errors": self.errors,
+        }
@@ -9,6 +9,8 @@ def main() -> None:
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        # Reload mode runs a single process
+        workers=None if settings.DEBUG else settings.WORKERS,
         log_level=settings.LOG_LEVEL.lower(),
     )
 
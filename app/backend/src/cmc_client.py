@@ -1,40 +1,695 @@
 """CoinMarketCap API client module."""
+import asyncio
 import logging
-from .http_client import CMCHTTPClient
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .alerts import AlertEngine
+from .batcher import MicroBatcher
+from .cache import TTLCache
+from .cache_backend import SharedLoader, get_backend
+from .history import HistoryStore
+from .http_client import CMCHTTPClient, HTTPClientError, PoolConfig, listings_credits, quotes_credits
 from .config import settings
+from .diff import DiffEngine, SnapshotDiff
+from .indicators import IndicatorEngine
+from .market import MarketSnapshot
+from .portfolio import PortfolioStore, value_portfolio, watched_coins
+from .rate_limit import CreditBudget
+from .rollup import BAR_FIELDS, RollupPipeline
+from .resilience import CircuitBreaker, RetryPolicy
+from .scheduler import RefreshScheduler
+from .search import SymbolIndex
+from .shared import LEADER, SharedSnapshots
+from .snapshot import Snapshot, SnapshotRefresher, SnapshotStore
+from .stream import PriceBroadcaster
 
 logger = logging.getLogger(__name__)
 
+# Retry transient CMC failures, and stop calling CMC while it keeps failing
+cmc_breaker = CircuitBreaker(
+    name="CoinMarketCap",
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.CIRCUIT_RESET_TIMEOUT
+)
+cmc_retry_policy = RetryPolicy(
+    max_attempts=settings.UPSTREAM_MAX_ATTEMPTS,
+    base_delay=settings.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=settings.UPSTREAM_RETRY_MAX_DELAY
+)
+
+# Client-side rate limit and spend tracking of CMC credits
+credit_budget = CreditBudget(
+    per_minute=settings.CMC_CREDITS_PER_MINUTE,
+    per_day=settings.CMC_CREDITS_PER_DAY,
+    max_wait=settings.CMC_BUDGET_MAX_WAIT
+)
+
 # Initialize the CMC client with settings
 cmc_client = CMCHTTPClient(
     base_url=settings.CMC_BASE_URL,
-    api_key=settings.CMC_API_KEY
+    api_key=settings.CMC_API_KEY,
+    retry_policy=cmc_retry_policy,
+    breaker=cmc_breaker,
+    budget=credit_budget,
+    pool=PoolConfig.from_settings()
 )
 
+
+# Cache shared between API replicas, so one of them refreshes each snapshot
+cache_backend = get_backend(settings.CACHE_BACKEND_URL)
+shared_loaders: List[SharedLoader] = []
+
+
+def _shared(namespace: str, loader):
+    """Route a snapshot loader through the shared cache backend, if there is one."""
+    if not cache_backend.shared:
+        return loader
+    shared = SharedLoader(
+        cache_backend,
+        namespace=namespace,
+        loader=loader,
+        fresh_for=settings.CACHE_TTL,
+        ttl=settings.SNAPSHOT_MAX_STALENESS + settings.SNAPSHOT_STALE_IF_ERROR,
+        lock_ttl=settings.CACHE_LOCK_TTL
+    )
+    shared_loaders.append(shared)
+    return shared
+
+
+def _upstream_down(store_name: str) -> Callable[[Hashable], bool]:
+    """Whether a key of ``store_name`` cannot be refreshed, so its snapshot may be served stale."""
+    def down(key: Hashable) -> bool:
+        # A refresh put off by the daily budget leaves its snapshot to age just like an outage
+        return cmc_breaker.is_open or credit_budget.exhausted or refresh_scheduler.deferred(store_name, key)
+    return down
+
 logger.info(f"Initialized CMC client with base URL: {settings.CMC_BASE_URL}")
 
 
+async def _load_listings(convert: Hashable) -> MarketSnapshot:
+    listings = await cmc_client.get_listings(limit=settings.LISTINGS_SNAPSHOT_LIMIT, convert=convert)
+    return MarketSnapshot.from_listings(listings, convert=convert)
+
+
+async def _load_quote_batch(keys: List[Tuple[int, str]]) -> Dict[Hashable, Any]:
+    """Fetch a batch of (currency_id, convert) keys with one upstream call per convert."""
+    ids_by_convert: Dict[str, List[int]] = defaultdict(list)
+    for currency_id, convert in keys:
+        ids_by_convert[convert].append(currency_id)
+
+    converts = list(ids_by_convert)
+    responses = await asyncio.gather(
+        *(cmc_client.get_currencies(ids_by_convert[convert], convert=convert) for convert in converts),
+        return_exceptions=True
+    )
+
+    results: Dict[Hashable, Any] = {}
+    for convert, response in zip(converts, responses):
+        for currency_id in ids_by_convert[convert]:
+            if isinstance(response, Exception):
+                results[(currency_id, convert)] = response
+            elif currency_id in response:
+                results[(currency_id, convert)] = response[currency_id]
+            else:
+                results[(currency_id, convert)] = HTTPClientError(f"Currency with ID {currency_id} not found")
+    return results
+
+
+async def _load_quote(key: Hashable):
+    currency_id, convert = key
+    if missing_currencies.get(key):
+        raise HTTPClientError(f"Currency with ID {currency_id} not found")
+    try:
+        return await quote_batcher.load(key)
+    except HTTPClientError as e:
+        if "not found" in str(e).lower():
+            missing_currencies.set(key, True)
+        raise
+
+
+# Concurrent quote loads, from requests and from the refresher, merge into one upstream batch
+quote_batcher = MicroBatcher(
+    _load_quote_batch,
+    window=settings.QUOTES_BATCH_WINDOW,
+    max_batch_size=settings.QUOTES_BATCH_SIZE
+)
+
+
+# One columnar listings snapshot of the top LISTINGS_SNAPSHOT_LIMIT coins per convert currency
+listings_store = SnapshotStore(
+    name="listings",
+    loader=_shared("listings", _load_listings),
+    max_staleness=settings.SNAPSHOT_MAX_STALENESS,
+    max_keys=settings.CACHE_MAX_SIZE,
+    upstream_down=_upstream_down("listings"),
+    stale_if_error=settings.SNAPSHOT_STALE_IF_ERROR,
+    cost=lambda convert: listings_credits(settings.LISTINGS_SNAPSHOT_LIMIT)
+)
+# Per-coin quotes keyed on (currency_id, convert), tracked once requested
+quotes_store = SnapshotStore(
+    name="quotes",
+    loader=_shared("quotes", _load_quote),
+    max_staleness=settings.SNAPSHOT_MAX_STALENESS,
+    max_keys=settings.CACHE_MAX_SIZE,
+    upstream_down=_upstream_down("quotes"),
+    stale_if_error=settings.SNAPSHOT_STALE_IF_ERROR,
+    # Quotes are refreshed in batches, so each key costs its share of a batch call
+    cost=lambda key: quotes_credits(settings.QUOTES_BATCH_SIZE) / settings.QUOTES_BATCH_SIZE
+)
+# IDs CoinMarketCap reported as unknown, so repeated lookups do not hit upstream
+missing_currencies = TTLCache(ttl=settings.CACHE_TTL, max_size=settings.CACHE_MAX_SIZE)
+
+for _convert in settings.snapshot_converts:
+    listings_store.track(_convert, pinned=True)
+
+# Coin search index, updated incrementally from every new listings snapshot
+search_index = SymbolIndex()
+listings_store.subscribe(
+    lambda convert, snapshot: search_index.update(
+        snapshot.data.iter_rows(("id", "name", "symbol", "slug", "cmc_rank"))
+    )
+)
+
+# Change events between consecutive listings snapshots
+diff_engine = DiffEngine(
+    listings_store,
+    price_threshold=settings.DIFF_PRICE_THRESHOLD,
+    top_n=settings.DIFF_TOP_N,
+    max_events=settings.DIFF_MAX_EVENTS
+)
+
+# Pushes listings changes to streaming clients
+price_broadcaster = PriceBroadcaster(listings_store, diff_engine, max_pending=settings.STREAM_MAX_PENDING)
+
+# Refresh what is read, within what the credit budget allows
+refresh_scheduler = RefreshScheduler(budget=credit_budget, idle_timeout=settings.SNAPSHOT_IDLE_TIMEOUT)
+
+if settings.CMC_CREDITS_PER_DAY:
+    # Seconds the daily budget needs to accrue one refresh of every pinned listings snapshot
+    _paced_interval = (
+        listings_credits(settings.LISTINGS_SNAPSHOT_LIMIT) * len(settings.snapshot_converts)
+        * 86400 / settings.CMC_CREDITS_PER_DAY
+    )
+    if _paced_interval > settings.SNAPSHOT_MAX_STALENESS + settings.SNAPSHOT_STALE_IF_ERROR:
+        logger.warning(
+            f"CMC_CREDITS_PER_DAY={settings.CMC_CREDITS_PER_DAY} refreshes listings about every "
+            f"{_paced_interval:.0f}s, longer than data may be served "
+            f"(SNAPSHOT_MAX_STALENESS + SNAPSHOT_STALE_IF_ERROR); requests will fail in between"
+        )
+
+refresher = SnapshotRefresher(
+    stores=[listings_store, quotes_store],
+    interval=settings.CACHE_TTL,
+    jitter=settings.SNAPSHOT_REFRESH_JITTER,
+    retry_delay=settings.SNAPSHOT_RETRY_DELAY,
+    max_backoff=settings.SNAPSHOT_MAX_BACKOFF,
+    scheduler=refresh_scheduler
+)
+
+# With several workers, only the one holding the leader lock refreshes from CMC
+shared_snapshots = None
+if settings.shared_snapshot_dir:
+    shared_snapshots = SharedSnapshots(
+        directory=settings.shared_snapshot_dir,
+        refresher=refresher,
+        poll_interval=settings.SHARED_SNAPSHOT_POLL_INTERVAL,
+        wait=settings.SHARED_SNAPSHOT_WAIT
+    )
+    shared_snapshots.add_store(listings_store, columnar=True)
+    shared_snapshots.add_store(quotes_store)
+
+# Price history and its OHLC rollups, recorded at every listings refresh by the worker that refreshes
+history_store = None
+history_rollups = None
+indicator_engine = None
+if settings.HISTORY_DIR:
+    history_store = HistoryStore(
+        directory=settings.HISTORY_DIR,
+        chunk_interval=settings.HISTORY_CHUNK_INTERVAL,
+        retention_days=settings.HISTORY_RETENTION_DAYS
+    )
+    history_rollups = RollupPipeline(
+        history_store,
+        directory=os.path.join(settings.HISTORY_DIR, "rollups"),
+        retention_days={
+            "1m": settings.HISTORY_RETENTION_DAYS,
+            "1h": settings.HISTORY_ROLLUP_RETENTION_DAYS,
+            "1d": settings.HISTORY_ROLLUP_RETENTION_DAYS,
+        }
+    )
+    indicator_engine = IndicatorEngine(
+        history_rollups,
+        max_series=settings.INDICATOR_CACHE_SIZE,
+        max_points=settings.HISTORY_MAX_POINTS
+    )
+
+
+def _record_history(convert: Hashable, snapshot: Snapshot) -> None:
+    if shared_snapshots is None or shared_snapshots.role == LEADER:
+        recorded = history_store.append(convert, snapshot.data, snapshot.fetched_at)
+        if recorded is not None:
+            history_rollups.update(convert, *recorded)
+
+
+if history_store is not None:
+    listings_store.subscribe(_record_history)
+
+# Price alerts, matched at every listings refresh by the worker that refreshes
+alert_engine = None
+if settings.ALERTS_DB:
+    alert_engine = AlertEngine(settings.ALERTS_DB, max_per_user=settings.ALERTS_PER_USER)
+
+    def _match_alerts(diff: SnapshotDiff) -> None:
+        if shared_snapshots is None or shared_snapshots.role == LEADER:
+            alert_engine.on_diff(diff)
+
+    diff_engine.subscribe(_match_alerts)
+
+# Watchlists and portfolios of bot users, valued against the listings snapshot
+portfolio_store = None
+if settings.PORTFOLIO_DB:
+    portfolio_store = PortfolioStore(settings.PORTFOLIO_DB, max_coins=settings.PORTFOLIO_MAX_COINS)
+
+
+async def start_refreshing() -> None:
+    """Start keeping snapshots fresh: directly, or as leader or follower of the other workers."""
+    if shared_snapshots is not None:
+        await shared_snapshots.start()
+    else:
+        refresher.start()
+
+
+async def stop_refreshing() -> None:
+    """Stop whatever :func:`start_refreshing` started."""
+    if shared_snapshots is not None:
+        await shared_snapshots.stop()
+    else:
+        await refresher.stop()
+
+
+async def get_listings_snapshot(convert: str = 'USD') -> Snapshot:
+    """Get the current listings snapshot for a convert currency.
+
+    Args:
+        convert: Currency to convert prices to
+
+    Returns:
+        Snapshot whose data is a MarketSnapshot of the top
+        LISTINGS_SNAPSHOT_LIMIT coins in rank order
+    """
+    return await listings_store.read(convert.upper())
+
+
+async def get_listings_changes(convert: str = 'USD', since: int = 0) -> Dict[str, Any]:
+    """Get the change events between listings snapshots after a sequence number.
+
+    Args:
+        convert: Currency to convert prices to
+        since: Sequence number of the last event already seen (0 for all kept)
+
+    Returns:
+        Numbered events, the sequence number to resume from, and whether
+        events after ``since`` were already dropped
+    """
+    convert = convert.upper()
+    snapshot = await listings_store.read(convert)
+    events, truncated = diff_engine.events_since(convert, since)
+    return {
+        "data": [{"seq": seq, **event.to_dict()} for seq, event in events],
+        "count": len(events),
+        "convert": convert,
+        "next": events[-1][0] if events else max(since, 0),
+        "truncated": truncated,
+        "updated_at": snapshot.updated_at,
+    }
+
+
+def _values(column) -> List[Any]:
+    return [None if v != v else v for v in column.tolist()]
+
+
+def get_currency_history(
+    currency_id: int,
+    start: float,
+    end: float,
+    interval: Optional[int] = None,
+    convert: str = 'USD'
+) -> Dict[str, Any]:
+    """Get the recorded price history of a cryptocurrency.
+
+    Bars are built from the coarsest stored resolution they are a multiple
+    of, so the work depends on the number of bars returned rather than on
+    the number of samples recorded in the range. Reading the files blocks,
+    so it is not called from the event loop.
+
+    Args:
+        currency_id: The cryptocurrency ID
+        start, end: Unix times in seconds bounding the range
+        interval: Seconds per OHLC bar; 0 for the raw samples; None for the
+            finest stored resolution that fits HISTORY_MAX_POINTS bars
+        convert: Currency to convert prices to
+
+    Returns:
+        Timestamps (Unix milliseconds) and one list of values per field
+
+    Raises:
+        ValueError: If the range holds more than HISTORY_MAX_POINTS points
+    """
+    convert = convert.upper()
+    too_many = (
+        f"The range holds more than {settings.HISTORY_MAX_POINTS} points; "
+        "use a shorter range or a larger interval"
+    )
+    if interval is None:
+        interval = history_rollups.auto_interval(start, end, settings.HISTORY_MAX_POINTS)
+    if interval == 0:
+        resolution, fields = "raw", history_store.fields
+        try:
+            times, values = history_store.read(
+                convert, currency_id, start, end, max_points=settings.HISTORY_MAX_POINTS
+            )
+        except ValueError:
+            raise ValueError(too_many)
+    else:
+        if (end - start) / interval > settings.HISTORY_MAX_POINTS:
+            raise ValueError(too_many)
+        resolution, times, values = history_rollups.bars(convert, currency_id, start, end, interval)
+        fields = BAR_FIELDS
+    if len(times) > settings.HISTORY_MAX_POINTS:
+        raise ValueError(too_many)
+
+    data: Dict[str, Any] = {"timestamps": times.tolist()}
+    for name, column in zip(fields, values):
+        data[name] = _values(column)
+    return {
+        "id": currency_id,
+        "convert": convert,
+        "interval": interval or None,
+        "resolution": resolution,
+        "count": len(times),
+        "data": data,
+    }
+
+
+def get_currency_indicators(
+    currency_id: int,
+    kinds: List[str],
+    window: int,
+    interval: int,
+    start: float,
+    end: float,
+    convert: str = 'USD'
+) -> Dict[str, Any]:
+    """Get technical indicators of a cryptocurrency's history bars.
+
+    Args:
+        currency_id: The cryptocurrency ID
+        kinds: Indicators to compute (sma, ema, rsi, volatility)
+        window: Bars per indicator window
+        interval: Seconds per bar
+        start, end: Unix times in seconds bounding the bars returned
+        convert: Currency to convert prices to
+
+    Returns:
+        Bar times (Unix milliseconds), closes and one list of values per
+        indicator, plus the latest value of each
+
+    Raises:
+        ValueError: If an indicator is unknown or the range holds more than
+            HISTORY_MAX_POINTS bars
+    """
+    convert = convert.upper()
+    if (end - start) / interval > settings.HISTORY_MAX_POINTS:
+        raise ValueError(
+            f"The range holds more than {settings.HISTORY_MAX_POINTS} bars; "
+            "use a shorter range or a larger interval"
+        )
+    times, closes, results = indicator_engine.compute(convert, currency_id, kinds, window, interval, start, end)
+    data: Dict[str, Any] = {"timestamps": times.tolist(), "close": _values(closes)}
+    for kind, values in results.items():
+        data[kind] = _values(values)
+    return {
+        "id": currency_id,
+        "convert": convert,
+        "interval": interval,
+        "window": window,
+        "count": len(times),
+        "data": data,
+        "latest": {kind: column[-1] if column else None for kind, column in data.items() if kind != "timestamps"},
+    }
+
+
+def get_correlation(currency_ids: List[int], window: int, interval: int, convert: str = 'USD') -> Dict[str, Any]:
+    """Get the correlation matrix of several cryptocurrencies' returns.
+
+    Args:
+        currency_ids: The cryptocurrency IDs
+        window: Number of most recent bars whose returns are correlated
+        interval: Seconds per bar
+        convert: Currency to convert prices to
+
+    Returns:
+        Matrix of Pearson correlations, in the order of ``currency_ids``
+    """
+    convert = convert.upper()
+    matrix, returns = indicator_engine.correlation(convert, currency_ids, window, interval, time.time())
+    return {
+        "ids": currency_ids,
+        "convert": convert,
+        "interval": interval,
+        "window": window,
+        "returns": returns,
+        "matrix": [_values(row) for row in matrix],
+    }
+
+
+async def get_currency_snapshot(currency_id: int, convert: str = 'USD') -> Snapshot:
+    """Get the current quote snapshot for a specific currency.
+
+    Args:
+        currency_id: The cryptocurrency ID
+        convert: Currency to convert prices to
+
+    Returns:
+        Snapshot holding the cryptocurrency data
+    """
+    return await quotes_store.read((currency_id, convert.upper()))
+
+
+async def get_currency_snapshots(currency_ids: List[int], convert: str = 'USD') -> Dict[int, Any]:
+    """Get quote snapshots for several currencies at once.
+
+    IDs that are not tracked yet are loaded together in a single batch.
+
+    Args:
+        currency_ids: The cryptocurrency IDs
+        convert: Currency to convert prices to
+
+    Returns:
+        Dictionary mapping each ID to its Snapshot, or to the
+        HTTPClientError raised while loading it
+    """
+    ids = list(dict.fromkeys(currency_ids))
+    results = await asyncio.gather(
+        *(get_currency_snapshot(currency_id, convert=convert) for currency_id in ids),
+        return_exceptions=True
+    )
+    return dict(zip(ids, results))
+
+
+async def search_currencies(query: str, limit: int = 10) -> List[Dict]:
+    """Search coins by id, symbol, slug or name.
+
+    Args:
+        query: Text to look for
+        limit: Maximum number of results
+
+    Returns:
+        Matching coins, best matches first
+    """
+    if not len(search_index):
+        await get_listings_snapshot(convert=settings.snapshot_converts[0])
+    return search_index.search(query, limit=limit)
+
+
 async def get_listings(limit: int = 100, convert: str = 'USD'):
     """Get cryptocurrency listings.
-    
+
+    Every limit is served by slicing a single snapshot of the top
+    ``LISTINGS_SNAPSHOT_LIMIT`` coins, so upstream traffic does not depend
+    on how many distinct limits clients ask for.
+
     Args:
-        limit: Number of results to return (1-5000)
+        limit: Number of results to return (1-LISTINGS_SNAPSHOT_LIMIT)
         convert: Currency to convert prices to
-        
+
     Returns:
         List of cryptocurrency data
     """
-    return await cmc_client.get_listings(limit=limit, convert=convert)
+    snapshot = await get_listings_snapshot(convert=convert)
+    return snapshot.data.records(slice(0, limit))
 
 
 async def get_currency(currency_id: int, convert: str = 'USD'):
     """Get specific currency by ID.
-    
+
     Args:
         currency_id: The cryptocurrency ID
         convert: Currency to convert prices to
-        
+
     Returns:
         Cryptocurrency data
     """
-    return await cmc_client.get_currency(currency_id=currency_id, convert=convert)
+    snapshot = await get_currency_snapshot(currency_id=currency_id, convert=convert)
+    return snapshot.data
+
+
+async def _listed(currency_id: int, convert: str) -> Tuple[Snapshot, int]:
+    """The listings snapshot and the row of a coin in it.
+
+    Raises:
+        ValueError: If the coin is not in the listings snapshot
+    """
+    snapshot = await listings_store.read(convert)
+    row = snapshot.data.index_of(currency_id)
+    if row is None:
+        raise ValueError(
+            f"Currency with ID {currency_id} is not among the top {settings.LISTINGS_SNAPSHOT_LIMIT} "
+            "listings, the only coins tracked for alerts, watchlists and portfolios"
+        )
+    return snapshot, row
+
+
+async def create_alert(
+    user_id: int,
+    currency_id: int,
+    kind: str,
+    threshold: float,
+    period: Optional[str] = None,
+    convert: str = 'USD'
+) -> Dict[str, Any]:
+    """Create a price alert on a coin of the listings snapshot.
+
+    Args:
+        user_id: Telegram chat ID the alert is delivered to
+        currency_id: The cryptocurrency ID
+        kind: above, below or change
+        threshold: Price for above/below, percent for change
+        period: Period of a change alert (1h, 24h or 7d)
+        convert: Currency to convert prices to
+
+    Returns:
+        The alert and the coin's current price
+
+    Raises:
+        ValueError: If the alert is invalid, the coin is not in the
+            listings snapshot or the user has too many alerts
+        HTTPClientError: If the listings cannot be fetched
+    """
+    convert = convert.upper()
+    snapshot, row = await _listed(currency_id, convert)
+    # Off the event loop: the write may wait for another worker's transaction
+    alert = await asyncio.to_thread(
+        alert_engine.create, user_id, currency_id, convert, kind, threshold, period
+    )
+    price = snapshot.data.column("price")[row] if snapshot.data.has_column("price") else float("nan")
+    return {
+        "data": alert.to_dict(),
+        "name": snapshot.data.column("name")[row],
+        "symbol": snapshot.data.column("symbol")[row],
+        "price": None if price != price else float(price),
+    }
+
+
+async def get_watchlist(user_id: int, convert: str = 'USD') -> Dict[str, Any]:
+    """Get a user's watched coins from the listings snapshot.
+
+    Args:
+        user_id: Telegram chat ID of the watchlist's owner
+        convert: Currency to convert prices to
+
+    Returns:
+        The coins' current data in the order added, and the IDs no longer listed
+    """
+    convert = convert.upper()
+    snapshot = await listings_store.read(convert)
+    watched = watched_coins(snapshot.data, await asyncio.to_thread(portfolio_store.watchlist, user_id))
+    return {
+        **watched,
+        "count": len(watched["data"]),
+        "convert": convert,
+        "updated_at": snapshot.updated_at,
+    }
+
+
+async def get_portfolio(user_id: int, convert: str = 'USD') -> Dict[str, Any]:
+    """Value a user's portfolio at the prices of the listings snapshot.
+
+    Args:
+        user_id: Telegram chat ID of the portfolio's owner
+        convert: Currency to value the portfolio in
+
+    Returns:
+        Total value and 24h change, and every holding's price, value and
+        weight, largest first
+    """
+    convert = convert.upper()
+    snapshot = await listings_store.read(convert)
+    valued = value_portfolio(snapshot.data, *await asyncio.to_thread(portfolio_store.holdings, user_id))
+    return {
+        **valued,
+        "count": len(valued["data"]),
+        "convert": convert,
+        "updated_at": snapshot.updated_at,
+    }
+
+
+async def watch_currency(user_id: int, currency_id: int) -> bool:
+    """Add a listed coin to a user's watchlist; return whether it was new.
+
+    Raises:
+        ValueError: If the coin is not listed or the watchlist is full
+    """
+    await _listed(currency_id, 'USD')
+    return await asyncio.to_thread(portfolio_store.watch, user_id, currency_id)
+
+
+async def hold_currency(user_id: int, currency_id: int, quantity: float) -> bool:
+    """Set the quantity of a listed coin in a user's portfolio; return whether it was new.
+
+    Raises:
+        ValueError: If the coin is not listed, the quantity is not positive
+            or the portfolio is full
+    """
+    await _listed(currency_id, 'USD')
+    return await asyncio.to_thread(portfolio_store.hold, user_id, currency_id, quantity)
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Upstream spend, resilience and refresh counters for monitoring."""
+    return {
+        "credits": credit_budget.stats(),
+        "connection_pool": cmc_client.pool_stats(),
+        "circuit_breaker": cmc_breaker.stats(),
+        "retries": cmc_retry_policy.stats(),
+        "scheduler": refresh_scheduler.stats(),
+        "quote_batcher": quote_batcher.stats(),
+        "missing_currencies": missing_currencies.stats(),
+        "snapshots": {store.name: len(store) for store in refresher.stores},
+        "diffs": diff_engine.stats(),
+        "streams": price_broadcaster.stats(),
+        "history": {
+            "raw": history_store.stats(),
+            **history_rollups.stats(),
+            "indicators": indicator_engine.stats(),
+        } if history_store is not None else None,
+        "alerts": alert_engine.stats() if alert_engine is not None else None,
+        "workers": shared_snapshots.stats() if shared_snapshots is not None else None,
+        "shared_cache": {
+            **cache_backend.stats(),
+            **{loader.namespace: loader.stats() for loader in shared_loaders},
+        },
+    }
@@ -0,0 +1,156 @@
+"""Pluggable JSON codec for upstream bodies and API responses."""
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from fastapi.responses import JSONResponse
+
+from .compression import IDENTITY, compress
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional speedup
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """Standard library JSON encoding and decoding."""
+
+    name = "json"
+
+    def dumps(self, value: Any) -> bytes:
+        """Encode ``value`` as compact UTF-8 JSON."""
+        return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: Any) -> Any:
+        """Decode JSON from ``bytes`` or ``str``."""
+        return json.loads(data)
+
+
+class ORJSONCodec(JSONCodec):
+    """orjson encoding and decoding, several times faster on large payloads."""
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise RuntimeError("JSON_CODEC=orjson requires the orjson package")
+        self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value, option=self._options)
+
+    def loads(self, data: Any) -> Any:
+        return orjson.loads(data)
+
+
+_CODECS = {
+    JSONCodec.name: JSONCodec,
+    ORJSONCodec.name: ORJSONCodec,
+}
+
+
+def get_codec(name: str = "auto") -> JSONCodec:
+    """Return the codec called ``name``; ``auto`` prefers orjson when installed.
+
+    Raises:
+        ValueError: If no codec has that name
+    """
+    if name == "auto":
+        name = ORJSONCodec.name if orjson is not None else JSONCodec.name
+    if name not in _CODECS:
+        raise ValueError(f"Unknown JSON codec {name!r}; expected one of: auto, {', '.join(_CODECS)}")
+    return _CODECS[name]()
+
+
+codec = get_codec(settings.JSON_CODEC)
+logger.info(f"Using {codec.name} JSON codec")
+
+
+class CodecJSONResponse(JSONResponse):
+    """JSON response rendered with the configured codec.
+
+    Content that is already encoded (``bytes``) is sent as is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return codec.dumps(content)
+
+
+class EncodedResponseCache:
+    """Pre-encoded, optionally compressed, response bodies memoised on their snapshot.
+
+    Bodies are kept in the snapshot itself, so they are dropped together
+    with it when the next refresh replaces it and can never outlive the
+    data they encode. Each content coding of a body is compressed once.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get_or_encode(
+        self,
+        snapshot: Any,
+        key: Hashable,
+        build: Callable[[], Any],
+        encoding: str = IDENTITY
+    ) -> bytes:
+        """Return the body for ``key``, building, encoding and compressing it on first use.
+
+        Args:
+            snapshot: Snapshot the body is derived from; holds the cached bytes
+            key: Everything other than the snapshot that shapes the body
+            build: Returns the body to encode
+            encoding: Content coding of the returned bytes
+
+        Returns:
+            UTF-8 JSON bytes in the requested content coding
+        """
+        if encoding != IDENTITY:
+            return self._memoized(
+                snapshot,
+                (key, encoding),
+                lambda: compress(self.get_or_encode(snapshot, key, build), encoding)
+            )
+        return self._memoized(snapshot, key, lambda: codec.dumps(build()))
+
+    def _memoized(self, snapshot: Any, key: Hashable, make: Callable[[], bytes]) -> bytes:
+        if not self.enabled:
+            return make()
+
+        memo: "OrderedDict[Hashable, bytes]" = snapshot.memo
+        body = memo.get(key)
+        if body is not None:
+            memo.move_to_end(key)
+            self.hits += 1
+            return body
+
+        self.misses += 1
+        body = memo[key] = make()
+        while len(memo) > self.max_entries:
+            memo.popitem(last=False)
+        return body
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "codec": codec.name,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+response_cache = EncodedResponseCache(settings.RESPONSE_CACHE_SIZE)
@@ -0,0 +1,113 @@
+"""Content-Encoding negotiation and body compression."""
+import gzip
+import logging
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is an optional speedup
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+IDENTITY = "identity"
+GZIP = "gzip"
+BROTLI = "br"
+
+# Levels that trade a little ratio for much cheaper compression of large bodies
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def available_encodings() -> List[str]:
+    """Supported content codings, most preferred first."""
+    return ([BROTLI] if brotli is not None else []) + [GZIP]
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Map each coding of an Accept-Encoding header to its q-value."""
+    weights: Dict[str, float] = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def negotiate(accept_encoding: Optional[str]) -> str:
+    """Pick the content coding for a response.
+
+    Args:
+        accept_encoding: The request's Accept-Encoding header, if any
+
+    Returns:
+        The client's highest weighted supported coding (brotli before gzip
+        on ties), or ``identity``
+    """
+    if not accept_encoding:
+        return IDENTITY
+    weights = _parse_accept_encoding(accept_encoding)
+    wildcard = weights.get("*", 0.0)
+    best, best_q = IDENTITY, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress ``body`` with a coding returned by :func:`negotiate`.
+
+    Raises:
+        ValueError: If the coding is not supported
+    """
+    if encoding == IDENTITY:
+        return body
+    if encoding == GZIP:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == BROTLI and brotli is not None:
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    raise ValueError(f"Unsupported content coding: {encoding!r}")
+
+
+class _StreamAwareGZipResponder(GZipResponder):
+    """GZip responder that passes event streams through uncompressed.
+
+    A gzip stream is only flushed once it ends, so compressed Server-Sent
+    Events would sit in the compressor instead of reaching the client.
+    """
+
+    async def send_with_gzip(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            await super().send_with_gzip(message)
+            if content_type.startswith("text/event-stream"):
+                self.content_encoding_set = True  # Starlette's pass-through flag
+            return
+        await super().send_with_gzip(message)
+
+
+class StreamAwareGZipMiddleware(GZipMiddleware):
+    """:class:`GZipMiddleware` that leaves ``text/event-stream`` responses alone."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _StreamAwareGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+            await responder(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from typing import Optional
 from pydantic import Field, validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -18,6 +19,22 @@ class Settings(BaseSettings):
     HOST: str = Field(default="0.0.0.0", description="Server host")
     PORT: int = Field(default=8000, description="Server port")
     DEBUG: bool = Field(default=False, description="Debug mode")
+    WORKERS: int = Field(
+        default=1,
+        description="Server worker processes; with more than one, a single worker refreshes snapshots"
+    )
+    SHARED_SNAPSHOT_DIR: str = Field(
+        default="",
+        description="Directory through which workers share snapshots (default: /dev/shm or the temp dir when WORKERS > 1)"
+    )
+    SHARED_SNAPSHOT_POLL_INTERVAL: float = Field(
+        default=1.0,
+        description="Seconds between checks for snapshots published by the refreshing worker"
+    )
+    SHARED_SNAPSHOT_WAIT: float = Field(
+        default=10.0,
+        description="Seconds a worker waits for a startup snapshot from the refreshing worker before loading it itself"
+    )
     
     # API configuration
     API_TITLE: str = Field(default="Crypto Tracker API", description="API title")
@@ -29,7 +46,190 @@ class Settings(BaseSettings):
     
     # Rate limiting and timeouts
     REQUEST_TIMEOUT: int = Field(default=30, description="HTTP request timeout in seconds")
-    CACHE_TTL: int = Field(default=300, description="Cache TTL in seconds")
+    HTTP_CONNECT_TIMEOUT: float = Field(default=5.0, description="Timeout to acquire and open a connection in seconds")
+    HTTP_READ_TIMEOUT: float = Field(default=20.0, description="Timeout between reads of a response in seconds")
+    HTTP_POOL_SIZE: int = Field(default=100, description="Maximum open upstream connections")
+    HTTP_POOL_PER_HOST: int = Field(default=20, description="Maximum open connections per upstream host")
+    HTTP_KEEPALIVE_TIMEOUT: float = Field(default=30.0, description="Seconds idle connections are kept for reuse")
+    HTTP_DNS_CACHE_TTL: int = Field(default=300, description="Seconds resolved upstream addresses are cached")
+    CACHE_TTL: int = Field(default=300, description="Cache TTL and snapshot refresh interval in seconds")
+    CACHE_MAX_SIZE: int = Field(default=256, description="Maximum number of cached responses")
+    LISTINGS_SNAPSHOT_LIMIT: int = Field(
+        default=5000,
+        description="Number of top coins kept in each listings snapshot (largest servable limit)"
+    )
+    
+    # Background snapshot refresh
+    SNAPSHOT_CONVERTS: str = Field(
+        default="USD",
+        description="Comma-separated convert currencies refreshed from startup"
+    )
+    SNAPSHOT_REFRESH_JITTER: float = Field(
+        default=10.0,
+        description="Maximum random delay added to each refresh in seconds"
+    )
+    SNAPSHOT_RETRY_DELAY: float = Field(
+        default=5.0,
+        description="Initial delay before retrying a failed refresh in seconds"
+    )
+    SNAPSHOT_MAX_BACKOFF: float = Field(
+        default=300.0,
+        description="Maximum delay between retries of a failing refresh in seconds"
+    )
+    SNAPSHOT_MAX_STALENESS: float = Field(
+        default=900.0,
+        description="Oldest snapshot age in seconds still served; older data returns 503"
+    )
+    
+    # Upstream resilience
+    UPSTREAM_MAX_ATTEMPTS: int = Field(
+        default=3,
+        description="Attempts per CoinMarketCap request for retryable failures"
+    )
+    UPSTREAM_RETRY_BASE_DELAY: float = Field(
+        default=0.5,
+        description="Backoff before the first retry in seconds (doubles per retry, jittered)"
+    )
+    UPSTREAM_RETRY_MAX_DELAY: float = Field(
+        default=10.0,
+        description="Longest wait between retries, including Retry-After, in seconds"
+    )
+    CIRCUIT_FAILURE_THRESHOLD: int = Field(
+        default=5,
+        description="Consecutive upstream failures that open the circuit breaker"
+    )
+    CIRCUIT_RESET_TIMEOUT: float = Field(
+        default=30.0,
+        description="Seconds the circuit stays open before a trial request"
+    )
+    SNAPSHOT_STALE_IF_ERROR: float = Field(
+        default=86400.0,
+        description="Seconds past SNAPSHOT_MAX_STALENESS old data is still served while the circuit is open or the credit budget puts off its refresh"
+    )
+    
+    # CoinMarketCap credit budget (0 = unlimited)
+    CMC_CREDITS_PER_MINUTE: int = Field(
+        default=0,
+        description="CMC credits that may be spent per minute (token bucket)"
+    )
+    CMC_CREDITS_PER_DAY: int = Field(
+        default=0,
+        description="CMC credits that may be spent per UTC day; refreshes are paced to fit"
+    )
+    CMC_BUDGET_MAX_WAIT: float = Field(
+        default=5.0,
+        description="Longest wait for per-minute credits before a call is refused, in seconds"
+    )
+    SNAPSHOT_IDLE_TIMEOUT: float = Field(
+        default=3600.0,
+        description="Seconds without reads after which a snapshot is no longer refreshed"
+    )
+    
+    # Cache shared by API replicas
+    CACHE_BACKEND_URL: str = Field(
+        default="memory://",
+        description="memory:// for a single replica, or a redis:// URL shared by all replicas"
+    )
+    CACHE_LOCK_TTL: float = Field(
+        default=60.0,
+        description="Longest time one replica may hold a refresh lock, in seconds"
+    )
+    
+    # Snapshot diffs
+    DIFF_PRICE_THRESHOLD: float = Field(
+        default=1.0,
+        description="Smallest price move between two listings snapshots, in percent, reported as a change event"
+    )
+    DIFF_TOP_N: int = Field(
+        default=100,
+        description="Rank cut-off for top-N entry/exit events and rank change events"
+    )
+    DIFF_MAX_EVENTS: int = Field(
+        default=5000,
+        description="Change events kept per convert currency for /cryptocurrency/changes"
+    )
+    
+    # Price history
+    HISTORY_DIR: str = Field(
+        default="",
+        description="Directory of the price history recorded at every listings refresh (empty disables)"
+    )
+    HISTORY_CHUNK_INTERVAL: int = Field(
+        default=3600,
+        description="Seconds of samples kept in a chunk before it is compressed into its day's segment"
+    )
+    HISTORY_RETENTION_DAYS: int = Field(
+        default=90,
+        description="Days of price history kept on disk"
+    )
+    HISTORY_ROLLUP_RETENTION_DAYS: int = Field(
+        default=1825,
+        description="Days of hourly and daily OHLC bars kept on disk"
+    )
+    HISTORY_MAX_POINTS: int = Field(
+        default=5000,
+        description="Most points returned by one history query"
+    )
+    INDICATOR_CACHE_SIZE: int = Field(
+        default=256,
+        description="Indicator series (coin, interval, window) kept up to date between requests"
+    )
+    
+    # Price alerts
+    ALERTS_DB: str = Field(
+        default="",
+        description="SQLite database of price alerts (empty disables alerts)"
+    )
+    ALERTS_PER_USER: int = Field(
+        default=100,
+        description="Most alerts one user may keep"
+    )
+    
+    # Watchlists and portfolios
+    PORTFOLIO_DB: str = Field(
+        default="",
+        description="SQLite database of user watchlists and portfolios (empty disables them)"
+    )
+    PORTFOLIO_MAX_COINS: int = Field(
+        default=100,
+        description="Most coins in one user's watchlist or portfolio"
+    )
+    
+    # Streaming endpoints
+    STREAM_MAX_PENDING: int = Field(
+        default=32,
+        description="Updates queued for a slow streaming client before it is sent a fresh snapshot instead"
+    )
+    STREAM_HEARTBEAT_INTERVAL: float = Field(
+        default=15.0,
+        description="Seconds between keep-alive comments on idle Server-Sent Events streams"
+    )
+    
+    # Quote batching
+    QUOTES_BATCH_WINDOW: float = Field(
+        default=0.02,
+        description="Seconds to wait for more quote lookups before sending a batch upstream"
+    )
+    QUOTES_BATCH_SIZE: int = Field(
+        default=100,
+        description="Maximum number of IDs per upstream quotes call"
+    )
+    
+    # JSON encoding
+    JSON_CODEC: str = Field(
+        default="auto",
+        description="JSON codec for upstream bodies and responses: auto, orjson or json"
+    )
+    RESPONSE_CACHE_SIZE: int = Field(
+        default=32,
+        description="Encoded response bodies kept per snapshot (0 disables)"
+    )
+    
+    # Compression
+    COMPRESSION_MIN_SIZE: int = Field(
+        default=1024,
+        description="Smallest dynamic response body in bytes that is gzip-compressed"
+    )
     
     # Logging configuration
     LOG_LEVEL: str = Field(default="INFO", description="Logging level")
@@ -52,6 +252,123 @@ class Settings(BaseSettings):
             raise ValueError('PORT must be between 1 and 65535')
         return v
     
+    @validator('DIFF_PRICE_THRESHOLD')
+    def validate_diff_price_threshold(cls, v):
+        """Validate price move threshold."""
+        if v < 0:
+            raise ValueError('DIFF_PRICE_THRESHOLD must not be negative')
+        return v
+    
+    @validator('DIFF_TOP_N', 'DIFF_MAX_EVENTS')
+    def validate_diff_sizes(cls, v):
+        """Validate diff sizes."""
+        if v < 1:
+            raise ValueError('DIFF_TOP_N and DIFF_MAX_EVENTS must be positive')
+        return v
+    
+    @validator('HISTORY_CHUNK_INTERVAL')
+    def validate_history_chunk_interval(cls, v):
+        """Validate history chunk interval."""
+        if v < 1 or 86400 % v:
+            raise ValueError('HISTORY_CHUNK_INTERVAL must be a positive divisor of 86400')
+        return v
+    
+    @validator('HISTORY_RETENTION_DAYS', 'HISTORY_ROLLUP_RETENTION_DAYS', 'HISTORY_MAX_POINTS', 'INDICATOR_CACHE_SIZE')
+    def validate_history_limits(cls, v):
+        """Validate history limits."""
+        if v < 1:
+            raise ValueError(
+                'HISTORY_RETENTION_DAYS, HISTORY_ROLLUP_RETENTION_DAYS, HISTORY_MAX_POINTS '
+                'and INDICATOR_CACHE_SIZE must be positive'
+            )
+        return v
+    
+    @validator('ALERTS_PER_USER', 'PORTFOLIO_MAX_COINS')
+    def validate_user_limits(cls, v):
+        """Validate per-user limits."""
+        if v < 1:
+            raise ValueError('ALERTS_PER_USER and PORTFOLIO_MAX_COINS must be positive')
+        return v
+    
+    @validator('STREAM_MAX_PENDING', 'STREAM_HEARTBEAT_INTERVAL')
+    def validate_stream_settings(cls, v):
+        """Validate streaming settings."""
+        if v <= 0:
+            raise ValueError('STREAM_MAX_PENDING and STREAM_HEARTBEAT_INTERVAL must be positive')
+        return v
+    
+    @validator('WORKERS')
+    def validate_workers(cls, v):
+        """Validate worker count."""
+        if v < 1:
+            raise ValueError('WORKERS must be at least 1')
+        return v
+    
+    @validator('SHARED_SNAPSHOT_POLL_INTERVAL')
+    def validate_poll_interval(cls, v):
+        """Validate shared snapshot poll interval."""
+        if v <= 0:
+            raise ValueError('SHARED_SNAPSHOT_POLL_INTERVAL must be positive')
+        return v
+    
+    @validator('CACHE_TTL', 'CACHE_MAX_SIZE')
+    def validate_cache_settings(cls, v):
+        """Validate cache settings."""
+        if v < 1:
+            raise ValueError('Cache settings must be positive')
+        return v
+    
+    @validator('REQUEST_TIMEOUT', 'HTTP_CONNECT_TIMEOUT', 'HTTP_READ_TIMEOUT', 'HTTP_POOL_SIZE', 'HTTP_POOL_PER_HOST')
+    def validate_http_settings(cls, v):
+        """Validate timeouts and pool sizes."""
+        if v <= 0:
+            raise ValueError('HTTP timeouts and pool sizes must be positive')
+        return v
+    
+    @validator('UPSTREAM_MAX_ATTEMPTS', 'CIRCUIT_FAILURE_THRESHOLD')
+    def validate_resilience_counts(cls, v):
+        """Validate retry and circuit breaker counts."""
+        if v < 1:
+            raise ValueError('UPSTREAM_MAX_ATTEMPTS and CIRCUIT_FAILURE_THRESHOLD must be positive')
+        return v
+    
+    @validator('CACHE_BACKEND_URL')
+    def validate_cache_backend_url(cls, v):
+        """Validate cache backend URL scheme."""
+        valid_schemes = ['memory', 'redis', 'rediss', 'unix']
+        if v.split('://', 1)[0].lower() not in valid_schemes or '://' not in v:
+            raise ValueError(f'CACHE_BACKEND_URL must start with one of: {", ".join(s + "://" for s in valid_schemes)}')
+        return v
+    
+    @validator('LISTINGS_SNAPSHOT_LIMIT')
+    def validate_snapshot_limit(cls, v):
+        """Validate listings snapshot size."""
+        if v < 1 or v > 5000:
+            raise ValueError('LISTINGS_SNAPSHOT_LIMIT must be between 1 and 5000')
+        return v
+    
+    @validator('SNAPSHOT_CONVERTS')
+    def validate_snapshot_converts(cls, v):
+        """Validate that at least one convert currency is refreshed."""
+        if not any(c.strip() for c in v.split(',')):
+            raise ValueError('SNAPSHOT_CONVERTS must name at least one currency')
+        return v
+    
+    @validator('JSON_CODEC')
+    def validate_json_codec(cls, v):
+        """Validate JSON codec name."""
+        valid_codecs = ['auto', 'orjson', 'json']
+        if v.lower() not in valid_codecs:
+            raise ValueError(f'JSON_CODEC must be one of: {", ".join(valid_codecs)}')
+        return v.lower()
+    
+    @validator('RESPONSE_CACHE_SIZE', 'COMPRESSION_MIN_SIZE', 'CMC_CREDITS_PER_MINUTE', 'CMC_CREDITS_PER_DAY')
+    def validate_non_negative_sizes(cls, v):
+        """Validate byte and entry counts."""
+        if v < 0:
+            raise ValueError('Sizes and credit budgets must not be negative')
+        return v
+    
     @validator('LOG_LEVEL')
     def validate_log_level(cls, v):
         """Validate log level."""
@@ -60,6 +377,21 @@ class Settings(BaseSettings):
             raise ValueError(f'LOG_LEVEL must be one of: {", ".join(valid_levels)}')
         return v.upper()
     
+    @property
+    def snapshot_converts(self) -> list:
+        """Convert currencies refreshed from startup."""
+        return [c.strip().upper() for c in self.SNAPSHOT_CONVERTS.split(',') if c.strip()]
+    
+    @property
+    def shared_snapshot_dir(self) -> Optional[str]:
+        """Directory for sharing snapshots between workers, or None when not sharing."""
+        if self.SHARED_SNAPSHOT_DIR:
+            return self.SHARED_SNAPSHOT_DIR
+        if self.WORKERS > 1:
+            base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            return os.path.join(base, f"crypto-tracker-{self.PORT}")
+        return None
+    
     model_config = SettingsConfigDict(
         env_file='.env',
         env_file_encoding='utf-8',
@@ -0,0 +1,57 @@
+"""SQLite databases of user data shared by the worker processes."""
+import os
+import sqlite3
+import threading
+from typing import List
+
+
+def open_database(path: str, schema: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Open (creating if needed) a SQLite database and apply ``schema``.
+
+    The database is in WAL mode so that workers read while one writes.
+    Transactions are begun explicitly (``BEGIN IMMEDIATE`` takes the write
+    lock up front); statements outside one commit on their own.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=check_same_thread)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(schema)
+    return db
+
+
+class ThreadConnections:
+    """One connection to a database per thread that uses it.
+
+    Requests are served from a thread pool, so that waiting for the write
+    lock (up to the 10 s busy timeout) never stalls the event loop; a
+    connection must not be shared by threads in the middle of a
+    transaction, so each gets its own.
+    """
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self.schema = schema
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._opened: List[sqlite3.Connection] = []
+
+    def get(self) -> sqlite3.Connection:
+        """The calling thread's connection, opened on first use."""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Only ever used by this thread, but closed by whichever thread shuts down
+            db = self._local.db = open_database(self.path, self.schema, check_same_thread=False)
+            with self._lock:
+                self._opened.append(db)
+        return db
+
+    def close(self) -> None:
+        """Close every thread's connection; threads reopen theirs if used again."""
+        with self._lock:
+            opened, self._opened = self._opened, []
+        self._local = threading.local()
+        for db in opened:
+            db.close()
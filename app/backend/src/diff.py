@@ -0,0 +1,221 @@
+"""Vectorised comparison of consecutive listings snapshots into change events."""
+import logging
+from collections import deque
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .market import MarketSnapshot
+from .snapshot import Snapshot, SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# Change event kinds
+PRICE = "price"          # price moved by at least the threshold
+RANK = "rank"            # cmc_rank changed, for coins in the top N before or after
+ENTERED_TOP = "entered_top"
+LEFT_TOP = "left_top"
+ADDED = "added"          # coin appeared in the listings
+REMOVED = "removed"      # coin dropped out of the listings
+
+
+class ChangeEvent(NamedTuple):
+    """One change of one coin between two snapshots."""
+    kind: str
+    coin_id: int
+    old: Optional[float]
+    new: Optional[float]
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "id": self.coin_id, "old": self.old, "new": self.new}
+
+
+def _value(x: float) -> Optional[float]:
+    return None if x != x else x
+
+
+class SnapshotDiff:
+    """Differences between two listings snapshots of one convert currency.
+
+    Rows of the current snapshot are aligned with the previous one by coin
+    ID once; every comparison is then a vectorised operation over whole
+    columns.
+
+    Attributes:
+        price_moves: IDs, old and new prices of coins whose price moved by
+            at least ``price_threshold`` percent
+        rank_changes: IDs, old and new ranks of coins in the top ``top_n``
+            before or after whose rank changed
+        entered_top, left_top: IDs of coins that entered or left the top ``top_n``
+        added, removed: IDs of coins that appeared in or dropped out of the listings
+    """
+
+    def __init__(
+        self,
+        convert: str,
+        previous: MarketSnapshot,
+        current: MarketSnapshot,
+        price_threshold: float,
+        top_n: int
+    ):
+        self.convert = convert
+        self.previous = previous
+        self.current = current
+        self.price_threshold = price_threshold
+        self.top_n = top_n
+
+        ids = current.column("id")
+        before = previous.indices_of(ids)
+        self._known = known = before >= 0
+        self._source = np.maximum(before, 0)
+        after = current.indices_of(previous.column("id"))
+
+        self.added = ids[~known]
+        self.removed = previous.column("id")[after < 0]
+
+        self.price_moves: Tuple[np.ndarray, np.ndarray, np.ndarray] = (ids[:0], np.empty(0), np.empty(0))
+        if current.has_column("price") and previous.has_column("price"):
+            new = current.column("price")
+            old = previous.column("price")[self._source]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                move = np.abs(new / old - 1.0) * 100.0
+            moved = known & (old > 0) & (move >= price_threshold)
+            self.price_moves = (ids[moved], old[moved], new[moved])
+
+        new_rank = current.column("cmc_rank")
+        old_rank = previous.column("cmc_rank")[self._source]
+        in_top = new_rank <= top_n
+        was_top = known & (old_rank <= top_n)
+        reranked = known & (old_rank != new_rank) & (in_top | was_top)
+        self.rank_changes = (ids[reranked], old_rank[reranked], new_rank[reranked])
+        self.entered_top = ids[in_top & ~was_top]
+        previous_top = previous.column("cmc_rank") <= top_n
+        still_top = np.zeros(len(previous), dtype=bool)
+        present = after >= 0
+        still_top[present] = current.column("cmc_rank")[after[present]] <= top_n
+        self.left_top = previous.column("id")[previous_top & ~still_top]
+
+        self._field_changes: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray, List[str]]] = {}
+
+    def __len__(self) -> int:
+        return (
+            len(self.price_moves[0]) + len(self.rank_changes[0]) + len(self.entered_top)
+            + len(self.left_top) + len(self.added) + len(self.removed)
+        )
+
+    def events(self) -> Iterator[ChangeEvent]:
+        """Every change as a compact event."""
+        for coin_id, old, new in zip(*(column.tolist() for column in self.price_moves)):
+            yield ChangeEvent(PRICE, coin_id, _value(old), _value(new))
+        for coin_id, old, new in zip(*(column.tolist() for column in self.rank_changes)):
+            yield ChangeEvent(RANK, coin_id, old, new)
+        for kind, ids in ((ENTERED_TOP, self.entered_top), (LEFT_TOP, self.left_top),
+                          (ADDED, self.added), (REMOVED, self.removed)):
+            for coin_id in ids.tolist():
+                yield ChangeEvent(kind, coin_id, None, None)
+
+    def changed_fields(self, fields: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Which of ``fields`` changed in which rows of the current snapshot.
+
+        Returns:
+            Rows of the current snapshot with any change, a boolean
+            ``(fields, rows)`` mask of the changed fields of those rows,
+            and the fields compared (those the current snapshot has)
+        """
+        key = tuple(fields)
+        cached = self._field_changes.get(key)
+        if cached is not None:
+            return cached
+        current, previous = self.current, self.previous
+        names = [name for name in key if current.has_column(name)]
+        masks = np.empty((len(names), len(current)), dtype=bool)
+        for i, name in enumerate(names):
+            if not previous.has_column(name):
+                masks[i] = True
+                continue
+            new = current.column(name)
+            old = previous.column(name)[self._source]
+            same = new == old
+            if new.dtype.kind == "f":
+                same |= np.isnan(new) & np.isnan(old)
+            masks[i] = ~self._known | ~same
+        rows = np.flatnonzero(masks.any(axis=0))
+        cached = self._field_changes[key] = (rows, masks[:, rows], names)
+        return cached
+
+    def field_changes(self, fields: Iterable[str]) -> Dict[int, dict]:
+        """``{coin_id: {field: new value}}`` of the coins whose ``fields`` changed."""
+        rows, masks, names = self.changed_fields(fields)
+        changes: Dict[int, dict] = {}
+        for i, values in enumerate(self.current.iter_rows(("id", *names), index=rows)):
+            coin_id = values.pop("id")
+            changes[coin_id] = {name: values[name] for j, name in enumerate(names) if masks[j, i]}
+        return changes
+
+
+class DiffEngine:
+    """Diff every new snapshot of a listings store against the previous one.
+
+    Each diff is computed once and handed to every listener; its events are
+    also kept, numbered, in a ring of the last ``max_events`` per convert
+    currency for consumers that poll with :meth:`events_since`.
+    """
+
+    def __init__(self, store: SnapshotStore, price_threshold: float = 1.0, top_n: int = 100, max_events: int = 5000):
+        self.price_threshold = price_threshold
+        self.top_n = top_n
+        self.max_events = max_events
+        self.diffs = 0
+        self.seq = 0
+        self._previous: Dict[Hashable, MarketSnapshot] = {}
+        self._listeners: List[Callable[[SnapshotDiff], None]] = []
+        self._events: Dict[Hashable, deque] = {}
+        store.subscribe(self._on_snapshot)
+
+    def subscribe(self, listener: Callable[[SnapshotDiff], None]) -> None:
+        """Call ``listener(diff)`` for every new snapshot that follows another."""
+        self._listeners.append(listener)
+
+    def events_since(self, convert: str, since: int = 0) -> Tuple[List[Tuple[int, ChangeEvent]], bool]:
+        """Numbered events of ``convert`` after sequence number ``since``.
+
+        Returns:
+            ``(seq, event)`` pairs in order, and whether older events after
+            ``since`` were already dropped from the ring
+        """
+        ring = self._events.get(convert)
+        if not ring:
+            return [], False
+        truncated = ring[0][0] > since + 1 and since > 0
+        return [(seq, event) for seq, event in ring if seq > since], truncated
+
+    def _on_snapshot(self, convert: Hashable, snapshot: Snapshot) -> None:
+        previous = self._previous.get(convert)
+        if snapshot.data is previous:
+            return  # Unchanged content carried over by the store
+        self._previous[convert] = snapshot.data
+        if previous is None:
+            return
+
+        diff = SnapshotDiff(convert, previous, snapshot.data, self.price_threshold, self.top_n)
+        self.diffs += 1
+        ring = self._events.setdefault(convert, deque(maxlen=self.max_events))
+        for event in diff.events():
+            self.seq += 1
+            ring.append((self.seq, event))
+        if len(diff):
+            logger.debug(f"{convert} listings diff: {len(diff)} events")
+        for listener in self._listeners:
+            try:
+                listener(diff)
+            except Exception as e:
+                logger.error(f"Diff listener {listener!r} failed for {convert}: {e}")
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "diffs": self.diffs,
+            "events": self.seq,
+            "price_threshold": self.price_threshold,
+            "top_n": self.top_n,
+        }
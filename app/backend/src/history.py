@@ -0,0 +1,461 @@
+"""Append-only on-disk history of listings snapshots, indexed by coin and time."""
+import asyncio
+import glob
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .market import MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Quote fields recorded for every coin at every refresh
+HISTORY_FIELDS: Tuple[str, ...] = ("price", "volume_24h", "market_cap")
+
+# A head record: timestamp (ms) and coin count, then the sorted coin IDs
+# (int64) and one float64 array per field, as one snapshot was recorded
+_RECORD = struct.Struct("<qI")
+
+# A sealed chunk: header, coin index (IDs, block offsets from the chunk
+# start, block lengths, sample counts), then one compressed block per coin
+CHUNK_MAGIC = b"CTHIST01"
+_CHUNK = struct.Struct("<8sQqqII")
+_INDEX_DTYPES = (np.int64, np.uint64, np.uint32, np.uint32)
+
+_DAY_MS = 86_400_000
+_INTERVAL_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_interval(text: Optional[str]) -> Optional[int]:
+    """Seconds of an interval such as ``300``, ``5m``, ``1h`` or ``1d``.
+
+    Returns:
+        The seconds, 0 for ``raw`` (every sample), None if no interval is given
+
+    Raises:
+        ValueError: If the interval is not understood or not positive
+    """
+    if text is None or text == "":
+        return None
+    if text == "raw":
+        return 0
+    match = re.fullmatch(r"(\d+)([smhd]?)", text.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError("interval must be raw, a number of seconds or a duration such as 5m, 1h or 1d")
+    return int(match.group(1)) * _INTERVAL_UNITS[match.group(2) or "s"]
+
+
+def _day(ms: int) -> str:
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _encode_blocks(ids: np.ndarray, times: np.ndarray, values: np.ndarray, level: int) -> Tuple[np.ndarray, List[int], List[bytes]]:
+    """Compress samples sorted by (coin, time) into one block per coin.
+
+    Timestamps are stored as deltas and every field as the XOR of its bits
+    with the previous sample's, so slowly changing series become runs of
+    zero bits; the bytes are then grouped by significance before deflating.
+
+    Returns:
+        Coin IDs, sample counts and compressed blocks, in ID order
+    """
+    coins, starts, counts = np.unique(ids, return_index=True, return_counts=True)
+    first = np.zeros(len(ids), dtype=bool)
+    first[starts] = True
+
+    words = np.empty((1 + len(values), len(ids)), dtype=np.uint64)
+    deltas = np.diff(times, prepend=0)
+    deltas[first] = times[first]
+    words[0] = deltas.view(np.uint64)
+    bits = values.view(np.uint64)
+    words[1:, 1:] = bits[:, 1:] ^ bits[:, :-1]
+    words[1:, first] = bits[:, first]
+
+    blocks = []
+    for start, count in zip(starts.tolist(), counts.tolist()):
+        block = words[:, start:start + count]
+        planes = np.ascontiguousarray(block).view(np.uint8).reshape(len(block), count, 8).transpose(0, 2, 1)
+        blocks.append(zlib.compress(planes.tobytes(), level))
+    return coins, counts.tolist(), blocks
+
+
+def _decode_block(blob: bytes, count: int, fields: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of one block of :func:`_encode_blocks`: timestamps and ``(fields, count)`` values."""
+    planes = np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(1 + fields, 8, count)
+    words = np.ascontiguousarray(planes.transpose(0, 2, 1)).view(np.uint64).reshape(1 + fields, count)
+    times = np.cumsum(words[0].view(np.int64))
+    values = np.bitwise_xor.accumulate(words[1:], axis=1).view(np.float64)
+    return times, values
+
+
+class _Chunk(NamedTuple):
+    first: int
+    last: int
+    ids: np.ndarray
+    offsets: np.ndarray
+    lengths: np.ndarray
+    counts: np.ndarray
+    buffer: mmap.mmap
+    start: int
+
+
+def _read_chunks(buffer) -> Tuple[List[_Chunk], int]:
+    """Walk the chunks of a segment.
+
+    Returns:
+        The complete chunks, and the length they span: anything after it is
+        a chunk torn by a crash
+    """
+    chunks, offset, size = [], 0, len(buffer)
+    while offset + _CHUNK.size <= size:
+        magic, length, first, last, coins, _ = _CHUNK.unpack_from(buffer, offset)
+        if magic != CHUNK_MAGIC or length < _CHUNK.size or offset + length > size:
+            break
+        arrays, position = [], offset + _CHUNK.size
+        for dtype in _INDEX_DTYPES:
+            arrays.append(np.frombuffer(buffer, dtype=dtype, count=coins, offset=position))
+            position += coins * np.dtype(dtype).itemsize
+        chunks.append(_Chunk(first, last, *arrays, buffer, offset))
+        offset += length
+    return chunks, offset
+
+
+def encode_record(timestamp: int, ids: np.ndarray, values: np.ndarray) -> bytes:
+    """One head record: ``(fields, coins)`` values of sorted coin IDs at ``timestamp`` (ms)."""
+    return b"".join([
+        _RECORD.pack(timestamp, len(ids)),
+        np.ascontiguousarray(ids, dtype=np.int64).tobytes(),
+        np.ascontiguousarray(values, dtype=np.float64).tobytes(),
+    ])
+
+
+def read_records(buffer, fields: int):
+    """Yield ``(timestamp, ids, values)`` of every complete record of a head file."""
+    offset, size = 0, len(buffer)
+    while offset + _RECORD.size <= size:
+        timestamp, count = _RECORD.unpack_from(buffer, offset)
+        length = _RECORD.size + 8 * count * (1 + fields)
+        if offset + length > size:
+            break
+        ids = np.frombuffer(buffer, dtype=np.int64, count=count, offset=offset + _RECORD.size)
+        values = np.frombuffer(
+            buffer, dtype=np.float64, count=count * fields, offset=offset + _RECORD.size + 8 * count
+        ).reshape(fields, count)
+        yield timestamp, ids, values
+        offset += length
+
+
+def map_file(path: str):
+    """Read-only mapping of a file, or None if it is missing or empty."""
+    try:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+class HistoryStore:
+    """Time series of every coin's price, volume and market cap.
+
+    Each recorded snapshot is appended to the *head* file of the current
+    chunk (``chunk_interval`` seconds) as is: sorted IDs and one raw column
+    per field. Once a chunk is over, its head is sealed in a background
+    thread into the day's *segment* file: the samples are regrouped by coin,
+    delta/XOR-encoded and deflated per coin, behind an index of coin IDs
+    and block offsets. Segments are only ever appended to, one per UTC day
+    and convert currency, and are dropped after ``retention_days``.
+
+    Reads ``mmap`` the files and touch only what the query needs: chunk
+    headers to skip chunks outside the range, the coin index, and the
+    compressed block of the one coin. Records of open chunks are searched
+    in place. Any number of processes may read; one must write.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fields: Tuple[str, ...] = HISTORY_FIELDS,
+        chunk_interval: int = 3600,
+        retention_days: int = 90,
+        level: int = 6
+    ):
+        self.directory = directory
+        self.fields = fields
+        self.chunk_ms = chunk_interval * 1000
+        self.retention_days = retention_days
+        self.level = level
+        self.records = 0
+        self.sealed = 0
+        self.errors = 0
+        self._last: Dict[str, Tuple[MarketSnapshot, int]] = {}
+        self._heads: Dict[str, str] = {}
+        self._segments: Dict[str, Tuple[Tuple[int, int], List[_Chunk]]] = {}
+        self._sealing: Optional[asyncio.Future] = None
+
+    def convert_dir(self, convert: str) -> str:
+        """Directory of one convert currency's files."""
+        if not convert.isalnum():
+            raise ValueError(f"Invalid convert currency: {convert!r}")
+        return os.path.join(self.directory, convert)
+
+    def _segment_path(self, convert: str, ms: int) -> str:
+        return os.path.join(self.convert_dir(convert), f"{_day(ms)}.seg")
+
+    # Writing
+
+    def append(self, convert: str, data: MarketSnapshot, fetched_at: float) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """Record one listings snapshot; errors are logged, never raised.
+
+        Returns:
+            The recorded timestamp (ms), sorted coin IDs and ``(fields, coins)``
+            values, or None if nothing was recorded
+        """
+        timestamp = int(fetched_at * 1000)
+        last = self._last.get(convert)
+        if last is not None and (last[0] is data or last[1] >= timestamp):
+            return None  # Same content, or not newer than what is recorded
+        ids = data.column("id")
+        order = np.argsort(ids, kind="stable")
+        values = np.empty((len(self.fields), len(data)))
+        for i, name in enumerate(self.fields):
+            values[i] = data.column(name)[order] if data.has_column(name) else np.nan
+        ids = np.ascontiguousarray(ids[order], dtype=np.int64)
+        if not self.add(convert, timestamp, ids, values):
+            return None
+        self._last[convert] = (data, timestamp)
+        return timestamp, ids, values
+
+    def add(self, convert: str, timestamp: int, ids: np.ndarray, values: np.ndarray) -> bool:
+        """Append one record: ``(fields, coins)`` values of sorted coin IDs at ``timestamp`` (ms).
+
+        Returns:
+            Whether it was written; errors are logged, never raised
+        """
+        chunk_start = timestamp - timestamp % self.chunk_ms
+        try:
+            path = os.path.join(self.convert_dir(convert), f"{chunk_start}.head")
+            if self._heads.get(convert) != path:
+                os.makedirs(self.convert_dir(convert), exist_ok=True)
+                self._heads[convert] = path
+                self._truncate_torn(path)
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, encode_record(timestamp, ids, values))
+            finally:
+                os.close(fd)
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Recording {convert} history in {self.directory} failed: {e}")
+            return False
+        self.records += 1
+        self._seal_later()
+        return True
+
+    def _truncate_torn(self, path: str) -> None:
+        """Cut a record torn by a crash off the end of a head before appending to it."""
+        buffer = map_file(path)
+        if buffer is None:
+            return
+        end = 0
+        for _, ids, _ in read_records(buffer, len(self.fields)):
+            end += _RECORD.size + 8 * len(ids) * (1 + len(self.fields))
+        if end < len(buffer):
+            logger.warning(f"Dropping {len(buffer) - end} torn bytes at the end of {path}")
+            os.truncate(path, end)
+
+    def _seal_later(self) -> None:
+        if self._sealing is not None and not self._sealing.done():
+            return  # The next append seals what this one would have
+        now = int(time.time() * 1000)
+        open_heads = set(self._heads.values())
+        finished = [
+            path for path in glob.glob(os.path.join(self.directory, "*", "*.head"))
+            if path not in open_heads and int(os.path.basename(path)[:-5]) + self.chunk_ms <= now
+        ]
+        if finished:
+            self._sealing = asyncio.get_running_loop().run_in_executor(None, self._seal_all, finished)
+
+    def _seal_all(self, paths: List[str]) -> None:
+        for path in sorted(paths):
+            try:
+                self._seal(path)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Sealing history chunk {path} failed: {e}")
+        self._expire()
+
+    def _seal(self, head_path: str) -> None:
+        """Move the records of a finished head into its day's segment."""
+        buffer = map_file(head_path)
+        if buffer is None:
+            os.unlink(head_path)
+            return
+        fields = len(self.fields)
+        records = list(read_records(buffer, fields))
+        if records:
+            times = np.concatenate([np.full(len(ids), timestamp, dtype=np.int64) for timestamp, ids, _ in records])
+            ids = np.concatenate([ids for _, ids, _ in records])
+            values = np.concatenate([values for _, _, values in records], axis=1)
+            order = np.lexsort((times, ids))
+            coins, counts, blocks = _encode_blocks(ids[order], times[order], values[:, order], self.level)
+
+            index_size = len(coins) * sum(np.dtype(dtype).itemsize for dtype in _INDEX_DTYPES)
+            lengths = np.array([len(block) for block in blocks], dtype=np.uint32)
+            offsets = _CHUNK.size + index_size + np.concatenate(([0], np.cumsum(lengths[:-1], dtype=np.uint64)))
+            length = _CHUNK.size + index_size + int(lengths.sum())
+            chunk = b"".join([
+                _CHUNK.pack(CHUNK_MAGIC, length, int(times.min()), int(times.max()), len(coins), len(records)),
+                coins.astype(np.int64).tobytes(),
+                offsets.astype(np.uint64).tobytes(),
+                lengths.tobytes(),
+                np.array(counts, dtype=np.uint32).tobytes(),
+                *blocks,
+            ])
+
+            segment = os.path.join(os.path.dirname(head_path), f"{_day(records[0][0])}.seg")
+            with open(segment, "ab") as file:
+                existing = map_file(segment)
+                if existing is not None:
+                    _, end = _read_chunks(existing)
+                    if end < len(existing):
+                        logger.warning(f"Dropping a torn chunk at the end of {segment}")
+                        file.truncate(end)
+                file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            self.sealed += 1
+            logger.debug(f"Sealed {len(records)} samples of {len(coins)} coins into {segment} ({length} bytes)")
+        os.unlink(head_path)
+
+    def _expire(self) -> None:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime("%Y-%m-%d")
+        for path in glob.glob(os.path.join(self.directory, "*", "*.seg")):
+            if os.path.basename(path)[:-4] < cutoff:
+                os.unlink(path)
+                logger.info(f"Removed expired history segment {path}")
+
+    async def close(self) -> None:
+        """Wait for a chunk being sealed."""
+        if self._sealing is not None:
+            await asyncio.gather(self._sealing, return_exceptions=True)
+
+    # Reading
+
+    def _chunks(self, path: str) -> List[_Chunk]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._segments.pop(path, None)
+            return []
+        signature = (stat.st_ino, stat.st_size)
+        cached = self._segments.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        buffer = map_file(path)
+        chunks = _read_chunks(buffer)[0] if buffer is not None else []
+        self._segments[path] = (signature, chunks)
+        return chunks
+
+    def read(
+        self,
+        convert: str,
+        coin_id: int,
+        start: float,
+        end: float,
+        max_points: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples of one coin between two times, inclusive.
+
+        The range is first clamped to the days kept and to now, so the work
+        does not grow with how far back ``start`` reaches.
+
+        Args:
+            convert: Convert currency of the snapshots
+            coin_id: CoinMarketCap ID
+            start, end: Unix times in seconds
+            max_points: Most samples worth decompressing, if limited
+
+        Returns:
+            Timestamps in milliseconds, ascending, and a ``(fields, samples)``
+            array of values, NaN where missing
+
+        Raises:
+            ValueError: If the chunks within the range hold more than
+                ``max_points`` samples of the coin; checked on the chunk
+                indexes, before any block is decompressed
+        """
+        now_ms = int(time.time() * 1000)
+        # The oldest day _expire keeps
+        first_day_ms = (now_ms // _DAY_MS - self.retention_days) * _DAY_MS
+        start_ms = max(int(start * 1000), first_day_ms)
+        end_ms = min(int(end * 1000), now_ms)
+        fields = len(self.fields)
+        times: List[np.ndarray] = []
+        values: List[np.ndarray] = []
+
+        # Heads before segments: a head sealed in between is then found in its segment
+        for path in glob.glob(os.path.join(self.convert_dir(convert), "*.head")):
+            chunk_start = int(os.path.basename(path)[:-5])
+            if chunk_start > end_ms or chunk_start + self.chunk_ms <= start_ms:
+                continue
+            buffer = map_file(path)
+            if buffer is None:
+                continue  # Sealed meanwhile: its samples are in the segment
+            for timestamp, ids, record_values in read_records(buffer, fields):
+                position = int(np.searchsorted(ids, coin_id))
+                if position < len(ids) and ids[position] == coin_id:
+                    times.append(np.array([timestamp], dtype=np.int64))
+                    values.append(record_values[:, position:position + 1])
+
+        # Find the coin's blocks, and count the samples of chunks wholly in range, before decoding any
+        blocks: List[Tuple[_Chunk, int]] = []
+        samples = len(times)
+        day = start_ms - start_ms % _DAY_MS
+        while day <= end_ms:
+            for chunk in self._chunks(self._segment_path(convert, day)):
+                if chunk.last < start_ms or chunk.first > end_ms:
+                    continue
+                position = int(np.searchsorted(chunk.ids, coin_id))
+                if position == len(chunk.ids) or chunk.ids[position] != coin_id:
+                    continue
+                blocks.append((chunk, position))
+                if start_ms <= chunk.first and chunk.last <= end_ms:
+                    samples += int(chunk.counts[position])
+            day += _DAY_MS
+        if max_points is not None and samples > max_points:
+            raise ValueError(f"More than {max_points} samples in range")
+
+        for chunk, position in blocks:
+            offset = chunk.start + int(chunk.offsets[position])
+            blob = chunk.buffer[offset:offset + int(chunk.lengths[position])]
+            block_times, block_values = _decode_block(blob, int(chunk.counts[position]), fields)
+            times.append(block_times)
+            values.append(block_values)
+
+        if not times:
+            return np.empty(0, dtype=np.int64), np.empty((fields, 0))
+        all_times = np.concatenate(times)
+        all_values = np.concatenate(values, axis=1)
+        # Ascending and unique: a chunk being sealed may be seen both as head and segment
+        all_times, first = np.unique(all_times, return_index=True)
+        keep = (all_times >= start_ms) & (all_times <= end_ms)
+        return all_times[keep], all_values[:, first][:, keep]
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "directory": self.directory,
+            "records": self.records,
+            "sealed_chunks": self.sealed,
+            "errors": self.errors,
+        }
@@ -1,34 +1,321 @@
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from aiohttp import ClientSession, ClientError, ClientResponseError
+import math
+import re
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Dict, Any, List, Optional, Set, Tuple
+from aiohttp import ClientError, ClientResponse, ClientSession, ClientTimeout, TCPConnector, TraceConfig
+from .codec import codec
 from .config import settings
 
 logger = logging.getLogger(__name__)
 
 
 class HTTPClientError(Exception):
-    """Custom exception for HTTP client errors."""
-    pass
+    """Custom exception for HTTP client errors.
+    
+    Attributes:
+        status: Upstream HTTP status, if a response was received
+        retryable: Whether the same request may succeed if repeated
+            (network errors, timeouts, 429 and 5xx responses)
+        retry_after: Seconds the upstream asked us to wait, if it did
+    """
+    
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retryable: bool = False,
+        retry_after: Optional[float] = None
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delay or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable_status(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _parse_invalid_ids(error_message: str) -> Set[int]:
+    """Extract the IDs from a CMC 'Invalid value(s) for "id": "1,2"' error."""
+    match = re.search(r'for "id":\s*"([\d,\s]+)"', error_message)
+    if not match:
+        return set()
+    return {int(part) for part in match.group(1).split(',') if part.strip().isdigit()}
+
+
+def listings_credits(limit: int) -> int:
+    """CMC credits of a listings call: one per 200 coins returned."""
+    return max(1, math.ceil(limit / 200))
+
+
+def quotes_credits(count: int) -> int:
+    """CMC credits of a quotes call: one per 100 coins returned."""
+    return max(1, math.ceil(count / 100))
+
+
+@dataclass(frozen=True)
+class PoolConfig:
+    """Connection pool and timeout settings of an :class:`HTTPClient` session."""
+    limit: int = 100
+    limit_per_host: int = 20
+    keepalive_timeout: float = 30.0
+    dns_cache_ttl: int = 300
+    connect_timeout: float = 5.0
+    read_timeout: float = 20.0
+    total_timeout: float = 30.0
+    
+    @classmethod
+    def from_settings(cls) -> "PoolConfig":
+        return cls(
+            limit=settings.HTTP_POOL_SIZE,
+            limit_per_host=settings.HTTP_POOL_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            dns_cache_ttl=settings.HTTP_DNS_CACHE_TTL,
+            connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+            read_timeout=settings.HTTP_READ_TIMEOUT,
+            total_timeout=settings.REQUEST_TIMEOUT
+        )
+
+
+class PoolMetrics:
+    """Connection pool usage collected through aiohttp request tracing."""
+    
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.queued = 0
+        self.waiting = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+    
+    def trace_config(self) -> TraceConfig:
+        """Build a TraceConfig feeding these counters."""
+        trace = TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_end.append(self._on_request_done)
+        trace.on_request_exception.append(self._on_request_done)
+        trace.on_connection_create_end.append(self._count("connections_created"))
+        trace.on_connection_reuseconn.append(self._count("connections_reused"))
+        trace.on_connection_queued_start.append(self._on_queued_start)
+        trace.on_connection_queued_end.append(self._on_queued_end)
+        trace.on_dns_cache_hit.append(self._count("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(self._count("dns_cache_misses"))
+        return trace
+    
+    def _count(self, name: str):
+        async def handler(session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+            setattr(self, name, getattr(self, name) + 1)
+        return handler
+    
+    async def _on_request_start(self, session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+        self.requests += 1
+        self.in_flight += 1
+    
+    async def _on_request_done(self, session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+        self.in_flight -= 1
+    
+    async def _on_queued_start(self, session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+        self.queued += 1
+        self.waiting += 1
+    
+    async def _on_queued_end(self, session: ClientSession, context: SimpleNamespace, params: Any) -> None:
+        self.waiting -= 1
+    
+    def stats(self) -> Dict[str, int]:
+        """Return pool counters for monitoring."""
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "queued_for_connection": self.queued,
+            "waiting_for_connection": self.waiting,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+        }
 
 
 class HTTPClient:
-    """Base HTTP client with error handling."""
+    """Base HTTP client with error handling.
     
-    def __init__(self, base_url: str, api_key: str):
+    The session and its connection pool are created by :meth:`start`,
+    which must run inside the event loop that will use them (the app
+    lifespan); a request made before that creates them lazily. Nothing
+    touches the network or an event loop at construction time.
+    
+    Requests go through the optional ``retry_policy`` and ``breaker``
+    (see ``resilience.py``); without them every request is one attempt.
+    Each attempt first reserves its credits from the optional ``budget``
+    (see ``rate_limit.py``).
+    """
+    
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str,
+        retry_policy=None,
+        breaker=None,
+        budget=None,
+        pool: Optional[PoolConfig] = None
+    ):
         self.base_url = base_url
-        self.session = ClientSession(
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.budget = budget
+        self.pool = pool or PoolConfig()
+        self.pool_metrics = PoolMetrics()
+        self._headers = {
+            'X-CMC_PRO_API_KEY': api_key,
+            'Accept': 'application/json'
+        }
+        self._session: Optional[ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def start(self) -> None:
+        """Create the session and connection pool in the running event loop."""
+        self._ensure_session()
+    
+    @property
+    def session(self) -> ClientSession:
+        """The session bound to the running event loop, created on first use."""
+        return self._ensure_session()
+    
+    def _ensure_session(self) -> ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is loop:
+            return self._session
+        if self._session is not None and self._session_loop is not loop:
+            # A session cannot be used (or closed) from another loop, e.g. after a fork
+            logger.warning("Discarding HTTP session created in another event loop")
+        pool = self.pool
+        connector = TCPConnector(
+            limit=pool.limit,
+            limit_per_host=pool.limit_per_host,
+            keepalive_timeout=pool.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=pool.dns_cache_ttl,
+            enable_cleanup_closed=True
+        )
+        self._session = ClientSession(
             base_url=self.base_url,
-            headers={
-                'X-CMC_PRO_API_KEY': api_key,
-                'Accept': 'application/json'
-            },
-            timeout=30
+            headers=self._headers,
+            connector=connector,
+            timeout=ClientTimeout(
+                total=pool.total_timeout,
+                connect=pool.connect_timeout,
+                sock_read=pool.read_timeout
+            ),
+            trace_configs=[self.pool_metrics.trace_config()]
+        )
+        self._session_loop = loop
+        logger.info(
+            f"HTTP session started for {self.base_url} "
+            f"(pool={pool.limit}, per_host={pool.limit_per_host}, timeout={pool.total_timeout}s)"
         )
+        return self._session
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Return connection pool configuration and usage counters."""
+        return {
+            "limit": self.pool.limit,
+            "limit_per_host": self.pool.limit_per_host,
+            "open": self._session is not None and not self._session.closed,
+            **self.pool_metrics.stats(),
+        }
+    
+    @staticmethod
+    async def _read_json(response: ClientResponse) -> Any:
+        """Decode a response body with the configured JSON codec."""
+        return codec.loads(await response.read())
+    
+    async def _get_json(
+        self,
+        url: str,
+        params: Dict[str, Any],
+        accept_statuses: Tuple[int, ...] = (),
+        credits: float = 1
+    ) -> Tuple[int, Any]:
+        """GET ``url`` with retries and circuit breaking, returning status and decoded body.
+        
+        Args:
+            url: Path relative to the base URL
+            params: Query parameters
+            accept_statuses: Error statuses returned to the caller instead of raised
+            credits: Estimated upstream credits the request costs
+            
+        Raises:
+            HTTPClientError: If the request fails or the budget cannot cover it
+        """
+        async def attempt():
+            return await self._attempt(url, params, accept_statuses)
+        
+        async def budgeted():
+            await self.budget.acquire(credits)
+            try:
+                status, result = await (self.breaker.call(attempt) if self.breaker is not None else attempt())
+            except HTTPClientError:
+                self.budget.settle(credits, 0)  # Failed calls are not billed
+                raise
+            reported = result.get('status', {}).get('credit_count') if isinstance(result, dict) else None
+            self.budget.settle(credits, reported)
+            return status, result
+        
+        call = attempt
+        if self.budget is not None:
+            call = budgeted
+        elif self.breaker is not None:
+            call = lambda: self.breaker.call(attempt)
+        if self.retry_policy is not None:
+            return await self.retry_policy.call(call, name=f"GET {url}")
+        return await call()
+    
+    async def _attempt(self, url: str, params: Dict[str, Any], accept_statuses: Tuple[int, ...]) -> Tuple[int, Any]:
+        """Make a single GET request, mapping every failure to :class:`HTTPClientError`."""
+        try:
+            async with self.session.get(url=url, params=params) as response:
+                if response.status in accept_statuses:
+                    return response.status, await self._read_json(response)
+                if response.status >= 400:
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                    raise HTTPClientError(
+                        f"HTTP error: {response.status} - {response.reason}",
+                        status=response.status,
+                        retryable=_is_retryable_status(response.status),
+                        retry_after=retry_after
+                    )
+                return response.status, await self._read_json(response)
+        except ClientError as e:
+            raise HTTPClientError(f"Network error: {str(e)}", retryable=True)
+        except asyncio.TimeoutError:
+            raise HTTPClientError(f"Timeout requesting {url}", retryable=True)
     
     async def close(self):
-        """Close the HTTP session."""
-        if self.session and not self.session.closed:
-            await self.session.close()
+        """Close the HTTP session and its connection pool."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
     
     async def __aenter__(self):
         return self
@@ -59,76 +346,100 @@ class CMCHTTPClient(HTTPClient):
                 'convert': convert
             }
             
-            async with self.session.get(
-                url='/v1/cryptocurrency/listings/latest',
-                params=params
-            ) as response:
-                response.raise_for_status()
-                result = await response.json()
-                
-                if result.get('status', {}).get('error_code') != 0:
-                    error_message = result.get('status', {}).get('error_message', 'Unknown API error')
-                    logger.error(f"CMC API error: {error_message}")
-                    raise HTTPClientError(f"CMC API error: {error_message}")
-                
-                logger.info(f"Successfully fetched {len(result.get('data', []))} cryptocurrency listings")
-                return result['data']
-                
-        except ClientResponseError as e:
-            logger.error(f"HTTP error getting listings: {e.status} - {e.message}")
-            raise HTTPClientError(f"HTTP error: {e.status} - {e.message}")
-        except ClientError as e:
-            logger.error(f"Client error getting listings: {str(e)}")
-            raise HTTPClientError(f"Network error: {str(e)}")
+            _, result = await self._get_json(
+                '/v1/cryptocurrency/listings/latest',
+                params,
+                credits=listings_credits(params['limit'])
+            )
+            
+            if result.get('status', {}).get('error_code') != 0:
+                error_message = result.get('status', {}).get('error_message', 'Unknown API error')
+                logger.error(f"CMC API error: {error_message}")
+                raise HTTPClientError(f"CMC API error: {error_message}")
+            
+            logger.info(f"Successfully fetched {len(result.get('data', []))} cryptocurrency listings")
+            return result['data']
+            
+        except HTTPClientError as e:
+            logger.error(f"Error getting listings: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Unexpected error getting listings: {str(e)}")
             raise HTTPClientError(f"Unexpected error: {str(e)}")
     
-    async def get_currency(self, currency_id: int, convert: str = 'USD') -> Dict[str, Any]:
-        """Get specific currency by ID.
+    async def get_currencies(self, currency_ids: List[int], convert: str = 'USD') -> Dict[int, Dict[str, Any]]:
+        """Get several currencies by ID in a single upstream call.
         
         Args:
-            currency_id: The cryptocurrency ID
+            currency_ids: The cryptocurrency IDs
             convert: Currency to convert prices to
             
         Returns:
-            Dictionary containing cryptocurrency data
+            Dictionary mapping each known ID to its cryptocurrency data;
+            IDs unknown to CoinMarketCap are left out
             
         Raises:
             HTTPClientError: If API request fails
         """
+        ids = sorted(set(currency_ids))
         try:
-            params = {
-                'id': currency_id,
-                'convert': convert
-            }
-            
-            async with self.session.get(
-                url='/v2/cryptocurrency/quotes/latest',
-                params=params
-            ) as response:
-                response.raise_for_status()
-                result = await response.json()
+            while ids:
+                params = {
+                    'id': ','.join(str(currency_id) for currency_id in ids),
+                    'convert': convert
+                }
+                
+                status, result = await self._get_json(
+                    '/v2/cryptocurrency/quotes/latest',
+                    params,
+                    accept_statuses=(400,),
+                    credits=quotes_credits(len(ids))
+                )
+                if status == 400:
+                    # CMC rejects the whole batch if any ID is unknown; drop those and retry
+                    error_message = result.get('status', {}).get('error_message') or ''
+                    invalid_ids = _parse_invalid_ids(error_message)
+                    if invalid_ids and invalid_ids & set(ids):
+                        logger.warning(f"Dropping unknown currency IDs from batch: {sorted(invalid_ids)}")
+                        ids = [currency_id for currency_id in ids if currency_id not in invalid_ids]
+                        continue
+                    raise HTTPClientError(f"HTTP error: 400 - {error_message or 'Bad Request'}", status=400)
                 
                 if result.get('status', {}).get('error_code') != 0:
                     error_message = result.get('status', {}).get('error_message', 'Unknown API error')
-                    logger.error(f"CMC API error for currency {currency_id}: {error_message}")
+                    logger.error(f"CMC API error for currencies {ids}: {error_message}")
                     raise HTTPClientError(f"CMC API error: {error_message}")
                 
-                currency_data = result['data'].get(str(currency_id))
-                if not currency_data:
-                    logger.error(f"Currency with ID {currency_id} not found")
-                    raise HTTPClientError(f"Currency with ID {currency_id} not found")
+                currencies = {int(currency_id): data for currency_id, data in result['data'].items() if data}
+                logger.info(f"Successfully fetched data for {len(currencies)}/{len(ids)} currency IDs")
+                return currencies
+            return {}
                 
-                logger.info(f"Successfully fetched data for currency ID {currency_id}")
-                return currency_data
-                
-        except ClientResponseError as e:
-            logger.error(f"HTTP error getting currency {currency_id}: {e.status} - {e.message}")
-            raise HTTPClientError(f"HTTP error: {e.status} - {e.message}")
-        except ClientError as e:
-            logger.error(f"Client error getting currency {currency_id}: {str(e)}")
-            raise HTTPClientError(f"Network error: {str(e)}")
+        except HTTPClientError as e:
+            logger.error(f"Error getting currencies {ids}: {str(e)}")
+            raise
         except Exception as e:
-            logger.error(f"Unexpected error getting currency {currency_id}: {str(e)}")
+            logger.error(f"Unexpected error getting currencies {ids}: {str(e)}")
             raise HTTPClientError(f"Unexpected error: {str(e)}")
+    
+    async def get_currency(self, currency_id: int, convert: str = 'USD') -> Dict[str, Any]:
+        """Get specific currency by ID.
+        
+        Args:
+            currency_id: The cryptocurrency ID
+            convert: Currency to convert prices to
+            
+        Returns:
+            Dictionary containing cryptocurrency data
+            
+        Raises:
+            HTTPClientError: If API request fails
+        """
+        currencies = await self.get_currencies([currency_id], convert=convert)
+        currency_data = currencies.get(currency_id)
+        if not currency_data:
+            logger.error(f"Currency with ID {currency_id} not found")
+            raise HTTPClientError(f"Currency with ID {currency_id} not found")
+        
+        logger.info(f"Successfully fetched data for currency ID {currency_id}")
+        return currency_data
@@ -0,0 +1,320 @@
+"""Technical indicators over history bars, extended incrementally as bars close."""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .rollup import BAR_FIELDS, RollupPipeline
+
+logger = logging.getLogger(__name__)
+
+# Indicator kinds served
+INDICATORS: Tuple[str, ...] = ("sma", "ema", "rsi", "volatility")
+
+_CLOSE = BAR_FIELDS.index("close")
+_YEAR = 365 * 86400
+
+
+class Indicator:
+    """Running state of one indicator over a series of closes.
+
+    :meth:`fold` takes the next closes and returns the indicator's value at
+    each, NaN while it is still warming up; the state carries over to the
+    next call, so extending a series costs only the new closes.
+    """
+
+    # Closes needed before the values settle, in windows
+    warmup = 1
+
+    def __init__(self, window: int):
+        self.window = window
+
+    def fold(self, closes: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def copy(self) -> "Indicator":
+        return copy.deepcopy(self)
+
+
+class SMA(Indicator):
+    """Simple moving average of the last ``window`` closes."""
+
+    def __init__(self, window: int):
+        super().__init__(window)
+        self._tail = np.empty(0)
+
+    def fold(self, closes: np.ndarray) -> np.ndarray:
+        series = np.concatenate([self._tail, closes])
+        values = np.full(len(series), np.nan)
+        if len(series) >= self.window:
+            sums = np.cumsum(np.concatenate(([0.0], series)))
+            values[self.window - 1:] = (sums[self.window:] - sums[:-self.window]) / self.window
+        self._tail = series[max(len(series) - (self.window - 1), 0):] if self.window > 1 else series[:0]
+        return values[len(values) - len(closes):]
+
+
+class EMA(Indicator):
+    """Exponential moving average, seeded with the SMA of the first ``window`` closes."""
+
+    warmup = 4
+
+    def __init__(self, window: int):
+        super().__init__(window)
+        self._alpha = 2.0 / (window + 1)
+        self._seed: List[float] = []
+        self._value: Optional[float] = None
+
+    def fold(self, closes: np.ndarray) -> np.ndarray:
+        values = np.full(len(closes), np.nan)
+        alpha, value = self._alpha, self._value
+        for i, close in enumerate(closes.tolist()):
+            if value is None:
+                self._seed.append(close)
+                if len(self._seed) < self.window:
+                    continue
+                value = sum(self._seed) / self.window
+            else:
+                value += alpha * (close - value)
+            values[i] = value
+        self._value = value
+        return values
+
+
+class RSI(Indicator):
+    """Relative strength index with Wilder's smoothing over ``window`` changes."""
+
+    warmup = 4
+
+    def __init__(self, window: int):
+        super().__init__(window)
+        self._previous: Optional[float] = None
+        self._changes = 0
+        self._gain = 0.0
+        self._loss = 0.0
+
+    def fold(self, closes: np.ndarray) -> np.ndarray:
+        values = np.full(len(closes), np.nan)
+        window, previous = self.window, self._previous
+        gain, loss, changes = self._gain, self._loss, self._changes
+        for i, close in enumerate(closes.tolist()):
+            if previous is not None:
+                change = close - previous
+                up, down = max(change, 0.0), max(-change, 0.0)
+                changes += 1
+                if changes <= window:
+                    # Plain average of the first window changes, then smoothed
+                    gain += up / window
+                    loss += down / window
+                else:
+                    gain += (up - gain) / window
+                    loss += (down - loss) / window
+                if changes >= window:
+                    values[i] = 100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+            previous = close
+        self._previous, self._gain, self._loss, self._changes = previous, gain, loss, changes
+        return values
+
+
+class Volatility(Indicator):
+    """Annualised standard deviation of log returns over the last ``window`` bars."""
+
+    def __init__(self, window: int, periods_per_year: float):
+        super().__init__(window)
+        self._scale = np.sqrt(periods_per_year)
+        self._tail = np.empty(0)
+
+    def fold(self, closes: np.ndarray) -> np.ndarray:
+        series = np.concatenate([self._tail, closes])
+        values = np.full(len(series), np.nan)
+        if len(series) > self.window >= 2:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                returns = np.diff(np.log(series))
+            sums = np.cumsum(np.concatenate(([0.0], returns)))
+            squares = np.cumsum(np.concatenate(([0.0], returns * returns)))
+            n = self.window
+            total = sums[n:] - sums[:-n]
+            variance = (squares[n:] - squares[:-n] - total * total / n) / (n - 1)
+            values[n:] = np.sqrt(np.maximum(variance, 0.0)) * self._scale
+        self._tail = series[max(len(series) - self.window, 0):]
+        return values[len(values) - len(closes):]
+
+
+def make_indicator(kind: str, window: int, interval: int) -> Indicator:
+    """Indicator of ``kind`` over ``window`` bars of ``interval`` seconds.
+
+    Raises:
+        ValueError: If the kind is unknown
+    """
+    if kind == "sma":
+        return SMA(window)
+    if kind == "ema":
+        return EMA(window)
+    if kind == "rsi":
+        return RSI(window)
+    if kind == "volatility":
+        return Volatility(window, _YEAR / interval)
+    raise ValueError(f"Unknown indicator: {kind}. Choose from {', '.join(INDICATORS)}")
+
+
+def correlation_matrix(
+    times: Sequence[np.ndarray],
+    closes: Sequence[np.ndarray],
+    window: Optional[int] = None
+) -> Tuple[np.ndarray, int]:
+    """Pearson correlation of the log returns of several close series.
+
+    Only bars present in every series are used, the last ``window`` + 1 of
+    them when given.
+
+    Returns:
+        ``(series, series)`` matrix, NaN where undefined, and the number of returns used
+    """
+    common = times[0]
+    for other in times[1:]:
+        common = np.intersect1d(common, other, assume_unique=True)
+    if window is not None:
+        common = common[-(window + 1):]
+    if len(common) < 3:
+        return np.full((len(times), len(times)), np.nan), max(len(common) - 1, 0)
+    aligned = np.stack([
+        series[np.searchsorted(series_times, common)] for series_times, series in zip(times, closes)
+    ])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.diff(np.log(aligned), axis=1)
+        matrix = np.corrcoef(returns)
+    return np.atleast_2d(matrix), returns.shape[1]
+
+
+class _Series:
+    """Finished bars of one coin and the indicators computed over them."""
+
+    def __init__(self, first: int):
+        self.first = first
+        # Held while the series is read up to date and extended
+        self.lock = threading.Lock()
+        self.times = np.empty(0, dtype=np.int64)
+        self.closes = np.empty(0)
+        self.indicators: Dict[str, Tuple[Indicator, np.ndarray]] = {}
+
+
+class IndicatorEngine:
+    """Indicators of coins' history bars, cached and extended as bars close.
+
+    Each (coin, interval, window) keeps the closes of its finished bars and
+    the running state of every indicator asked for; a request only reads
+    the bars that closed since the previous one and folds them in. The
+    still open bar is evaluated on a copy of the state, never committed.
+    At most ``max_series`` series are kept, least recently used first out.
+
+    Requests are computed in the thread pool: one lock guards the cache of
+    series, and each series has its own, so requests for different series
+    read history in parallel.
+    """
+
+    def __init__(self, rollups: RollupPipeline, max_series: int = 256, max_points: int = 5000):
+        self.rollups = rollups
+        self.max_series = max_series
+        self.max_points = max_points
+        self.hits = 0
+        self.misses = 0
+        self._series: "OrderedDict[Hashable, _Series]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _closes(self, convert: str, coin_id: int, start: float, end: float, interval: int) -> Tuple[np.ndarray, np.ndarray]:
+        _, times, bars = self.rollups.bars(convert, coin_id, start, end, interval)
+        closes = bars[_CLOSE]
+        present = ~np.isnan(closes)
+        return times[present], closes[present]
+
+    def compute(
+        self,
+        convert: str,
+        coin_id: int,
+        kinds: Sequence[str],
+        window: int,
+        interval: int,
+        start: float,
+        end: float
+    ) -> Tuple[np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """Indicators of one coin's bars starting between two Unix times (seconds).
+
+        Returns:
+            Bar start times (ms), closes, and each indicator's values at those bars
+        """
+        indicators = [make_indicator(kind, window, interval) for kind in kinds]
+        step = interval * 1000
+        warmup = window * max(indicator.warmup for indicator in indicators) + 1
+        first = int((start - warmup * interval) * 1000)
+        first -= first % step
+
+        key = (convert, coin_id, interval, window)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or series.first > first:
+                self.misses += 1
+                series = _Series(first)
+            else:
+                self.hits += 1
+            self._series[key] = series
+            self._series.move_to_end(key)
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+        with series.lock:
+            # Read the bars closed since the series was last extended
+            since = series.times[-1] + step if len(series.times) else series.first
+            times, closes = self._closes(convert, coin_id, since / 1000, end, interval)
+
+            # Fold bars whose period is over; the open one is evaluated separately
+            finished = times + step <= time.time() * 1000
+            if finished.any():
+                series.times = np.concatenate([series.times, times[finished]])
+                series.closes = np.concatenate([series.closes, closes[finished]])
+                for kind, (indicator, values) in series.indicators.items():
+                    series.indicators[kind] = (indicator, np.concatenate([values, indicator.fold(closes[finished])]))
+            for kind, indicator in zip(kinds, indicators):
+                if kind not in series.indicators:
+                    series.indicators[kind] = (indicator, indicator.fold(series.closes))
+
+            # Bound memory: drop the oldest bars past what any request needs
+            excess = len(series.times) - (self.max_points + warmup)
+            if excess > 0:
+                series.times, series.closes = series.times[excess:], series.closes[excess:]
+                series.first = int(series.times[0])
+                for kind, (indicator, values) in series.indicators.items():
+                    series.indicators[kind] = (indicator, values[excess:])
+
+            open_times, open_closes = times[~finished], closes[~finished]
+            all_times = np.concatenate([series.times, open_times])
+            keep = (all_times >= start * 1000) & (all_times <= end * 1000)
+            results = {}
+            for kind in kinds:
+                indicator, values = series.indicators[kind]
+                if len(open_times):
+                    values = np.concatenate([values, indicator.copy().fold(open_closes)])
+                results[kind] = values[keep]
+            return all_times[keep], np.concatenate([series.closes, open_closes])[keep], results
+
+    def correlation(
+        self,
+        convert: str,
+        coin_ids: Sequence[int],
+        window: int,
+        interval: int,
+        end: float
+    ) -> Tuple[np.ndarray, int]:
+        """Correlation matrix of the returns of several coins over the last ``window`` bars before ``end``."""
+        start = end - (window + 1) * interval
+        times, closes = [], []
+        for coin_id in coin_ids:
+            coin_times, coin_closes = self._closes(convert, coin_id, start, end, interval)
+            times.append(coin_times)
+            closes.append(coin_closes)
+        return correlation_matrix(times, closes, window)
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {"series": len(self._series), "hits": self.hits, "misses": self.misses}
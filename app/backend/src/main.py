@@ -4,9 +4,17 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 
+from .codec import CodecJSONResponse, response_cache
+from .compression import StreamAwareGZipMiddleware
 from .config import settings
 from .router import router as cryptocurrency_router
-from .cmc_client import cmc_client
+from .stream_router import router as stream_router
+from .alerts_router import router as alerts_router
+from .portfolio_router import router as portfolio_router
+from .cmc_client import (
+    alert_engine, cache_backend, cmc_breaker, cmc_client, get_metrics, history_rollups, history_store,
+    portfolio_store, start_refreshing, stop_refreshing
+)
 from .http_client import HTTPClientError
 
 # Configure logging
@@ -21,14 +29,26 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     """Application lifespan manager."""
     logger.info("Starting Crypto Tracker API...")
+    # Create the connection pool in the serving loop, not at import time
+    await cmc_client.start()
+    await start_refreshing()
     yield
     logger.info("Shutting down Crypto Tracker API...")
+    await stop_refreshing()
     # Close HTTP client session
     try:
         await cmc_client.close()
         logger.info("HTTP client session closed")
     except Exception as e:
         logger.error(f"Error closing HTTP client: {e}")
+    await cache_backend.close()
+    if history_store is not None:
+        await history_store.close()
+        await history_rollups.close()
+    if alert_engine is not None:
+        alert_engine.close()
+    if portfolio_store is not None:
+        portfolio_store.close()
 
 
 # Create FastAPI application
@@ -37,6 +57,7 @@ app = FastAPI(
     description=settings.API_DESCRIPTION,
     version=settings.API_VERSION,
     debug=settings.DEBUG,
+    default_response_class=CodecJSONResponse,
     lifespan=lifespan
 )
 
@@ -49,6 +70,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress dynamic responses; snapshot responses arrive precompressed and event streams pass through
+app.add_middleware(
+    StreamAwareGZipMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    compresslevel=6
+)
+
 
 # Global exception handler for HTTPClientError
 @app.exception_handler(HTTPClientError)
@@ -71,12 +99,25 @@ async def health_check():
     return {
         "status": "healthy",
         "version": settings.API_VERSION,
-        "service": "crypto-tracker-api"
+        "service": "crypto-tracker-api",
+        "upstream": cmc_breaker.state
+    }
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """CoinMarketCap credit spend, upstream health and cache counters."""
+    return {
+        **get_metrics(),
+        "response_cache": response_cache.stats()
     }
 
 
 # Include routers
 app.include_router(cryptocurrency_router)
+app.include_router(stream_router)
+app.include_router(alerts_router)
+app.include_router(portfolio_router)
 
 
 if __name__ == "__main__":
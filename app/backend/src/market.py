@@ -0,0 +1,449 @@
+"""Columnar, NumPy-backed representation of a listings snapshot."""
+import hashlib
+import logging
+import struct
+import sys
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .codec import codec
+from .projection import Projection, select
+
+logger = logging.getLogger(__name__)
+
+# Column kinds
+INT = "int"        # int64, never missing
+FLOAT = "float"    # float64, NaN when missing
+COUNT = "count"    # float64 storage, rendered as int
+BOOL = "bool"      # int8: -1 missing, 0 false, 1 true
+STR = "str"        # interned strings
+TAGS = "tags"      # shared tuples of interned strings
+OBJECT = "object"  # arbitrary JSON values
+
+# Coin-level fields in CoinMarketCap's listing order
+COIN_SCHEMA: Tuple[Tuple[str, str], ...] = (
+    ("id", INT),
+    ("name", STR),
+    ("symbol", STR),
+    ("slug", STR),
+    ("num_market_pairs", COUNT),
+    ("date_added", STR),
+    ("tags", TAGS),
+    ("max_supply", FLOAT),
+    ("circulating_supply", FLOAT),
+    ("total_supply", FLOAT),
+    ("infinite_supply", BOOL),
+    ("platform", OBJECT),
+    ("cmc_rank", INT),
+    ("self_reported_circulating_supply", FLOAT),
+    ("self_reported_market_cap", FLOAT),
+    ("tvl_ratio", FLOAT),
+    ("last_updated", STR),
+)
+
+# Fields of the quote block for the snapshot's convert currency
+QUOTE_SCHEMA: Tuple[Tuple[str, str], ...] = (
+    ("price", FLOAT),
+    ("volume_24h", FLOAT),
+    ("volume_change_24h", FLOAT),
+    ("percent_change_1h", FLOAT),
+    ("percent_change_24h", FLOAT),
+    ("percent_change_7d", FLOAT),
+    ("percent_change_30d", FLOAT),
+    ("percent_change_60d", FLOAT),
+    ("percent_change_90d", FLOAT),
+    ("market_cap", FLOAT),
+    ("market_cap_dominance", FLOAT),
+    ("fully_diluted_market_cap", FLOAT),
+    ("tvl", FLOAT),
+    ("last_updated", STR),
+)
+
+_COIN_KINDS = dict(COIN_SCHEMA)
+_QUOTE_KINDS = dict(QUOTE_SCHEMA)
+
+# Numeric quote fields that can be sorted, filtered and ranked on
+NUMERIC_QUOTE_FIELDS = tuple(name for name, kind in QUOTE_SCHEMA if kind == FLOAT)
+
+Index = Union[slice, Sequence[int], np.ndarray, None]
+
+# Binary layout written by MarketSnapshot.write: magic, header length, JSON header,
+# then every numeric column's raw bytes at an ALIGNMENT-aligned offset and one
+# JSON document holding the text and object columns
+MAGIC = b"CTMKT001"
+ALIGNMENT = 64
+_HEADER_LENGTH = struct.Struct("<I")
+_NUMERIC_KINDS = (INT, FLOAT, COUNT, BOOL)
+
+
+def _subtree(tree: Optional[dict], name: str) -> Any:
+    """Projection below ``name``: ``None`` if fully selected, ``False`` if not selected."""
+    if tree is None:
+        return None
+    return tree[name] if name in tree else False
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _build_column(values: List[Any], kind: str, tag_cache: Dict[tuple, tuple]) -> np.ndarray:
+    """Turn one field's values into a typed column."""
+    if kind == INT:
+        return np.array(values, dtype=np.int64)
+    if kind in (FLOAT, COUNT):
+        return np.array(values, dtype=np.float64)
+    if kind == BOOL:
+        return np.array([-1 if v is None else int(bool(v)) for v in values], dtype=np.int8)
+
+    column = np.empty(len(values), dtype=object)
+    if kind == STR:
+        column[:] = [_intern(v) for v in values]
+    elif kind == TAGS:
+        tuples = []
+        for tags in values:
+            key = tuple(_intern(tag) for tag in tags) if tags is not None else None
+            tuples.append(tag_cache.setdefault(key, key) if key is not None else None)
+        column[:] = tuples
+    else:
+        column[:] = values
+    return column
+
+
+def _render_column(column: np.ndarray, kind: str) -> List[Any]:
+    """Turn a (sliced) column back into plain Python values."""
+    if kind == INT:
+        return column.tolist()
+    if kind == FLOAT:
+        return [None if v != v else v for v in column.tolist()]
+    if kind == COUNT:
+        return [None if v != v else int(v) for v in column.tolist()]
+    if kind == BOOL:
+        return [None if v < 0 else bool(v) for v in column.tolist()]
+    if kind == TAGS:
+        return [list(v) if v is not None else None for v in column.tolist()]
+    return column.tolist()
+
+
+class MarketSnapshot:
+    """Listings of one convert currency stored as one typed column per field.
+
+    Numeric fields are NumPy float64 arrays (NaN when missing), identifiers
+    are int64 arrays and text fields hold interned strings, so sorting,
+    filtering and ranking are vectorised operations and a few thousand coins
+    take a small fraction of the memory of the equivalent dict trees. Rows
+    stay in upstream rank order. :meth:`records` rebuilds CoinMarketCap's
+    JSON shape for any subset of rows.
+    """
+
+    # Distinct field sets whose projected rows are kept per snapshot
+    max_projections = 32
+
+    def __init__(
+        self,
+        convert: str,
+        columns: Dict[str, np.ndarray],
+        quote_columns: Dict[str, np.ndarray],
+        extras: Optional[np.ndarray] = None
+    ):
+        self.convert = convert
+        self.columns = columns
+        self.quote_columns = quote_columns
+        self.extras = extras
+        self._id_order = np.argsort(self.columns["id"], kind="stable")
+        self._sorted_ids = self.columns["id"][self._id_order]
+        self._tag_rows: Optional[Dict[str, np.ndarray]] = None
+        self._projected: Dict[Projection, List[Dict[str, Any]]] = {}
+        self._digest: Optional[str] = None
+
+    @classmethod
+    def from_listings(cls, listings: List[Dict[str, Any]], convert: str) -> "MarketSnapshot":
+        """Build a snapshot from the coin dictionaries of a listings response.
+
+        Args:
+            listings: Coins in rank order as returned by the listings endpoint
+            convert: Convert currency of the ``quote`` blocks
+
+        Returns:
+            The columnar snapshot
+        """
+        tag_cache: Dict[tuple, tuple] = {}
+        quotes = [(coin.get("quote") or {}).get(convert) or {} for coin in listings]
+
+        columns = {
+            name: _build_column([coin.get(name) for coin in listings], kind, tag_cache)
+            for name, kind in COIN_SCHEMA
+            if any(name in coin for coin in listings) or name in ("id", "cmc_rank")
+        }
+        quote_columns = {
+            name: _build_column([quote.get(name) for quote in quotes], kind, tag_cache)
+            for name, kind in QUOTE_SCHEMA
+            if any(name in quote for quote in quotes)
+        }
+
+        # Keep fields outside the schema so records stay lossless
+        extras = None
+        extra_values = []
+        for coin, quote in zip(listings, quotes):
+            coin_extra = {k: v for k, v in coin.items() if k not in _COIN_KINDS and k != "quote"}
+            quote_extra = {k: v for k, v in quote.items() if k not in _QUOTE_KINDS}
+            extra_values.append((coin_extra, quote_extra) if coin_extra or quote_extra else None)
+        if any(extra_values):
+            extras = np.empty(len(listings), dtype=object)
+            extras[:] = extra_values
+
+        return cls(convert=convert, columns=columns, quote_columns=quote_columns, extras=extras)
+
+    def write(self, file: BinaryIO, meta: Optional[Dict[str, Any]] = None) -> None:
+        """Write the snapshot in a layout :meth:`from_buffer` maps without copying.
+
+        Args:
+            file: Binary file to write to, positioned at its start
+            meta: JSON-serialisable values stored alongside (e.g. fetch times)
+        """
+        groups = (("coin", self.columns, _COIN_KINDS), ("quote", self.quote_columns, _QUOTE_KINDS))
+        numeric = []
+        objects: Dict[str, Any] = {"coin": {}, "quote": {}, "extras": None}
+        for group, columns, kinds in groups:
+            for name, column in columns.items():
+                if kinds[name] in _NUMERIC_KINDS:
+                    numeric.append((group, name, column))
+                else:
+                    objects[group][name] = column.tolist()
+        if self.extras is not None:
+            objects["extras"] = self.extras.tolist()
+        object_blob = codec.dumps(objects)
+
+        # Offsets are relative to the end of the header, which is aligned too
+        table, offset = [], 0
+        for group, name, column in numeric:
+            table.append({
+                "group": group, "name": name, "dtype": column.dtype.str,
+                "offset": offset, "length": len(column)
+            })
+            offset = -(-(offset + column.nbytes) // ALIGNMENT) * ALIGNMENT
+        header = codec.dumps({
+            "convert": self.convert,
+            "digest": self.digest(),
+            "columns": table,
+            "objects": {"offset": offset, "nbytes": len(object_blob)},
+            "meta": meta or {},
+        })
+        preamble = len(MAGIC) + _HEADER_LENGTH.size + len(header)
+        header += b" " * (-preamble % ALIGNMENT)
+
+        file.write(MAGIC)
+        file.write(_HEADER_LENGTH.pack(len(header)))
+        file.write(header)
+        start = file.tell()
+        for entry, (_, _, column) in zip(table, numeric):
+            file.write(b"\0" * (start + entry["offset"] - file.tell()))
+            file.write(np.ascontiguousarray(column).tobytes())
+        file.write(b"\0" * (start + offset - file.tell()))
+        file.write(object_blob)
+
+    @classmethod
+    def from_buffer(cls, buffer: Any) -> Tuple["MarketSnapshot", Dict[str, Any]]:
+        """Map a snapshot written by :meth:`write`.
+
+        Numeric columns are read-only views into ``buffer`` (e.g. an
+        ``mmap``), so they are neither copied nor parsed; only the text and
+        object columns are decoded. The buffer must stay open for the
+        lifetime of the snapshot, which the views keep referenced.
+
+        Returns:
+            The snapshot and the ``meta`` it was written with
+
+        Raises:
+            ValueError: If the buffer does not hold a snapshot
+        """
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a market snapshot")
+        position = len(MAGIC)
+        (header_length,) = _HEADER_LENGTH.unpack_from(view, position)
+        position += _HEADER_LENGTH.size
+        header = codec.loads(bytes(view[position:position + header_length]))
+        start = position + header_length
+
+        groups: Dict[str, Dict[str, np.ndarray]] = {"coin": {}, "quote": {}}
+        for entry in header["columns"]:
+            groups[entry["group"]][entry["name"]] = np.frombuffer(
+                view, dtype=np.dtype(entry["dtype"]), count=entry["length"], offset=start + entry["offset"]
+            )
+        blob = header["objects"]
+        object_start = start + blob["offset"]
+        objects = codec.loads(bytes(view[object_start:object_start + blob["nbytes"]]))
+        tag_cache: Dict[tuple, tuple] = {}
+        for group, kinds in (("coin", _COIN_KINDS), ("quote", _QUOTE_KINDS)):
+            for name, values in objects[group].items():
+                groups[group][name] = _build_column(values, kinds[name], tag_cache)
+        extras = None
+        if objects["extras"] is not None:
+            extras = np.empty(len(objects["extras"]), dtype=object)
+            extras[:] = [tuple(value) if value is not None else None for value in objects["extras"]]
+
+        # Columns in schema order, as from_listings builds them
+        columns = {name: groups["coin"][name] for name, _ in COIN_SCHEMA if name in groups["coin"]}
+        quote_columns = {name: groups["quote"][name] for name, _ in QUOTE_SCHEMA if name in groups["quote"]}
+        snapshot = cls(convert=header["convert"], columns=columns, quote_columns=quote_columns, extras=extras)
+        snapshot._digest = header["digest"]
+        return snapshot, header["meta"]
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def digest(self) -> str:
+        """Content digest: equal for snapshots holding the same data."""
+        if self._digest is None:
+            h = hashlib.blake2b(self.convert.encode(), digest_size=16)
+            for group in (self.columns, self.quote_columns):
+                for name in sorted(group):
+                    array = group[name]
+                    h.update(name.encode())
+                    h.update(codec.dumps(array.tolist()) if array.dtype == object else array.tobytes())
+            if self.extras is not None:
+                h.update(codec.dumps(self.extras.tolist()))
+            self._digest = h.hexdigest()
+        return self._digest
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the numeric columns."""
+        arrays = list(self.columns.values()) + list(self.quote_columns.values())
+        return sum(array.nbytes for array in arrays)
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a coin-level or, failing that, a quote column by field name.
+
+        Raises:
+            KeyError: If the snapshot has no such field
+        """
+        if name in self.columns:
+            return self.columns[name]
+        return self.quote_columns[name]
+
+    def has_column(self, name: str) -> bool:
+        return name in self.quote_columns or name in self.columns
+
+    def index_of(self, coin_id: int) -> Optional[int]:
+        """Row of ``coin_id``, or None if the coin is not in the snapshot."""
+        positions = self.indices_of([coin_id])
+        return int(positions[0]) if positions[0] >= 0 else None
+
+    def indices_of(self, coin_ids: Iterable[int]) -> np.ndarray:
+        """Rows of several coin IDs at once, -1 where a coin is missing."""
+        ids = np.asarray(list(coin_ids) if not isinstance(coin_ids, np.ndarray) else coin_ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_ids, ids)
+        positions = np.minimum(positions, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[positions] == ids
+        return np.where(found, self._id_order[positions], -1)
+
+    def rows_with_tag(self, tag: str) -> np.ndarray:
+        """Rows of the coins carrying ``tag``, in rank order.
+
+        The tag index is built once per snapshot on first use.
+        """
+        if self._tag_rows is None:
+            rows: Dict[str, List[int]] = {}
+            if "tags" in self.columns:
+                for row, tags in enumerate(self.columns["tags"].tolist()):
+                    for name in tags or ():
+                        rows.setdefault(name.lower(), []).append(row)
+            self._tag_rows = {name: np.array(found, dtype=np.int64) for name, found in rows.items()}
+        return self._tag_rows.get(tag.lower(), np.empty(0, dtype=np.int64))
+
+    def top(self, n: int, by: str, descending: bool = True, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows of the ``n`` best coins by a numeric field, missing values last.
+
+        Uses a partial sort, so the cost stays close to linear in the
+        number of coins considered however small ``n`` is.
+
+        Args:
+            n: Number of rows to return
+            by: Numeric field to rank on
+            descending: Rank largest values first
+            rows: Optional candidate rows to restrict the ranking to
+
+        Returns:
+            Row indices in ranking order
+        """
+        candidates = np.arange(len(self)) if rows is None else np.asarray(rows)
+        values = self.column(by)[candidates].astype(np.float64)
+        keys = -values if descending else values
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        n = min(n, len(candidates))
+        if n <= 0:
+            return candidates[:0]
+        if n < len(candidates):
+            partition = np.argpartition(keys, n - 1)[:n]
+        else:
+            partition = np.arange(len(candidates))
+        ordered = partition[np.lexsort((candidates[partition], keys[partition]))]
+        return candidates[ordered]
+
+    def records(self, index: Index = None, projection: Optional[Projection] = None) -> List[Dict[str, Any]]:
+        """Rebuild CoinMarketCap-shaped coin dictionaries.
+
+        With a projection only the selected columns are rendered at all, so
+        narrow field sets cost a fraction of full records.
+
+        Args:
+            index: Rows to render (slice or row indices); all rows by default
+            projection: Optional field selection to render
+
+        Returns:
+            Coin dictionaries with a ``quote`` block for the snapshot's convert
+        """
+        index = slice(None) if index is None else index
+        coin_tree = projection.tree if projection is not None else None
+        quote_tree = projection.subtree("quote", self.convert) if projection is not None else None
+        with_quote = projection is None or projection.subtree("quote") is not False
+
+        coin_values = [
+            (name, _render_column(self.columns[name][index], kind), _subtree(coin_tree, name))
+            for name, kind in COIN_SCHEMA
+            if name in self.columns and _subtree(coin_tree, name) is not False
+        ]
+        quote_values = [
+            (name, _render_column(self.quote_columns[name][index], kind), _subtree(quote_tree, name))
+            for name, kind in QUOTE_SCHEMA
+            if with_quote and quote_tree is not False and name in self.quote_columns
+            and _subtree(quote_tree, name) is not False
+        ]
+        extras = self.extras[index].tolist() if self.extras is not None else None
+
+        count = len(self.columns["id"][index])
+        result = []
+        for i in range(count):
+            coin = {name: select(values[i], tree) for name, values, tree in coin_values}
+            quote = {name: select(values[i], tree) for name, values, tree in quote_values}
+            if extras is not None and extras[i] is not None:
+                coin_extra, quote_extra = extras[i]
+                coin.update(select(coin_extra, coin_tree))
+                if quote_tree is not False:
+                    quote.update(select(quote_extra, quote_tree))
+            if with_quote:
+                coin["quote"] = {self.convert: quote} if quote_tree is not False else {}
+            result.append(coin)
+        return result
+
+    def projected(self, projection: Projection) -> List[Dict[str, Any]]:
+        """Every row rendered through ``projection``, computed once per field set."""
+        cached = self._projected.get(projection)
+        if cached is None:
+            if len(self._projected) >= self.max_projections:
+                self._projected.pop(next(iter(self._projected)))
+            cached = self._projected[projection] = self.records(projection=projection)
+        return cached
+
+    def iter_rows(self, fields: Sequence[str], index: Index = None) -> Iterator[Dict[str, Any]]:
+        """Yield small dictionaries holding only the given top-level or quote fields."""
+        index = slice(None) if index is None else index
+        kinds = {**_QUOTE_KINDS, **_COIN_KINDS}
+        values = [(name, _render_column(self.column(name)[index], kinds[name])) for name in fields]
+        for row in zip(*(column for _, column in values)):
+            yield dict(zip(fields, row))
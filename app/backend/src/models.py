@@ -55,3 +55,23 @@ class ErrorResponse(BaseModel):
     """Model for API error responses."""
     detail: str = Field(..., description="Error message")
     error_code: Optional[str] = Field(None, description="Error code")
+
+
+class AlertCreate(BaseModel):
+    """Model for a new price alert."""
+    user_id: int = Field(..., description="Telegram chat ID the alert is delivered to")
+    coin_id: int = Field(..., ge=1, description="CoinMarketCap cryptocurrency ID")
+    kind: str = Field(..., description="above, below or change")
+    threshold: float = Field(..., gt=0, description="Price for above/below, percent for change")
+    period: Optional[str] = Field(None, description="Period of a change alert: 1h (default), 24h or 7d")
+    convert: str = Field("USD", description="Currency the price is in")
+
+
+class NotificationAck(BaseModel):
+    """Model for acknowledging delivered alert notifications."""
+    up_to: int = Field(..., ge=0, description="Sequence number of the last notification delivered")
+
+
+class HoldingUpdate(BaseModel):
+    """Model for setting the quantity of a coin in a portfolio."""
+    quantity: float = Field(..., gt=0, description="Quantity of the coin held")
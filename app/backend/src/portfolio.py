@@ -0,0 +1,187 @@
+"""Per-user watchlists and portfolios, valued against the listings snapshot."""
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .database import ThreadConnections
+from .market import MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    user_id INTEGER NOT NULL,
+    coin_id INTEGER NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (user_id, coin_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS holdings (
+    user_id INTEGER NOT NULL,
+    coin_id INTEGER NOT NULL,
+    quantity REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, coin_id)
+) WITHOUT ROWID;
+"""
+
+# Fields listed for every watched coin
+WATCHLIST_FIELDS = ("id", "name", "symbol", "cmc_rank", "price", "percent_change_1h", "percent_change_24h",
+                    "percent_change_7d", "market_cap")
+
+# Fields listed for every held coin, besides its quantity, value and weight
+HOLDING_FIELDS = ("id", "name", "symbol", "price", "percent_change_24h")
+
+
+def _value(x: float) -> Optional[float]:
+    return None if x != x else x
+
+
+class PortfolioStore:
+    """Watchlists (coin IDs) and portfolios (coin ID and quantity) of users, in SQLite.
+
+    Both tables are keyed on ``(user_id, coin_id)``, so a user's list is one
+    range read of the primary key. Every worker reads and writes the same
+    database. Its methods block on it, so they are called from request
+    threads, each with a connection of its own, not from the event loop.
+    """
+
+    def __init__(self, path: str, max_coins: int = 100):
+        self.path = path
+        self.max_coins = max_coins
+        self._connections = ThreadConnections(path, _SCHEMA)
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        """The calling thread's connection."""
+        return self._connections.get()
+
+    def watchlist(self, user_id: int) -> np.ndarray:
+        """IDs of the coins a user watches, in the order added."""
+        rows = self.db.execute(
+            "SELECT coin_id FROM watchlist WHERE user_id = ? ORDER BY added_at", (user_id,)
+        ).fetchall()
+        return np.array([coin_id for (coin_id,) in rows], dtype=np.int64)
+
+    def holdings(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """IDs and quantities of the coins a user holds."""
+        rows = self.db.execute(
+            "SELECT coin_id, quantity FROM holdings WHERE user_id = ?", (user_id,)
+        ).fetchall()
+        ids = np.array([coin_id for coin_id, _ in rows], dtype=np.int64)
+        quantities = np.array([quantity for _, quantity in rows], dtype=np.float64)
+        return ids, quantities
+
+    def watch(self, user_id: int, coin_id: int) -> bool:
+        """Add a coin to a user's watchlist; return whether it was new.
+
+        Raises:
+            ValueError: If the watchlist is full
+        """
+        return self._put("watchlist", user_id, coin_id, "INSERT OR IGNORE INTO watchlist VALUES (?, ?, ?)",
+                         (user_id, coin_id, time.time()))
+
+    def hold(self, user_id: int, coin_id: int, quantity: float) -> bool:
+        """Set the quantity of a coin in a user's portfolio; return whether it was new.
+
+        Raises:
+            ValueError: If the quantity is not positive or the portfolio is full
+        """
+        if not 0 < quantity < float("inf"):
+            raise ValueError("quantity must be a positive number")
+        return self._put(
+            "holdings", user_id, coin_id,
+            "INSERT INTO holdings VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (user_id, coin_id) DO UPDATE SET quantity = excluded.quantity, updated_at = excluded.updated_at",
+            (user_id, coin_id, quantity, time.time())
+        )
+
+    def _put(self, table: str, user_id: int, coin_id: int, statement: str, values: tuple) -> bool:
+        db = self.db
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            exists = db.execute(
+                f"SELECT 1 FROM {table} WHERE user_id = ? AND coin_id = ?", (user_id, coin_id)
+            ).fetchone() is not None
+            if not exists:
+                (count,) = db.execute(f"SELECT COUNT(*) FROM {table} WHERE user_id = ?", (user_id,)).fetchone()
+                if count >= self.max_coins:
+                    raise ValueError(f"At most {self.max_coins} coins per list; remove one first")
+            db.execute(statement, values)
+        return not exists
+
+    def unwatch(self, user_id: int, coin_id: int) -> bool:
+        """Remove a coin from a user's watchlist; return whether it was there."""
+        with self.db as db:
+            cursor = db.execute("DELETE FROM watchlist WHERE user_id = ? AND coin_id = ?", (user_id, coin_id))
+        return cursor.rowcount > 0
+
+    def sell(self, user_id: int, coin_id: int) -> bool:
+        """Remove a coin from a user's portfolio; return whether it was there."""
+        with self.db as db:
+            cursor = db.execute("DELETE FROM holdings WHERE user_id = ? AND coin_id = ?", (user_id, coin_id))
+        return cursor.rowcount > 0
+
+    def close(self) -> None:
+        self._connections.close()
+
+
+def value_portfolio(snapshot: MarketSnapshot, ids: np.ndarray, quantities: np.ndarray) -> Dict[str, Any]:
+    """Value holdings at the prices of a listings snapshot.
+
+    The coins' rows are found in one :meth:`MarketSnapshot.indices_of`
+    lookup; values, weights and 24h changes are whole-array operations.
+
+    Returns:
+        Total value and its 24h change, the holdings by value (largest
+        first) and the IDs not in the snapshot
+    """
+    rows = snapshot.indices_of(ids)
+    listed = rows >= 0
+    rows, quantities, missing = rows[listed], quantities[listed], ids[~listed]
+
+    price = snapshot.column("price")[rows] if snapshot.has_column("price") else np.full(len(rows), np.nan)
+    change = (
+        snapshot.column("percent_change_24h")[rows]
+        if snapshot.has_column("percent_change_24h") else np.full(len(rows), np.nan)
+    )
+    value = quantities * price
+    # Value 24h ago from the current price and its 24h change; coins without a change count as flat
+    value_before = np.where(np.isnan(change), value, value / (1.0 + change / 100.0))
+    total = float(np.nansum(value))
+    total_before = float(np.nansum(value_before))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = value / total * 100.0 if total > 0 else np.full(len(value), np.nan)
+
+    order = np.argsort(np.where(np.isnan(value), -np.inf, -value), kind="stable")
+    fields = [name for name in HOLDING_FIELDS if snapshot.has_column(name)]
+    holdings: List[Dict[str, Any]] = list(snapshot.iter_rows(fields, index=rows[order]))
+    for holding, quantity, worth, share in zip(
+        holdings, quantities[order].tolist(), value[order].tolist(), weight[order].tolist()
+    ):
+        holding.update(quantity=quantity, value=_value(worth), weight=_value(share))
+    return {
+        "total_value": total,
+        "change_24h": total - total_before,
+        "percent_change_24h": (total / total_before - 1.0) * 100.0 if total_before > 0 else None,
+        "data": holdings,
+        "missing": missing.tolist(),
+    }
+
+
+def watched_coins(snapshot: MarketSnapshot, ids: np.ndarray) -> Dict[str, Any]:
+    """The listings rows of watched coins, found in one lookup.
+
+    Returns:
+        The coins' :data:`WATCHLIST_FIELDS`, in watchlist order, and the IDs
+        not in the snapshot
+    """
+    rows = snapshot.indices_of(ids)
+    listed = rows >= 0
+    fields = [name for name in WATCHLIST_FIELDS if snapshot.has_column(name)]
+    return {
+        "data": list(snapshot.iter_rows(fields, index=rows[listed])),
+        "missing": ids[~listed].tolist(),
+    }
@@ -0,0 +1,207 @@
+"""Endpoints of users' watchlists and portfolios."""
+import logging
+
+from fastapi import APIRouter, HTTPException, Path, Query
+
+from . import cmc_client
+from .codec import CodecJSONResponse
+from .http_client import HTTPClientError
+from .models import ErrorResponse, HoldingUpdate
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix='/users/{user_id}',
+    tags=["Portfolios"]
+)
+
+
+def _enabled() -> None:
+    if cmc_client.portfolio_store is None:
+        raise HTTPException(status_code=404, detail="Watchlists and portfolios are disabled")
+
+
+@router.get(
+    "/watchlist",
+    summary="Get Watchlist",
+    description="Current data of the coins a user watches, from the listings snapshot, in the order added.",
+    responses={
+        200: {"description": "Watched coins, and the IDs no longer listed"},
+        404: {"model": ErrorResponse, "description": "Watchlists are disabled"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def get_watchlist(
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get a user's watchlist."""
+    _enabled()
+    try:
+        return CodecJSONResponse(content=await cmc_client.get_watchlist(user_id, convert=convert))
+    except HTTPClientError as e:
+        logger.error(f"Error fetching watchlist: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in get_watchlist: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.put(
+    "/watchlist/{currency_id}",
+    summary="Watch Cryptocurrency",
+    description="Add a coin of the listings to a user's watchlist.",
+    responses={
+        200: {"description": "Whether the coin was added or already watched"},
+        400: {"model": ErrorResponse, "description": "Unlisted coin or full watchlist"},
+        404: {"model": ErrorResponse, "description": "Watchlists are disabled"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def watch_cryptocurrency(
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    currency_id: int = Path(..., ge=1, description="The CoinMarketCap cryptocurrency ID")
+):
+    """Add a coin to a user's watchlist."""
+    _enabled()
+    try:
+        added = await cmc_client.watch_currency(user_id, currency_id)
+        return {"id": currency_id, "added": added}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPClientError as e:
+        logger.error(f"Error updating watchlist: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in watch_cryptocurrency: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.delete(
+    "/watchlist/{currency_id}",
+    summary="Unwatch Cryptocurrency",
+    description="Remove a coin from a user's watchlist.",
+    responses={
+        200: {"description": "The coin was removed"},
+        404: {"model": ErrorResponse, "description": "Coin not watched, or watchlists are disabled"}
+    }
+)
+def unwatch_cryptocurrency(
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    currency_id: int = Path(..., ge=1, description="The CoinMarketCap cryptocurrency ID")
+):
+    """Remove a coin from a user's watchlist."""
+    _enabled()
+    if not cmc_client.portfolio_store.unwatch(user_id, currency_id):
+        raise HTTPException(status_code=404, detail=f"Currency with ID {currency_id} is not watched")
+    return {"id": currency_id, "removed": True}
+
+
+@router.get(
+    "/portfolio",
+    summary="Get Portfolio Value",
+    description=(
+        "Value a user's holdings at the prices of the listings snapshot: total value, its 24h "
+        "change, and each holding's price, value and weight, largest first. No upstream call is made."
+    ),
+    responses={
+        200: {"description": "Portfolio valuation, and the IDs no longer listed"},
+        404: {"model": ErrorResponse, "description": "Portfolios are disabled"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def get_portfolio(
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    convert: str = Query(
+        default="USD",
+        description="Currency to value the portfolio in (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get the value of a user's portfolio."""
+    _enabled()
+    try:
+        return CodecJSONResponse(content=await cmc_client.get_portfolio(user_id, convert=convert))
+    except HTTPClientError as e:
+        logger.error(f"Error valuing portfolio: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in get_portfolio: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.put(
+    "/portfolio/{currency_id}",
+    summary="Set Holding",
+    description="Set the quantity of a coin of the listings in a user's portfolio.",
+    responses={
+        200: {"description": "Whether the coin was added or its quantity changed"},
+        400: {"model": ErrorResponse, "description": "Unlisted coin, invalid quantity or full portfolio"},
+        404: {"model": ErrorResponse, "description": "Portfolios are disabled"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def set_holding(
+    holding: HoldingUpdate,
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    currency_id: int = Path(..., ge=1, description="The CoinMarketCap cryptocurrency ID")
+):
+    """Set the quantity of a coin in a user's portfolio."""
+    _enabled()
+    try:
+        added = await cmc_client.hold_currency(user_id, currency_id, holding.quantity)
+        return {"id": currency_id, "quantity": holding.quantity, "added": added}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPClientError as e:
+        logger.error(f"Error updating portfolio: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in set_holding: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.delete(
+    "/portfolio/{currency_id}",
+    summary="Remove Holding",
+    description="Remove a coin from a user's portfolio.",
+    responses={
+        200: {"description": "The coin was removed"},
+        404: {"model": ErrorResponse, "description": "Coin not held, or portfolios are disabled"}
+    }
+)
+def remove_holding(
+    user_id: int = Path(..., description="Telegram chat ID of the owner"),
+    currency_id: int = Path(..., ge=1, description="The CoinMarketCap cryptocurrency ID")
+):
+    """Remove a coin from a user's portfolio."""
+    _enabled()
+    if not cmc_client.portfolio_store.sell(user_id, currency_id):
+        raise HTTPException(status_code=404, detail=f"Currency with ID {currency_id} is not in the portfolio")
+    return {"id": currency_id, "removed": True}
@@ -0,0 +1,98 @@
+"""Sparse field projection of coin records."""
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectionError(ValueError):
+    """Raised for malformed ``fields`` expressions."""
+    pass
+
+
+class Projection:
+    """A set of dotted field paths compiled into a nested selection tree.
+
+    ``"name,symbol,quote.USD.price"`` keeps only those paths of a record;
+    selecting a path keeps everything below it.
+    """
+
+    def __init__(self, fields: str):
+        self.paths = self._parse(fields)
+        self.key = ','.join(self.paths)
+        self.tree = self._build_tree(self.paths)
+
+    def __repr__(self) -> str:
+        return f"Projection({self.key!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Projection) and other.key == self.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def subtree(self, *path: str) -> Any:
+        """Selection below ``path``: ``None`` if fully selected, ``False`` if not selected."""
+        node: Any = self.tree
+        for part in path:
+            if node is None:
+                return None
+            if part not in node:
+                return False
+            node = node[part]
+        return node
+
+    @staticmethod
+    def _parse(fields: str) -> List[str]:
+        paths = [path.strip() for path in fields.split(',') if path.strip()]
+        if not paths:
+            raise ProjectionError("fields must name at least one field")
+        for path in paths:
+            if any(not part for part in path.split('.')):
+                raise ProjectionError(f"Invalid field path: {path!r}")
+        return sorted(set(paths))
+
+    @staticmethod
+    def _build_tree(paths: List[str]) -> Dict[str, Optional[dict]]:
+        """Nested dict of path parts; ``None`` marks a fully selected subtree."""
+        tree: Dict[str, Optional[dict]] = {}
+        for path in paths:
+            node = tree
+            parts = path.split('.')
+            for i, part in enumerate(parts):
+                if i == len(parts) - 1:
+                    node[part] = None
+                    break
+                child = node.get(part, {})
+                if child is None:
+                    break  # An ancestor is already fully selected
+                node[part] = child
+                node = child
+        return tree
+
+    def apply(self, record: Any) -> Any:
+        """Return a copy of ``record`` holding only the selected paths."""
+        return select(record, self.tree)
+
+    def apply_many(self, records: List[Any]) -> List[Any]:
+        """Project every record of a list."""
+        tree = self.tree
+        return [select(record, tree) for record in records]
+
+
+@lru_cache(maxsize=256)
+def compile_projection(fields: str) -> Projection:
+    """Parse a ``fields`` expression, reusing the result for repeated expressions.
+
+    Raises:
+        ProjectionError: If the expression is malformed
+    """
+    return Projection(fields)
+
+
+def select(value: Any, tree: Optional[dict]) -> Any:
+    """Keep only the parts of ``value`` selected by a projection tree."""
+    if tree is None or not isinstance(value, dict):
+        return value
+    return {key: select(item, tree[key]) for key, item in value.items() if key in tree}
@@ -0,0 +1,108 @@
+"""Server-side sorting, filtering and ranking of listings snapshots."""
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from .market import NUMERIC_QUOTE_FIELDS, MarketSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Fields listings can be sorted on; all are numeric columns of MarketSnapshot
+SORT_FIELDS = (
+    "cmc_rank",
+    *NUMERIC_QUOTE_FIELDS,
+    "circulating_supply",
+    "total_supply",
+    "max_supply",
+    "num_market_pairs",
+)
+
+
+class QueryError(ValueError):
+    """Raised for invalid listings query parameters."""
+    pass
+
+
+@dataclass(frozen=True)
+class ListingsQuery:
+    """A sort/filter/rank request against a listings snapshot.
+
+    Instances are hashable, so they can key caches of query results.
+    """
+    limit: int = 100
+    sort: str = "cmc_rank"
+    order: Optional[str] = None
+    min_market_cap: Optional[float] = None
+    max_market_cap: Optional[float] = None
+    min_volume: Optional[float] = None
+    max_rank: Optional[int] = None
+    tag: Optional[str] = None
+
+    def __post_init__(self):
+        if self.sort not in SORT_FIELDS:
+            raise QueryError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+        if self.order not in (None, "asc", "desc"):
+            raise QueryError("order must be 'asc' or 'desc'")
+        if self.tag is not None:
+            object.__setattr__(self, "tag", self.tag.strip().lower() or None)
+
+    @property
+    def descending(self) -> bool:
+        """Rank is best ascending; every other field defaults to largest first."""
+        if self.order is None:
+            return self.sort != "cmc_rank"
+        return self.order == "desc"
+
+    @property
+    def is_plain(self) -> bool:
+        """Whether the query is just the first ``limit`` coins by rank."""
+        return (
+            self.sort == "cmc_rank" and not self.descending and self.min_market_cap is None
+            and self.max_market_cap is None and self.min_volume is None
+            and self.max_rank is None and self.tag is None
+        )
+
+    def rows(self, market: MarketSnapshot) -> np.ndarray:
+        """Rows of ``market`` matching the query, in result order.
+
+        Args:
+            market: Listings snapshot to query
+
+        Returns:
+            At most ``limit`` row indices
+        """
+        if self.is_plain:
+            # Snapshot rows are already in rank order: O(limit)
+            return np.arange(min(self.limit, len(market)))
+
+        candidates = None
+        if self.tag is not None:
+            candidates = market.rows_with_tag(self.tag)
+        if self.max_rank is not None:
+            # Rows are in rank order, so the top max_rank coins are a prefix
+            prefix = int(np.searchsorted(market.column("cmc_rank"), self.max_rank, side="right"))
+            candidates = np.arange(prefix) if candidates is None else candidates[candidates < prefix]
+
+        mask = None
+        for column, bound, keep in (
+            ("market_cap", self.min_market_cap, np.greater_equal),
+            ("market_cap", self.max_market_cap, np.less_equal),
+            ("volume_24h", self.min_volume, np.greater_equal),
+        ):
+            if bound is None:
+                continue
+            if not market.has_column(column):
+                return np.empty(0, dtype=np.int64)
+            values = market.column(column)
+            if candidates is not None:
+                values = values[candidates]
+            matches = keep(values, bound)  # NaN never matches
+            mask = matches if mask is None else mask & matches
+        if mask is not None:
+            candidates = np.flatnonzero(mask) if candidates is None else candidates[mask]
+
+        if not market.has_column(self.sort):
+            return np.empty(0, dtype=np.int64)
+        return market.top(self.limit, by=self.sort, descending=self.descending, rows=candidates)
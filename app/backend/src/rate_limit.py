@@ -0,0 +1,172 @@
+"""Client-side rate limiting and CoinMarketCap credit accounting."""
+import asyncio
+import logging
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from .http_client import HTTPClientError
+
+logger = logging.getLogger(__name__)
+
+
+class CreditBudgetExceeded(HTTPClientError):
+    """Raised instead of making a call the credit budget cannot cover."""
+    pass
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available."""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float) -> bool:
+        """Take ``tokens`` if available right now."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float) -> float:
+        """Seconds until ``tokens`` are available; infinite if they never will be."""
+        self._refill()
+        if tokens > self.capacity:
+            return math.inf
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def refund(self, tokens: float) -> None:
+        """Return tokens taken for work that did not happen."""
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class CreditBudget:
+    """Per-minute and per-day CoinMarketCap credit budgets.
+
+    The per-minute budget is a token bucket; calls wait up to ``max_wait``
+    seconds for it to refill. The per-day budget resets at midnight UTC,
+    like CoinMarketCap's own daily limits. A budget of 0 is unlimited.
+    Credits are reserved from an estimate before a call and settled with
+    the ``credit_count`` CMC reports afterwards.
+    """
+
+    def __init__(self, per_minute: int = 0, per_day: int = 0, max_wait: float = 5.0):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.max_wait = max_wait
+        self._minute = TokenBucket(rate=per_minute / 60.0, capacity=per_minute) if per_minute else None
+        self._day = self._today()
+        self.spent_today = 0.0
+        self.spent_total = 0.0
+        self.calls = 0
+        self.rejected = 0
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).date().isoformat()
+
+    def _roll_day(self) -> None:
+        today = self._today()
+        if today != self._day:
+            logger.info(f"Credit day {self._day} closed with {self.spent_today:.0f} credits spent")
+            self._day = today
+            self.spent_today = 0.0
+
+    @property
+    def remaining_today(self) -> float:
+        """Credits left in today's budget; infinite when unlimited."""
+        self._roll_day()
+        if not self.per_day:
+            return math.inf
+        return max(0.0, self.per_day - self.spent_today)
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether today's budget is used up."""
+        return self.remaining_today <= 0
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.per_minute or self.per_day)
+
+    @staticmethod
+    def seconds_until_reset() -> float:
+        """Seconds until the daily budget resets (midnight UTC)."""
+        now = datetime.now(timezone.utc)
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return max(1.0, (midnight - now).total_seconds())
+
+    def daily_rate(self) -> float:
+        """Credits per second that spend the rest of today's budget evenly until the reset."""
+        return self.remaining_today / self.seconds_until_reset()
+
+    async def acquire(self, credits: float) -> None:
+        """Reserve ``credits`` for a call, waiting briefly for the per-minute budget.
+
+        Raises:
+            CreditBudgetExceeded: If either budget cannot cover the call in time
+        """
+        async with self._lock:
+            if credits > self.remaining_today:
+                self.rejected += 1
+                raise CreditBudgetExceeded(
+                    f"Daily CMC credit budget exhausted ({self.spent_today:.0f}/{self.per_day} spent)"
+                )
+            if self._minute is not None:
+                wait = self._minute.wait_time(credits)
+                if wait > self.max_wait:
+                    self.rejected += 1
+                    raise CreditBudgetExceeded(
+                        f"Per-minute CMC credit budget exhausted ({self.per_minute}/min, {wait:.0f}s to refill)"
+                    )
+                if wait > 0:
+                    logger.debug(f"Waiting {wait:.2f}s for {credits} CMC credits")
+                    await asyncio.sleep(wait)
+                self._minute.try_acquire(credits)
+            self.spent_today += credits
+            self.spent_total += credits
+            self.calls += 1
+
+    def settle(self, reserved: float, actual: Optional[float]) -> None:
+        """Correct a reservation with the credits the call really cost (0 if it failed)."""
+        if actual is None or actual == reserved:
+            return
+        difference = actual - reserved
+        self.spent_today = max(0.0, self.spent_today + difference)
+        self.spent_total = max(0.0, self.spent_total + difference)
+        if self._minute is not None:
+            if difference < 0:
+                self._minute.refund(-difference)
+            else:
+                self._minute.try_acquire(min(difference, self._minute.tokens))
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "credits_per_minute": self.per_minute or None,
+            "credits_per_day": self.per_day or None,
+            "minute_credits_available": round(self._minute.tokens, 2) if self._minute is not None else None,
+            "spent_today": round(self.spent_today, 2),
+            "remaining_today": None if math.isinf(self.remaining_today) else round(self.remaining_today, 2),
+            "spent_total": round(self.spent_total, 2),
+            "calls": self.calls,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,149 @@
+"""Retry and circuit breaking for calls to upstream services."""
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .http_client import HTTPClientError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(HTTPClientError):
+    """Raised instead of calling an upstream whose circuit breaker is open."""
+    pass
+
+
+class RetryPolicy:
+    """Retry of retryable :class:`HTTPClientError` failures.
+
+    Waits follow exponential backoff with full jitter: a random delay up
+    to ``base_delay * 2**n`` capped at ``max_delay``. A ``retry_after`` sent
+    by the upstream replaces the computed delay; if it exceeds ``max_delay``
+    the error is raised at once rather than retried.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 10.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    def delay(self, attempt: int, error: HTTPClientError) -> Optional[float]:
+        """Seconds to wait before retrying after failed ``attempt`` (1-based); ``None`` to give up."""
+        if not error.retryable or attempt >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            return error.retry_after if error.retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def stats(self) -> dict:
+        """Return retry counters for monitoring."""
+        return {
+            "max_attempts": self.max_attempts,
+            "retries": self.retries,
+        }
+
+    async def call(self, fn: Callable[[], Awaitable[T]], name: str = "upstream call") -> T:
+        """Run ``fn``, retrying it while it fails with retryable errors.
+
+        Raises:
+            HTTPClientError: The last error once retries are exhausted or not allowed
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except HTTPClientError as e:
+                delay = self.delay(attempt, e)
+                if delay is None:
+                    raise
+                self.retries += 1
+                logger.warning(f"{name} failed (attempt {attempt}/{self.max_attempts}), retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures.
+
+    After ``failure_threshold`` consecutive retryable failures the breaker
+    opens and calls fail fast with :class:`CircuitOpenError`. After
+    ``reset_timeout`` seconds one trial call is let through (half-open); its
+    success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the upstream is currently considered down."""
+        return self.state != CLOSED
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn`` unless the breaker is open.
+
+        Raises:
+            CircuitOpenError: If the breaker is open, or a half-open trial is already running
+        """
+        state = self.state
+        if state == OPEN or (state == HALF_OPEN and self._trial_running):
+            raise CircuitOpenError(f"{self.name} circuit is open after {self.failures} consecutive failures")
+
+        trial = state == HALF_OPEN
+        self._trial_running = self._trial_running or trial
+        try:
+            result = await fn()
+        except HTTPClientError as e:
+            if e.retryable:
+                self._record_failure()
+            else:
+                self._reset()  # The upstream answered, just not with what we asked for
+            raise
+        finally:
+            if trial:
+                self._trial_running = False
+        self._reset()
+        return result
+
+    def _record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error(f"{self.name} circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+    def _reset(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"{self.name} circuit closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "state": self.state,
+            "failures": self.failures,
+        }
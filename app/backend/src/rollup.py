@@ -0,0 +1,245 @@
+"""Incremental OHLC rollups of the price history at fixed resolutions."""
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .history import HISTORY_FIELDS, HistoryStore, encode_record, map_file, read_records
+from .shared import _write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Fields of every bar: OHLC of the price, and the last 24h volume and market cap
+BAR_FIELDS: Tuple[str, ...] = ("open", "high", "low", "close", "volume_24h", "market_cap")
+
+# Stored resolutions, finest first: name, seconds per bar, seconds per history chunk
+RESOLUTIONS: Tuple[Tuple[str, int, int], ...] = (
+    ("1m", 60, 3600),
+    ("1h", 3600, 86400),
+    ("1d", 86400, 86400),
+)
+
+_PRICE, _VOLUME, _MARKET_CAP = (HISTORY_FIELDS.index(name) for name in ("price", "volume_24h", "market_cap"))
+
+
+def bars_from_samples(values: np.ndarray) -> np.ndarray:
+    """Raw history samples (price, volume, market cap) as one-sample bars."""
+    price = values[_PRICE]
+    return np.stack([price, price, price, price, values[_VOLUME], values[_MARKET_CAP]])
+
+
+def aggregate(times: np.ndarray, bars: np.ndarray, interval: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge bars into bars of ``interval`` seconds, aligned to the Unix epoch.
+
+    Args:
+        times: Bar start times in milliseconds, ascending
+        bars: ``(BAR_FIELDS, bars)`` values
+        interval: Seconds per output bar, a multiple of the input bars' length
+
+    Returns:
+        Start times and values of the output bars
+    """
+    if not len(times):
+        return times, bars
+    step = interval * 1000
+    buckets = times // step
+    firsts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    lasts = np.append(firsts[1:], len(times)) - 1
+    merged = np.empty((len(BAR_FIELDS), len(firsts)))
+    with np.errstate(invalid="ignore"):
+        merged[0] = bars[0][firsts]
+        merged[1] = np.fmax.reduceat(bars[1], firsts)
+        merged[2] = np.fmin.reduceat(bars[2], firsts)
+    merged[3:] = bars[3:, lasts]
+    return buckets[firsts] * step, merged
+
+
+class _Bar:
+    """The open bar of every coin at one resolution: start time, sorted IDs, values."""
+
+    def __init__(self, start: int, ids: np.ndarray, values: np.ndarray):
+        self.start = start
+        self.ids = ids
+        self.values = values
+
+    @classmethod
+    def open(cls, start: int, ids: np.ndarray, samples: np.ndarray) -> "_Bar":
+        return cls(start, ids, bars_from_samples(samples))
+
+    def update(self, ids: np.ndarray, samples: np.ndarray) -> None:
+        """Fold one snapshot's samples into the bar."""
+        if not np.array_equal(ids, self.ids):
+            union = np.union1d(self.ids, ids)
+            values = np.full((len(BAR_FIELDS), len(union)), np.nan)
+            values[:, np.searchsorted(union, self.ids)] = self.values
+            self.ids, self.values = union, values
+            samples_full = np.full((samples.shape[0], len(union)), np.nan)
+            samples_full[:, np.searchsorted(union, ids)] = samples
+            samples = samples_full
+
+        price = samples[_PRICE]
+        bar = self.values
+        bar[0] = np.where(np.isnan(bar[0]), price, bar[0])
+        bar[1] = np.fmax(bar[1], price)
+        bar[2] = np.fmin(bar[2], price)
+        for field, sample in ((3, _PRICE), (4, _VOLUME), (5, _MARKET_CAP)):
+            bar[field] = np.where(np.isnan(samples[sample]), bar[field], samples[sample])
+
+
+class OHLCRollup:
+    """OHLC bars of ``resolution`` seconds, updated snapshot by snapshot.
+
+    Each snapshot is folded into the open bar of every coin in a few
+    vectorised operations; when a snapshot falls into a later bar, the open
+    one is appended to ``store`` as a single record. The open bar is also
+    written to a small *partial* file after every update, so queries from
+    any worker include it and a restarted or newly elected writer carries
+    on with it instead of starting the period over.
+    """
+
+    def __init__(self, name: str, resolution: int, store: HistoryStore):
+        self.name = name
+        self.resolution = resolution
+        self.store = store
+        self.bars = 0
+        self._open: Dict[str, _Bar] = {}
+        self._written: Dict[str, Tuple[int, int]] = {}
+
+    def _partial_path(self, convert: str) -> str:
+        return os.path.join(self.store.convert_dir(convert), "partial.bar")
+
+    def update(self, convert: str, timestamp: int, ids: np.ndarray, samples: np.ndarray) -> None:
+        """Fold one recorded snapshot (sorted IDs, raw history samples) into the bars."""
+        step = self.resolution * 1000
+        start = timestamp - timestamp % step
+        path = self._partial_path(convert)
+        bar = self._open.get(convert)
+        if bar is None or self._written.get(convert) != self._signature(path):
+            bar = self._load(path)  # Another worker wrote since: continue from its bar
+
+        if bar is not None and bar.start > start:
+            return  # Older than the open bar
+        if bar is not None and bar.start < start:
+            if self.store.add(convert, bar.start, bar.ids, bar.values):
+                self.bars += 1
+            bar = None
+        if bar is None:
+            bar = _Bar.open(start, ids, samples)
+        else:
+            bar.update(ids, samples)
+        self._open[convert] = bar
+        self._save(convert, path, bar)
+
+    @staticmethod
+    def _signature(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _load(self, path: str) -> Optional[_Bar]:
+        buffer = map_file(path)
+        if buffer is None:
+            return None
+        for start, ids, values in read_records(buffer, len(BAR_FIELDS)):
+            return _Bar(start, ids.copy(), values.copy())
+        return None
+
+    def _save(self, convert: str, path: str, bar: _Bar) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_atomic(path, lambda file: file.write(encode_record(bar.start, bar.ids, bar.values)))
+            self._written[convert] = self._signature(path)
+        except OSError as e:
+            self.store.errors += 1
+            logger.error(f"Saving the open {self.name} bar of {convert} failed: {e}")
+
+    def read(self, convert: str, coin_id: int, start: float, end: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Bars of one coin starting between two Unix times (seconds), the open bar included."""
+        times, values = self.store.read(convert, coin_id, start, end)
+        buffer = map_file(self._partial_path(convert))
+        if buffer is None:
+            return times, values
+        for bar_start, ids, bar_values in read_records(buffer, len(BAR_FIELDS)):
+            position = int(np.searchsorted(ids, coin_id))
+            if (
+                start * 1000 <= bar_start <= end * 1000
+                and position < len(ids) and ids[position] == coin_id
+                and (not len(times) or bar_start > times[-1])
+            ):
+                times = np.append(times, bar_start)
+                values = np.concatenate([values, bar_values[:, position:position + 1]], axis=1)
+        return times, values
+
+
+class RollupPipeline:
+    """OHLC rollups at every resolution of :data:`RESOLUTIONS` of the ``raw`` history.
+
+    ``retention_days`` maps a resolution name to the days of bars kept.
+    """
+
+    def __init__(self, raw: HistoryStore, directory: str, retention_days: Dict[str, int]):
+        self.raw = raw
+        self.rollups: List[OHLCRollup] = [
+            OHLCRollup(
+                name,
+                resolution,
+                HistoryStore(
+                    os.path.join(directory, name),
+                    fields=BAR_FIELDS,
+                    chunk_interval=chunk_interval,
+                    retention_days=retention_days[name]
+                )
+            )
+            for name, resolution, chunk_interval in RESOLUTIONS
+        ]
+
+    def update(self, convert: str, timestamp: int, ids: np.ndarray, samples: np.ndarray) -> None:
+        """Fold one recorded snapshot into every resolution."""
+        for rollup in self.rollups:
+            try:
+                rollup.update(convert, timestamp, ids, samples)
+            except Exception as e:
+                logger.error(f"Updating {rollup.name} {convert} bars failed: {e}")
+
+    def source(self, interval: int) -> Optional[OHLCRollup]:
+        """Coarsest rollup whose bars add up to ``interval`` seconds, or None for raw samples."""
+        fitting = [rollup for rollup in self.rollups if interval % rollup.resolution == 0]
+        return fitting[-1] if fitting else None
+
+    def bars(self, convert: str, coin_id: int, start: float, end: float, interval: int) -> Tuple[str, np.ndarray, np.ndarray]:
+        """OHLC bars of ``interval`` seconds of one coin, from the coarsest source that adds up to them.
+
+        Returns:
+            Name of the source resolution (``raw`` for samples), bar start
+            times (ms) and ``(BAR_FIELDS, bars)`` values
+        """
+        start -= start % interval
+        rollup = self.source(interval)
+        if rollup is not None:
+            times, bars = rollup.read(convert, coin_id, start, end)
+        else:
+            times, samples = self.raw.read(convert, coin_id, start, end)
+            bars = bars_from_samples(samples)
+        times, bars = aggregate(times, bars, interval)
+        return rollup.name if rollup is not None else "raw", times, bars
+
+    def auto_interval(self, start: float, end: float, max_points: int) -> int:
+        """Finest stored resolution that covers ``start``..``end`` in at most ``max_points`` bars."""
+        for rollup in self.rollups:
+            if (end - start) / rollup.resolution <= max_points:
+                return rollup.resolution
+        return self.rollups[-1].resolution
+
+    async def close(self) -> None:
+        for rollup in self.rollups:
+            await rollup.store.close()
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            rollup.name: {"bars": rollup.bars, **rollup.store.stats()}
+            for rollup in self.rollups
+        }
@@ -1,59 +1,408 @@
 import logging
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Query, Path
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Hashable, Optional
+from fastapi import APIRouter, HTTPException, Query, Path, Request, Response
 from fastapi.responses import JSONResponse
 
 from . import cmc_client
+from .codec import CodecJSONResponse, response_cache
+from .compression import IDENTITY, negotiate
+from .config import settings
 from .models import ErrorResponse
+from .history import parse_interval
 from .http_client import HTTPClientError
+from .indicators import INDICATORS
+from .projection import ProjectionError, compile_projection
+from .query import SORT_FIELDS, ListingsQuery, QueryError
+from .snapshot import Snapshot
 
 logger = logging.getLogger(__name__)
 
+# Most coins in one correlation matrix
+MAX_CORRELATION_IDS = 50
+
 router = APIRouter(
     prefix='/cryptocurrency',
     tags=["Cryptocurrency"]
 )
 
 
+def _not_modified(request: Request, etag: str, snapshot: Snapshot) -> bool:
+    """Evaluate If-None-Match, or failing that If-Modified-Since, against a snapshot."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison, as RFC 9110 prescribes for If-None-Match
+        return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(snapshot.modified_at) <= since
+    return False
+
+
+def _snapshot_response(request: Request, snapshot: Snapshot, key: Hashable, build: Callable[[], Any]) -> Response:
+    """Respond with the body ``build`` makes from ``snapshot``, or 304 if the client has it.
+
+    The ETag depends only on the snapshot version, ``key`` and the
+    negotiated content coding, so conditional requests are answered without
+    building or encoding anything. Compressed bodies come precompressed
+    from the response cache.
+    """
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    etag = snapshot.etag(key)
+    headers = {**snapshot.headers(), "Vary": "Accept-Encoding"}
+    if encoding != IDENTITY:
+        # Every content coding is a distinct representation with its own strong ETag
+        etag = f'{etag[:-1]}-{encoding}"'
+        headers["Content-Encoding"] = encoding
+    headers["ETag"] = etag
+    if _not_modified(request, etag, snapshot):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get_or_encode(snapshot, key, build, encoding=encoding)
+    return CodecJSONResponse(content=body, headers=headers)
+
+
 @router.get(
     "/",
     summary="Get Cryptocurrency Listings",
-    description="Retrieve the latest cryptocurrency market data including prices, market cap, and other metrics.",
+    description=(
+        "Retrieve the latest cryptocurrency market data including prices, market cap, and other metrics. "
+        "Results can be sorted, filtered and trimmed to selected fields on the server."
+    ),
     responses={
         200: {"description": "Successful response with cryptocurrency data"},
+        304: {"description": "Not modified since the snapshot the client holds"},
+        400: {"model": ErrorResponse, "description": "Invalid query parameters"},
         503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
     }
 )
 async def get_cryptocurrency_listings(
+    request: Request,
     limit: int = Query(
         default=100,
         ge=1,
-        le=5000,
-        description="Number of results to return (1-5000)"
+        le=settings.LISTINGS_SNAPSHOT_LIMIT,
+        description=f"Number of results to return (1-{settings.LISTINGS_SNAPSHOT_LIMIT})"
     ),
     convert: str = Query(
         default="USD",
         description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    ),
+    sort: str = Query(
+        default="cmc_rank",
+        description=f"Field to rank results by: {', '.join(SORT_FIELDS)}"
+    ),
+    order: Optional[str] = Query(
+        default=None,
+        description="Sort order, 'asc' or 'desc' (default: asc for cmc_rank, desc otherwise)"
+    ),
+    min_market_cap: Optional[float] = Query(default=None, ge=0, description="Minimum market cap"),
+    max_market_cap: Optional[float] = Query(default=None, ge=0, description="Maximum market cap"),
+    min_volume: Optional[float] = Query(default=None, ge=0, description="Minimum 24h volume"),
+    max_rank: Optional[int] = Query(default=None, ge=1, description="Only consider the top N coins by rank"),
+    tag: Optional[str] = Query(default=None, description="Only coins with this tag (e.g., defi, mineable)"),
+    fields: Optional[str] = Query(
+        default=None,
+        description="Comma-separated field paths to return (e.g., id,name,symbol,quote.USD.price)"
     )
 ):
     """Get cryptocurrency listings with optional parameters."""
     try:
-        logger.info(f"Fetching cryptocurrency listings: limit={limit}, convert={convert}")
-        data = await cmc_client.get_listings(limit=limit, convert=convert)
+        query = ListingsQuery(
+            limit=limit,
+            sort=sort,
+            order=order,
+            min_market_cap=min_market_cap,
+            max_market_cap=max_market_cap,
+            min_volume=min_volume,
+            max_rank=max_rank,
+            tag=tag
+        )
+        projection = compile_projection(fields) if fields else None
+    except (QueryError, ProjectionError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        logger.info(f"Fetching cryptocurrency listings: {query}, convert={convert}")
+        snapshot = await cmc_client.get_listings_snapshot(convert=convert)
+        
+        def build():
+            rows = query.rows(snapshot.data)
+            if projection is None:
+                data = snapshot.data.records(rows)
+            else:
+                # Projected rows are rendered once per snapshot and field set
+                projected = snapshot.data.projected(projection)
+                data = [projected[row] for row in rows.tolist()]
+            return {
+                "data": data,
+                "count": len(data),
+                "limit": limit,
+                "convert": convert,
+                "updated_at": snapshot.updated_at
+            }
+        
+        return _snapshot_response(request, snapshot, ("listings", query, projection, convert), build)
+    except HTTPClientError as e:
+        logger.error(f"Error fetching cryptocurrency listings: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in get_cryptocurrency_listings: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+def _bar_interval(value: str) -> int:
+    """Seconds per bar of an interval parameter; raw samples have no bars.
+
+    Raises:
+        ValueError: If the interval is invalid or raw
+    """
+    seconds = parse_interval(value)
+    if not seconds:
+        raise ValueError("interval must be a time per bar (e.g., 5m, 1h, 1d)")
+    return seconds
+
+
+def _parse_time(value: str) -> float:
+    """Unix time in seconds from Unix seconds or an ISO 8601 timestamp (UTC unless it has an offset).
+
+    Raises:
+        ValueError: If the value is neither
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+@router.get(
+    "/search",
+    summary="Search Cryptocurrencies",
+    description="Find cryptocurrencies by ID, symbol, slug or name, with prefix and typo-tolerant matching.",
+    responses={
+        200: {"description": "Matching cryptocurrencies, best matches first"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def search_cryptocurrencies(
+    q: str = Query(
+        ...,
+        min_length=1,
+        max_length=64,
+        description="Text to search for (e.g., btc, ethereum, solan)"
+    ),
+    limit: int = Query(
+        default=10,
+        ge=1,
+        le=50,
+        description="Maximum number of results (1-50)"
+    )
+):
+    """Search cryptocurrencies by symbol, slug or name."""
+    try:
+        logger.info(f"Searching cryptocurrencies: q={q!r}, limit={limit}")
+        data = await cmc_client.search_currencies(q, limit=limit)
         return {
             "data": data,
             "count": len(data),
-            "limit": limit,
-            "convert": convert
+            "query": q
         }
     except HTTPClientError as e:
-        logger.error(f"Error fetching cryptocurrency listings: {str(e)}")
+        logger.error(f"Error searching cryptocurrencies: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to search cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in search_cryptocurrencies: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.get(
+    "/changes",
+    summary="Get Listings Change Events",
+    description=(
+        "Compact events between consecutive listings snapshots: price moves beyond the configured "
+        "threshold, rank changes and entries to or exits from the top N. Poll with `since` set to "
+        "the previous response's `next` to receive only new events."
+    ),
+    responses={
+        200: {"description": "Change events in order"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def get_cryptocurrency_changes(
+    since: int = Query(
+        default=0,
+        ge=0,
+        description="Sequence number of the last event already received"
+    ),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get listings change events after a sequence number."""
+    try:
+        return CodecJSONResponse(content=await cmc_client.get_listings_changes(convert=convert, since=since))
+    except HTTPClientError as e:
+        logger.error(f"Error fetching listings changes: {str(e)}")
         raise HTTPException(
             status_code=503,
             detail=f"Unable to fetch cryptocurrency data: {str(e)}"
         )
     except Exception as e:
-        logger.error(f"Unexpected error in get_cryptocurrency_listings: {str(e)}")
+        logger.error(f"Unexpected error in get_cryptocurrency_changes: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.get(
+    "/quotes",
+    summary="Get Quotes for Several Cryptocurrencies",
+    description="Retrieve the latest data for several cryptocurrencies by CoinMarketCap ID in a single request.",
+    responses={
+        200: {"description": "Successful response with data for every known ID"},
+        400: {"model": ErrorResponse, "description": "Invalid ID list"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def get_cryptocurrency_quotes(
+    ids: str = Query(
+        ...,
+        description=f"Comma-separated CoinMarketCap IDs, at most {settings.QUOTES_BATCH_SIZE} (e.g., 1,1027,825)"
+    ),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get several cryptocurrencies by ID with at most one upstream call."""
+    parts = [part.strip() for part in ids.split(',') if part.strip()]
+    if not parts or not all(part.isdigit() and int(part) >= 1 for part in parts):
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of positive integers")
+    currency_ids = list(dict.fromkeys(int(part) for part in parts))
+    if len(currency_ids) > settings.QUOTES_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {settings.QUOTES_BATCH_SIZE} ids per request")
+    
+    try:
+        logger.info(f"Fetching quotes for {len(currency_ids)} IDs, convert={convert}")
+        results = await cmc_client.get_currency_snapshots(currency_ids, convert=convert)
+        
+        data = {}
+        missing = []
+        oldest = None
+        for currency_id, result in results.items():
+            if isinstance(result, HTTPClientError) and "not found" in str(result).lower():
+                missing.append(currency_id)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                data[str(currency_id)] = result.data
+                if oldest is None or result.fetched_at < oldest.fetched_at:
+                    oldest = result
+        
+        return CodecJSONResponse(
+            content={
+                "data": data,
+                "missing": missing,
+                "count": len(data),
+                "convert": convert,
+                "updated_at": oldest.updated_at if oldest else None
+            },
+            headers=oldest.headers() if oldest is not None else None
+        )
+    except HTTPClientError as e:
+        logger.error(f"Error fetching cryptocurrency quotes: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unable to fetch cryptocurrency data: {str(e)}"
+        )
+    except Exception as e:
+        logger.error(f"Unexpected error in get_cryptocurrency_quotes: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.get(
+    "/correlation",
+    summary="Get Return Correlations",
+    description=(
+        "Pearson correlation matrix of the log returns of several cryptocurrencies over their "
+        "most recent history bars. Only bars recorded for every coin are compared."
+    ),
+    responses={
+        200: {"description": "Correlation matrix in the order of the requested IDs"},
+        400: {"model": ErrorResponse, "description": "Invalid ID list or interval"},
+        404: {"model": ErrorResponse, "description": "Price history is disabled"}
+    }
+)
+def get_cryptocurrency_correlation(
+    ids: str = Query(
+        ...,
+        description=f"Comma-separated CoinMarketCap IDs, 2 to {MAX_CORRELATION_IDS} (e.g., 1,1027,825)"
+    ),
+    interval: str = Query(
+        default="1h",
+        description="Time per bar (e.g., 5m, 1h, 1d)"
+    ),
+    window: int = Query(
+        default=30,
+        ge=2,
+        le=1000,
+        description="Number of most recent bars whose returns are compared"
+    ),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get the correlation matrix of several cryptocurrencies' returns.
+
+    Not a coroutine, like the history endpoint: it reads history files.
+    """
+    if cmc_client.indicator_engine is None:
+        raise HTTPException(status_code=404, detail="Price history is disabled")
+    parts = [part.strip() for part in ids.split(',') if part.strip()]
+    if not parts or not all(part.isdigit() and int(part) >= 1 for part in parts):
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of positive integers")
+    currency_ids = list(dict.fromkeys(int(part) for part in parts))
+    if not 2 <= len(currency_ids) <= MAX_CORRELATION_IDS:
+        raise HTTPException(status_code=400, detail=f"Between 2 and {MAX_CORRELATION_IDS} ids per request")
+    try:
+        seconds = _bar_interval(interval)
+        logger.info(f"Correlating {len(currency_ids)} IDs, convert={convert}, interval={interval}, window={window}")
+        return CodecJSONResponse(
+            content=cmc_client.get_correlation(currency_ids, window, seconds, convert=convert)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_cryptocurrency_correlation: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail="Internal server error"
@@ -66,11 +415,14 @@ async def get_cryptocurrency_listings(
     description="Retrieve detailed information about a specific cryptocurrency by its CoinMarketCap ID.",
     responses={
         200: {"description": "Successful response with cryptocurrency data"},
+        304: {"description": "Not modified since the snapshot the client holds"},
+        400: {"model": ErrorResponse, "description": "Invalid fields expression"},
         404: {"model": ErrorResponse, "description": "Cryptocurrency not found"},
         503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
     }
 )
 async def get_cryptocurrency_by_id(
+    request: Request,
     currency_id: int = Path(
         ...,
         ge=1,
@@ -79,17 +431,32 @@ async def get_cryptocurrency_by_id(
     convert: str = Query(
         default="USD",
         description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    ),
+    fields: Optional[str] = Query(
+        default=None,
+        description="Comma-separated field paths to return (e.g., name,symbol,quote.USD.price)"
     )
 ):
     """Get specific cryptocurrency by ID."""
+    try:
+        projection = compile_projection(fields) if fields else None
+    except ProjectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     try:
         logger.info(f"Fetching cryptocurrency data for ID: {currency_id}, convert={convert}")
-        data = await cmc_client.get_currency(currency_id=currency_id, convert=convert)
-        return {
-            "data": data,
-            "currency_id": currency_id,
-            "convert": convert
-        }
+        snapshot = await cmc_client.get_currency_snapshot(currency_id=currency_id, convert=convert)
+        return _snapshot_response(
+            request,
+            snapshot,
+            ("currency", projection, convert),
+            lambda: {
+                "data": projection.apply(snapshot.data) if projection is not None else snapshot.data,
+                "currency_id": currency_id,
+                "convert": convert,
+                "updated_at": snapshot.updated_at
+            }
+        )
     except HTTPClientError as e:
         error_msg = str(e)
         if "not found" in error_msg.lower():
@@ -110,3 +477,152 @@ async def get_cryptocurrency_by_id(
             status_code=500,
             detail="Internal server error"
         )
+
+
+@router.get(
+    "/{currency_id}/history",
+    summary="Get Price History",
+    description=(
+        "OHLC price bars with the 24h volume and market cap of a cryptocurrency, as columns of "
+        "equal length. Bars come from 1m, 1h or 1d rollups kept up to date at every refresh. "
+        "Without `interval` the finest resolution that fits the range is used; `interval=raw` "
+        "returns every recorded sample."
+    ),
+    responses={
+        200: {"description": "Bars or samples in the range, oldest first"},
+        400: {"model": ErrorResponse, "description": "Invalid range or interval, or too many points"},
+        404: {"model": ErrorResponse, "description": "Price history is disabled"}
+    }
+)
+def get_cryptocurrency_history(
+    currency_id: int = Path(
+        ...,
+        ge=1,
+        description="The CoinMarketCap cryptocurrency ID"
+    ),
+    start: Optional[str] = Query(
+        default=None,
+        alias="from",
+        description="Start of the range: Unix seconds or ISO 8601 (default: 24 hours before `to`)"
+    ),
+    end: Optional[str] = Query(
+        default=None,
+        alias="to",
+        description="End of the range: Unix seconds or ISO 8601 (default: now)"
+    ),
+    interval: Optional[str] = Query(
+        default=None,
+        description="Time per bar (e.g., 300, 5m, 4h, 1d), or raw for every sample"
+    ),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get the recorded price history of a cryptocurrency.
+
+    Not a coroutine: reading and decoding history files blocks, so
+    FastAPI runs it in the thread pool, away from the event loop.
+    """
+    if cmc_client.history_store is None:
+        raise HTTPException(status_code=404, detail="Price history is disabled")
+    try:
+        end_time = _parse_time(end) if end else time.time()
+        start_time = _parse_time(start) if start else end_time - 86400
+        seconds = parse_interval(interval)
+        if start_time > end_time:
+            raise ValueError("from must not be after to")
+        logger.info(f"Fetching history for ID: {currency_id}, convert={convert}, interval={interval}")
+        return CodecJSONResponse(
+            content=cmc_client.get_currency_history(
+                currency_id, start_time, end_time, interval=seconds, convert=convert
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_cryptocurrency_history: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
+
+
+@router.get(
+    "/{currency_id}/indicators",
+    summary="Get Technical Indicators",
+    description=(
+        "Simple and exponential moving averages, RSI and annualised volatility over the history "
+        "bars of a cryptocurrency, with the bars' closes. Values are null until enough bars "
+        "precede them. Series stay cached and are extended as new bars close."
+    ),
+    responses={
+        200: {"description": "Indicator values per bar, oldest first"},
+        400: {"model": ErrorResponse, "description": "Invalid indicator, range or interval, or too many points"},
+        404: {"model": ErrorResponse, "description": "Price history is disabled"}
+    }
+)
+def get_cryptocurrency_indicators(
+    currency_id: int = Path(
+        ...,
+        ge=1,
+        description="The CoinMarketCap cryptocurrency ID"
+    ),
+    kind: str = Query(
+        default=",".join(INDICATORS),
+        description=f"Comma-separated indicators: {', '.join(INDICATORS)}"
+    ),
+    window: int = Query(
+        default=14,
+        ge=2,
+        le=1000,
+        description="Bars per indicator window"
+    ),
+    interval: str = Query(
+        default="1h",
+        description="Time per bar (e.g., 5m, 1h, 1d)"
+    ),
+    start: Optional[str] = Query(
+        default=None,
+        alias="from",
+        description="Start of the range: Unix seconds or ISO 8601 (default: 100 bars before `to`)"
+    ),
+    end: Optional[str] = Query(
+        default=None,
+        alias="to",
+        description="End of the range: Unix seconds or ISO 8601 (default: now)"
+    ),
+    convert: str = Query(
+        default="USD",
+        description="Currency to convert prices to (e.g., USD, EUR, BTC)"
+    )
+):
+    """Get technical indicators of a cryptocurrency's price history.
+
+    Not a coroutine, like the history endpoint: it reads history files.
+    """
+    if cmc_client.indicator_engine is None:
+        raise HTTPException(status_code=404, detail="Price history is disabled")
+    try:
+        kinds = list(dict.fromkeys(part.strip().lower() for part in kind.split(',') if part.strip()))
+        if not kinds:
+            raise ValueError("kind must name at least one indicator")
+        seconds = _bar_interval(interval)
+        end_time = _parse_time(end) if end else time.time()
+        start_time = _parse_time(start) if start else end_time - 100 * seconds
+        if start_time > end_time:
+            raise ValueError("from must not be after to")
+        logger.info(f"Fetching indicators for ID: {currency_id}, kind={kind}, window={window}, interval={interval}")
+        return CodecJSONResponse(
+            content=cmc_client.get_currency_indicators(
+                currency_id, kinds, window, seconds, start_time, end_time, convert=convert
+            )
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in get_cryptocurrency_indicators: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Internal server error"
+        )
@@ -0,0 +1,106 @@
+"""Demand- and budget-aware choice of the snapshots each refresh round updates."""
+import logging
+import math
+import time
+from typing import Dict, Hashable, Iterable, List, Set
+
+from .rate_limit import CreditBudget
+from .snapshot import SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Pick which tracked keys a refresh round updates.
+
+    Keys nobody has read for ``idle_timeout`` seconds stop being refreshed
+    (unless pinned); their next read loads them again. With a daily credit
+    budget, credits accrue at the rate that spends the rest of the day's
+    budget evenly until the reset, and each round refreshes keys only while
+    accrued credits cover their cost: first keys that were never loaded,
+    then the most read, then the oldest. Keys never loaded are loaded even
+    when that overdraws the accrued credits, since their first read would
+    load them anyway; later rounds pay the overdraft back. Keys the last
+    round skipped are :meth:`deferred`: stores keep serving their snapshots
+    past ``max_staleness``, flagged as stale, until a round refreshes them.
+    """
+
+    def __init__(self, budget: CreditBudget, idle_timeout: float):
+        self.budget = budget
+        self.idle_timeout = idle_timeout
+        self.banked = 0.0
+        self.dropped = 0
+        self.skipped = 0
+        self.planned = 0
+        self._deferred: Dict[str, Set[Hashable]] = {}
+        self._accrued_at = time.monotonic()
+
+    def deferred(self, store_name: str, key: Hashable) -> bool:
+        """Whether the last round put off refreshing ``key`` of store ``store_name``."""
+        return key in self._deferred.get(store_name, ())
+
+    def deferred_keys(self) -> Dict[str, Set[Hashable]]:
+        """Keys the last round of each store put off, by store name."""
+        return {name: set(keys) for name, keys in self._deferred.items() if keys}
+
+    def defer(self, store_name: str, keys: Iterable[Hashable]) -> None:
+        """Record ``keys`` as the ones put off for ``store_name`` (e.g. as another worker planned)."""
+        self._deferred[store_name] = set(keys)
+
+    def plan(self, store: SnapshotStore, keys: List[Hashable]) -> List[Hashable]:
+        """Return the subset of ``keys`` of ``store`` to refresh now, best first."""
+        active = []
+        for key in keys:
+            if not store.is_pinned(key) and store.idle_time(key) > self.idle_timeout:
+                store.untrack(key)
+                self.dropped += 1
+                logger.info(f"Stopped refreshing idle {store.name} snapshot {key!r}")
+            else:
+                active.append(key)
+
+        demand = {key: store.take_reads(key) for key in active}
+        if not self.budget.per_day:
+            self.defer(store.name, ())
+            self.planned += len(active)
+            return active
+
+        self._accrue()
+
+        def priority(key):
+            snapshot = store.get(key)
+            age = snapshot.age if snapshot is not None else math.inf
+            return (snapshot is not None, -demand[key], -age)
+
+        chosen = []
+        for key in sorted(active, key=priority):
+            cost = store.cost(key)
+            if cost <= self.banked or store.get(key) is None:
+                self.banked -= cost
+                chosen.append(key)
+        self.defer(store.name, set(active).difference(chosen))
+        skipped = len(active) - len(chosen)
+        if skipped:
+            self.skipped += skipped
+            logger.info(
+                f"Credit budget defers {skipped}/{len(active)} {store.name} refreshes "
+                f"({self.banked:.2f} credits banked, {self.budget.remaining_today:.0f} left today)"
+            )
+        self.planned += len(chosen)
+        return chosen
+
+    def _accrue(self) -> None:
+        now = time.monotonic()
+        earned = self.budget.daily_rate() * (now - self._accrued_at)
+        self._accrued_at = now
+        self.banked = min(self.budget.remaining_today, self.banked + earned)
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "idle_timeout": self.idle_timeout,
+            "banked_credits": round(self.banked, 2),
+            "planned": self.planned,
+            "skipped": self.skipped,
+            "deferred": sum(len(keys) for keys in self._deferred.values()),
+            "dropped_idle": self.dropped,
+        }
@@ -0,0 +1,240 @@
+"""In-memory id/symbol/slug/name index for coin search."""
+import bisect
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Match quality, best first
+EXACT = 0
+PREFIX = 1
+FUZZY = 2
+
+_MATCH_NAMES = {EXACT: "exact", PREFIX: "prefix", FUZZY: "fuzzy"}
+_SPLIT = re.compile(r"[\s\-_.]+")
+
+
+@dataclass(frozen=True)
+class CoinEntry:
+    """The searchable fields of one coin."""
+    id: int
+    name: str
+    symbol: str
+    slug: str
+    rank: int
+
+    @property
+    def terms(self) -> Tuple[str, ...]:
+        """Normalised terms the coin can be found by."""
+        name = normalize(self.name)
+        words = [word for word in _SPLIT.split(name) if word]
+        return tuple(dict.fromkeys([normalize(self.symbol), normalize(self.slug), name, *words]))
+
+    def to_dict(self, match: int) -> Dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "symbol": self.symbol,
+            "slug": self.slug,
+            "cmc_rank": self.rank,
+            "match": _MATCH_NAMES[match],
+        }
+
+
+def normalize(text: str) -> str:
+    """Lower-case and trim a search term."""
+    return (text or "").strip().lower()
+
+
+def _deletes(term: str) -> Set[str]:
+    """Every variant of ``term`` with exactly one character removed."""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Whether ``a`` and ``b`` differ by at most one insert, delete, substitution or transposition."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+class SymbolIndex:
+    """Prefix and typo-tolerant lookup over the coins of a listings snapshot.
+
+    Terms are kept in a sorted list for prefix lookups by binary search, and
+    in a symmetric-delete map (every term with one character removed) for
+    single-typo matches, so no query scans the whole coin universe. The
+    best-ranked matches of very short prefixes, which would otherwise match
+    thousands of terms, are precomputed on every update.
+    :meth:`update` applies only the differences from the previous snapshot.
+    """
+
+    def __init__(self, min_fuzzy_length: int = 4, short_prefix_length: int = 2, max_results: int = 50):
+        self.min_fuzzy_length = min_fuzzy_length
+        self.short_prefix_length = short_prefix_length
+        self.max_results = max_results
+        self._coins: Dict[int, CoinEntry] = {}
+        self._term_ids: Dict[str, Set[int]] = {}
+        self._sorted_terms: List[str] = []
+        self._delete_terms: Dict[str, Set[str]] = {}
+        self._short_prefixes: Dict[str, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._coins)
+
+    def update(self, coins: Iterable[Dict]) -> None:
+        """Bring the index in line with a new listings snapshot.
+
+        Args:
+            coins: Coin dictionaries as returned by the listings endpoint
+        """
+        entries = {}
+        for coin in coins:
+            entry = CoinEntry(
+                id=coin["id"],
+                name=coin.get("name") or "",
+                symbol=coin.get("symbol") or "",
+                slug=coin.get("slug") or "",
+                rank=coin.get("cmc_rank") or 0,
+            )
+            entries[entry.id] = entry
+
+        removed = added = reranked = 0
+        for coin_id in list(self._coins):
+            if coin_id not in entries:
+                self._remove(self._coins.pop(coin_id))
+                removed += 1
+
+        for coin_id, entry in entries.items():
+            current = self._coins.get(coin_id)
+            if current == entry:
+                continue
+            if current is not None and current.terms == entry.terms:
+                # Only the rank moved; the terms stay indexed
+                self._coins[coin_id] = entry
+                reranked += 1
+                continue
+            if current is not None:
+                self._remove(current)
+            self._coins[coin_id] = entry
+            self._add(entry)
+            added += 1
+
+        if added or removed or reranked:
+            self._rebuild_short_prefixes()
+        if added or removed:
+            logger.info(f"Search index updated: {added} coins (re)indexed, {removed} removed, {len(self._coins)} total")
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """Find coins by id, symbol, slug or name.
+
+        Exact matches come first, then prefix matches, then matches within
+        one typo; each group is ordered by market cap rank.
+
+        Args:
+            query: Text to look for
+            limit: Maximum number of results
+
+        Returns:
+            Matching coins with their match type
+        """
+        q = normalize(query)
+        if not q:
+            return []
+
+        best: Dict[int, int] = {}
+
+        def consider(ids: Iterable[int], match: int) -> None:
+            for coin_id in ids:
+                if best.get(coin_id, FUZZY + 1) > match:
+                    best[coin_id] = match
+
+        if q.isdigit() and int(q) in self._coins:
+            consider([int(q)], EXACT)
+        consider(self._term_ids.get(q, ()), EXACT)
+
+        if len(q) <= self.short_prefix_length:
+            consider(self._short_prefixes.get(q, ()), PREFIX)
+        else:
+            position = bisect.bisect_left(self._sorted_terms, q)
+            while position < len(self._sorted_terms) and self._sorted_terms[position].startswith(q):
+                consider(self._term_ids[self._sorted_terms[position]], PREFIX)
+                position += 1
+
+        if len(q) >= self.min_fuzzy_length:
+            candidates: Set[str] = set(self._delete_terms.get(q, ()))
+            for variant in _deletes(q):
+                if variant in self._term_ids:
+                    candidates.add(variant)
+                candidates.update(self._delete_terms.get(variant, ()))
+            for term in candidates:
+                if _within_one_edit(q, term):
+                    consider(self._term_ids.get(term, ()), FUZZY)
+
+        ranked = sorted(best.items(), key=lambda item: (item[1], self._rank_key(item[0])))
+        return [self._coins[coin_id].to_dict(match) for coin_id, match in ranked[:limit]]
+
+    def get(self, coin_id: int) -> Optional[CoinEntry]:
+        return self._coins.get(coin_id)
+
+    def _rank_key(self, coin_id: int) -> Tuple[int, int]:
+        rank = self._coins[coin_id].rank
+        return (0, rank) if rank else (1, coin_id)
+
+    def _rebuild_short_prefixes(self) -> None:
+        """Precompute the best-ranked coins for every prefix up to ``short_prefix_length``."""
+        matches: Dict[str, Set[int]] = defaultdict(set)
+        for term, ids in self._term_ids.items():
+            for length in range(1, min(len(term), self.short_prefix_length) + 1):
+                matches[term[:length]].update(ids)
+        self._short_prefixes = {
+            prefix: sorted(ids, key=self._rank_key)[:self.max_results]
+            for prefix, ids in matches.items()
+        }
+
+    def _add(self, entry: CoinEntry) -> None:
+        for term in entry.terms:
+            ids = self._term_ids.get(term)
+            if ids is None:
+                ids = self._term_ids[term] = set()
+                bisect.insort(self._sorted_terms, term)
+                if len(term) >= self.min_fuzzy_length:
+                    for variant in _deletes(term):
+                        self._delete_terms.setdefault(variant, set()).add(term)
+            ids.add(entry.id)
+
+    def _remove(self, entry: CoinEntry) -> None:
+        for term in entry.terms:
+            ids = self._term_ids.get(term)
+            if ids is None:
+                continue
+            ids.discard(entry.id)
+            if ids:
+                continue
+            del self._term_ids[term]
+            position = bisect.bisect_left(self._sorted_terms, term)
+            if position < len(self._sorted_terms) and self._sorted_terms[position] == term:
+                del self._sorted_terms[position]
+            if len(term) >= self.min_fuzzy_length:
+                for variant in _deletes(term):
+                    terms = self._delete_terms.get(variant)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._delete_terms[variant]
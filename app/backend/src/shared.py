@@ -0,0 +1,379 @@
+"""Snapshots shared between the worker processes of one deployment."""
+import asyncio
+import glob
+import logging
+import mmap
+import os
+import tempfile
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .codec import codec
+from .market import MarketSnapshot
+from .snapshot import Fetched, SnapshotRefresher, SnapshotStore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not on POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Worker roles
+LEADER = "leader"
+FOLLOWER = "follower"
+
+
+def _encode_key(key: Hashable) -> Any:
+    return list(key) if isinstance(key, tuple) else key
+
+
+def _decode_key(key: Any) -> Hashable:
+    return tuple(key) if isinstance(key, list) else key
+
+
+def _file_key(key: Hashable) -> str:
+    """A key as part of a file name: alphanumeric parts as they are, others hex-encoded.
+
+    Keys come from requests (e.g. the convert currency), so nothing else
+    of them reaches the file system.
+    """
+    parts = key if isinstance(key, tuple) else (key,)
+    return "_".join(
+        text if text.isalnum() else "~" + text.encode().hex()
+        for text in map(str, parts)
+    )
+
+
+def _write_atomic(path: str, write) -> None:
+    """Write a file under a temporary name and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, "wb") as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class LeaderLock:
+    """Exclusive lock on a file, held by at most one process at a time.
+
+    The operating system releases it when the holding process exits, so a
+    crashed leader is replaced by whichever worker asks next.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """Take the lock if no other process holds it; never blocks."""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SharedSnapshots:
+    """Let one worker refresh snapshots from upstream and the others map them.
+
+    Every worker takes part; whichever holds the leader lock runs the
+    :class:`SnapshotRefresher` and publishes each new snapshot to
+    ``directory``. Columnar stores write one file per key in the layout of
+    :meth:`MarketSnapshot.write`, which the other workers ``mmap``: their
+    numeric columns are views into the shared page cache rather than
+    copies. Other stores write one JSON document per key, so followers
+    parse only the keys that changed.
+
+    Followers poll the directory every ``poll_interval`` seconds and install
+    what changed into their own stores. Keys they load themselves, and the
+    reads they serve, are reported back to the leader through small demand
+    files, so it tracks and schedules refreshes for the whole deployment;
+    the keys its scheduler puts off are published back, so followers serve
+    those, and only those, stale as the leader does.
+    While a pinned key has not been published yet, followers wait up to
+    ``wait`` seconds for it instead of loading it from upstream themselves.
+    Followers try to take the lock on every poll and take over refreshing
+    when the leader exits.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        refresher: SnapshotRefresher,
+        poll_interval: float = 1.0,
+        wait: float = 10.0
+    ):
+        self.directory = directory
+        self.refresher = refresher
+        self.poll_interval = poll_interval
+        self.wait = wait
+        self.role: Optional[str] = None
+        self.published = 0
+        self.installed = 0
+        self.demand_reports = 0
+        self._lock = LeaderLock(os.path.join(directory, "leader.lock"))
+        self._stores: Dict[str, Tuple[SnapshotStore, bool]] = {}
+        self._loaders: Dict[str, Any] = {}
+        self._seen: Dict[str, Tuple[int, int, int]] = {}
+        self._dirty: Dict[str, set] = {}
+        self._flush_scheduled = False
+        self._demand_seq = 0
+        self._deferred: Optional[bytes] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def add_store(self, store: SnapshotStore, columnar: bool = False) -> None:
+        """Share ``store``; ``columnar`` stores hold MarketSnapshot data under string keys."""
+        self._stores[store.name] = (store, columnar)
+        self._loaders[store.name] = store.loader
+        store.subscribe(lambda key, snapshot, name=store.name: self._on_put(name, key))
+
+    async def start(self) -> None:
+        """Join the deployment as leader or follower and start polling."""
+        os.makedirs(self.directory, exist_ok=True)
+        if self._lock.try_acquire():
+            self._become_leader()
+        else:
+            self.role = FOLLOWER
+            for name, (store, _) in self._stores.items():
+                store.loader = self._follower_loader(store, self._loaders[name])
+            self.sync()
+            logger.info(f"Worker {os.getpid()} follows the shared snapshots in {self.directory}")
+        self._task = asyncio.create_task(self._run(), name="shared-snapshots")
+
+    async def stop(self) -> None:
+        """Stop polling, and refreshing if leader, and give up the lock."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.role == LEADER:
+            self._flush()
+            await self.refresher.stop()
+        self._lock.release()
+
+    def _become_leader(self) -> None:
+        self.role = LEADER
+        for name, (store, _) in self._stores.items():
+            store.loader = self._loaders[name]
+            self._dirty.setdefault(name, set()).update(store.keys())
+        self._schedule_flush()
+        self.refresher.start()
+        logger.info(f"Worker {os.getpid()} leads refreshing; publishing snapshots to {self.directory}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                if self.role == FOLLOWER:
+                    if self._lock.try_acquire():
+                        self._become_leader()
+                    else:
+                        self.sync()
+                        self._report_demand()
+                if self.role == LEADER:
+                    self._collect_demand()
+                    self._publish_deferred()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Syncing shared snapshots failed: {e}")
+
+    # Leader side
+
+    def _on_put(self, name: str, key: Hashable) -> None:
+        if self.role != LEADER:
+            return
+        self._dirty.setdefault(name, set()).add(key)
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        # Publish once per batch of puts (e.g. a refresh round), not once per key
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        dirty, self._dirty = self._dirty, {}
+        for name, keys in dirty.items():
+            store, columnar = self._stores[name]
+            for key in keys:
+                try:
+                    if columnar:
+                        self._publish_columnar(store, key)
+                    else:
+                        self._publish_json(store, key)
+                except Exception as e:
+                    logger.error(f"Publishing {name} snapshot {key!r} failed: {e}")
+
+    def _path(self, store: SnapshotStore, key: Hashable, columnar: bool) -> str:
+        return os.path.join(self.directory, f"{store.name}-{_file_key(key)}.{'snap' if columnar else 'json'}")
+
+    def _publish_columnar(self, store: SnapshotStore, key: Hashable) -> None:
+        snapshot = store.get(key)
+        if snapshot is None:
+            return
+        meta = {"key": key, "fetched_at": snapshot.fetched_at, "modified_at": snapshot.modified_at}
+        _write_atomic(self._path(store, key, columnar=True), lambda file: snapshot.data.write(file, meta))
+        self.published += 1
+
+    def _publish_json(self, store: SnapshotStore, key: Hashable) -> None:
+        snapshot = store.get(key)
+        if snapshot is None:
+            return
+        entry = {
+            "key": _encode_key(key),
+            "data": snapshot.data,
+            "fetched_at": snapshot.fetched_at,
+            "modified_at": snapshot.modified_at,
+        }
+        _write_atomic(self._path(store, key, columnar=False), lambda file: file.write(codec.dumps(entry)))
+        self.published += 1
+
+    def _collect_demand(self) -> None:
+        """Track the keys followers read and count their reads."""
+        for path in glob.glob(os.path.join(self.directory, "demand-*.json")):
+            try:
+                with open(path, "rb") as file:
+                    demand = codec.loads(file.read())
+                os.unlink(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping demand file {path}: {e}")
+                continue
+            for name, reads in demand.items():
+                if name not in self._stores:
+                    continue
+                store, _ = self._stores[name]
+                for key, count in reads:
+                    key = _decode_key(key)
+                    store.track(key)
+                    store.note_reads(key, count)
+
+    def _publish_deferred(self) -> None:
+        """Publish the keys the scheduler put off, whenever they change."""
+        scheduler = self.refresher.scheduler
+        if scheduler is None:
+            return
+        deferred = codec.dumps({
+            name: [_encode_key(key) for key in keys]
+            for name, keys in scheduler.deferred_keys().items()
+            if name in self._stores
+        })
+        if deferred != self._deferred:
+            _write_atomic(os.path.join(self.directory, "deferred.json"), lambda file: file.write(deferred))
+            self._deferred = deferred
+
+    # Follower side
+
+    def sync(self) -> None:
+        """Install every snapshot published since the last call."""
+        for name, (store, columnar) in self._stores.items():
+            for path in glob.glob(os.path.join(self.directory, f"{name}-*.{'snap' if columnar else 'json'}")):
+                if self._changed(path):
+                    if columnar:
+                        self._install_columnar(store, path)
+                    else:
+                        self._install_json(store, path)
+        path = os.path.join(self.directory, "deferred.json")
+        if self.refresher.scheduler is not None and self._changed(path):
+            self._install_deferred(path)
+
+    def _changed(self, path: str) -> bool:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self._seen.get(path) == signature:
+            return False
+        self._seen[path] = signature
+        return True
+
+    def _install_columnar(self, store: SnapshotStore, path: str) -> None:
+        with open(path, "rb") as file:
+            # The mapping outlives the file: the snapshot's columns keep it referenced
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        data, meta = MarketSnapshot.from_buffer(buffer)
+        store.put(meta["key"], data, fetched_at=meta["fetched_at"], modified_at=meta["modified_at"])
+        self.installed += 1
+
+    def _install_json(self, store: SnapshotStore, path: str) -> None:
+        with open(path, "rb") as file:
+            entry = codec.loads(file.read())
+        store.put(
+            _decode_key(entry["key"]),
+            entry["data"],
+            fetched_at=entry["fetched_at"],
+            modified_at=entry["modified_at"]
+        )
+        self.installed += 1
+
+    def _install_deferred(self, path: str) -> None:
+        with open(path, "rb") as file:
+            deferred = codec.loads(file.read())
+        for name in self._stores:
+            self.refresher.scheduler.defer(name, map(_decode_key, deferred.get(name, ())))
+
+    def _follower_loader(self, store: SnapshotStore, loader):
+        async def load(key: Hashable):
+            # The leader refreshes pinned keys from startup: wait for its copy
+            if store.is_pinned(key):
+                deadline = time.monotonic() + self.wait
+                while self.role == FOLLOWER and time.monotonic() < deadline:
+                    self.sync()
+                    snapshot = store.get(key)
+                    if snapshot is not None:
+                        return Fetched(snapshot.data, snapshot.fetched_at, snapshot.modified_at)
+                    await asyncio.sleep(min(0.1, self.poll_interval))
+            return await loader(key)
+        return load
+
+    def _report_demand(self) -> None:
+        demand: Dict[str, List[list]] = {}
+        for name, (store, _) in self._stores.items():
+            reads = [[_encode_key(key), store.take_reads(key)] for key in store.keys()]
+            reads = [entry for entry in reads if entry[1]]
+            if reads:
+                demand[name] = reads
+        if not demand:
+            return
+        self._demand_seq += 1
+        _write_atomic(
+            os.path.join(self.directory, f"demand-{os.getpid()}-{self._demand_seq}.json"),
+            lambda file: file.write(codec.dumps(demand))
+        )
+        self.demand_reports += 1
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        return {
+            "role": self.role,
+            "pid": os.getpid(),
+            "directory": self.directory,
+            "published": self.published,
+            "installed": self.installed,
+            "demand_reports": self.demand_reports,
+        }
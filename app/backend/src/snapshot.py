@@ -0,0 +1,380 @@
+"""In-memory market data snapshots kept fresh by a background refresher."""
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import formatdate
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from .cache import SingleFlight
+from .codec import codec
+from .http_client import HTTPClientError
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotUnavailableError(HTTPClientError):
+    """Raised when no snapshot fresh enough to serve is available."""
+    pass
+
+
+def content_version(data: Any) -> str:
+    """Digest identifying the content of ``data``.
+
+    Objects with a ``digest()`` method provide their own; anything else is
+    hashed in its JSON encoding.
+    """
+    digest = getattr(data, "digest", None)
+    if callable(digest):
+        return digest()
+    return hashlib.blake2b(codec.dumps(data), digest_size=16).hexdigest()
+
+
+@dataclass
+class Fetched:
+    """Loader result for data fetched at a known time rather than just now."""
+    data: Any
+    fetched_at: float
+    modified_at: Optional[float] = None
+
+
+@dataclass
+class Snapshot:
+    """A piece of upstream data and the moment it was fetched.
+
+    ``version`` identifies the content; ``modified_at`` is when the content
+    last changed, which is earlier than ``fetched_at`` when refreshes keep
+    returning the same data.
+    """
+    data: Any
+    fetched_at: float = field(default_factory=time.time)
+    version: str = ""
+    modified_at: Optional[float] = None
+    # Set once the snapshot is served past its store's max_staleness because it cannot be refreshed
+    stale: bool = field(default=False, compare=False)
+    # Values derived from ``data`` (e.g. encoded response bodies), dropped with the snapshot
+    memo: "OrderedDict[Hashable, Any]" = field(default_factory=OrderedDict, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.modified_at is None:
+            self.modified_at = self.fetched_at
+
+    @property
+    def age(self) -> float:
+        """Seconds elapsed since the data was fetched."""
+        return max(0.0, time.time() - self.fetched_at)
+
+    @property
+    def updated_at(self) -> str:
+        """ISO 8601 timestamp of the last change of the data."""
+        return datetime.fromtimestamp(self.modified_at, tz=timezone.utc).isoformat()
+
+    def headers(self) -> Dict[str, str]:
+        """HTTP headers describing the snapshot's freshness."""
+        headers = {
+            "Age": str(int(self.age)),
+            "Last-Modified": formatdate(self.modified_at, usegmt=True)
+        }
+        if self.stale:
+            headers["X-Data-Stale"] = "true"
+        return headers
+
+    def etag(self, key: Hashable) -> str:
+        """Strong ETag of a response built from this snapshot.
+
+        Args:
+            key: Everything other than the snapshot that shapes the response;
+                its ``repr`` must be stable across processes
+
+        Returns:
+            Quoted entity tag
+        """
+        digest = hashlib.blake2b(f"{self.version}:{key!r}".encode(), digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+
+class SnapshotStore:
+    """Keyed snapshots loaded on first demand and refreshed in the background.
+
+    Request handlers only ever read the current snapshot for a key. The very
+    first read of an unknown key loads it once; afterwards the key is
+    tracked and kept fresh by :class:`SnapshotRefresher`. Snapshots older
+    than ``max_staleness`` seconds are refused rather than served, except
+    while ``upstream_down(key)`` is true (upstream failing, or the refresh
+    of ``key`` put off to save credits): then the last good snapshot is
+    served, flagged as stale, for up to ``stale_if_error`` more seconds.
+
+    Reads are counted per key so a scheduler can refresh by demand;
+    ``cost(key)`` estimates the upstream credits one refresh of a key takes.
+    A loader returns the data, or a :class:`Fetched` when the data was
+    fetched earlier (e.g. by another process).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        max_staleness: float,
+        max_keys: int = 256,
+        upstream_down: Optional[Callable[[Hashable], bool]] = None,
+        stale_if_error: float = 0.0,
+        cost: Optional[Callable[[Hashable], float]] = None
+    ):
+        self.name = name
+        self.loader = loader
+        self.max_staleness = max_staleness
+        self.max_keys = max_keys
+        self.upstream_down = upstream_down
+        self.stale_if_error = stale_if_error
+        self.cost = cost or (lambda key: 1.0)
+        self._snapshots: "OrderedDict[Hashable, Optional[Snapshot]]" = OrderedDict()
+        self._flight = SingleFlight()
+        self._listeners: List[Callable[[Hashable, Snapshot], None]] = []
+        self._pinned: Set[Hashable] = set()
+        self._reads: Dict[Hashable, int] = {}
+        self._last_read: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def keys(self) -> List[Hashable]:
+        """Return every tracked key, least recently read first."""
+        return list(self._snapshots)
+
+    def track(self, key: Hashable, pinned: bool = False) -> None:
+        """Start tracking ``key`` so the refresher keeps it fresh.
+
+        Args:
+            key: Key to track
+            pinned: Keep the key refreshed even when nobody reads it
+        """
+        if pinned:
+            self._pinned.add(key)
+        if key not in self._snapshots:
+            self._snapshots[key] = None
+            self._last_read.setdefault(key, time.monotonic())
+            self._evict()
+
+    def untrack(self, key: Hashable) -> bool:
+        """Stop refreshing an unpinned ``key``; its next read loads it again.
+
+        Returns:
+            Whether the key was dropped
+        """
+        if key in self._pinned or key not in self._snapshots:
+            return False
+        del self._snapshots[key]
+        self._forget(key)
+        return True
+
+    def is_pinned(self, key: Hashable) -> bool:
+        return key in self._pinned
+
+    def take_reads(self, key: Hashable) -> int:
+        """Return and reset the number of reads of ``key`` since the last call."""
+        return self._reads.pop(key, 0)
+
+    def note_reads(self, key: Hashable, count: int) -> None:
+        """Count ``count`` reads of ``key`` made elsewhere (e.g. by another worker)."""
+        if key in self._snapshots and count > 0:
+            self._reads[key] = self._reads.get(key, 0) + count
+            self._last_read[key] = time.monotonic()
+
+    def idle_time(self, key: Hashable) -> float:
+        """Seconds since ``key`` was last read (or tracked)."""
+        return time.monotonic() - self._last_read.get(key, time.monotonic())
+
+    def get(self, key: Hashable) -> Optional[Snapshot]:
+        """Return the current snapshot for ``key`` without any freshness check."""
+        return self._snapshots.get(key)
+
+    def subscribe(self, listener: Callable[[Hashable, Snapshot], None]) -> None:
+        """Call ``listener(key, snapshot)`` whenever a snapshot is replaced."""
+        self._listeners.append(listener)
+
+    def put(
+        self,
+        key: Hashable,
+        data: Any,
+        fetched_at: Optional[float] = None,
+        modified_at: Optional[float] = None
+    ) -> Snapshot:
+        """Replace the snapshot for ``key`` and notify listeners.
+
+        When the content is unchanged, the previous data, modification time
+        and derived values are carried over, so validators and encoded
+        responses stay valid across refreshes.
+
+        Args:
+            key: Snapshot key
+            data: New data
+            fetched_at: When the data was fetched, if not just now
+            modified_at: When the data last changed, if not at ``fetched_at``
+        """
+        version = content_version(data)
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        previous = self._snapshots.get(key)
+        if previous is not None and previous.version == version:
+            snapshot = Snapshot(
+                data=previous.data,
+                fetched_at=fetched_at,
+                version=version,
+                modified_at=previous.modified_at,
+                memo=previous.memo
+            )
+        else:
+            snapshot = Snapshot(data=data, fetched_at=fetched_at, version=version, modified_at=modified_at)
+        self._snapshots[key] = snapshot
+        self._evict()
+        for listener in self._listeners:
+            try:
+                listener(key, snapshot)
+            except Exception as e:
+                logger.error(f"Snapshot listener {listener!r} failed for {self.name} {key!r}: {e}")
+        return snapshot
+
+    async def refresh(self, key: Hashable) -> Snapshot:
+        """Load ``key`` from upstream, sharing any load already in flight."""
+        return await self._flight.do(key, lambda: self._load(key))
+
+    async def read(self, key: Hashable) -> Snapshot:
+        """Return a snapshot for ``key`` that is fresh enough to serve.
+
+        Raises:
+            SnapshotUnavailableError: If the snapshot is older than ``max_staleness``
+                and may not be served stale
+            HTTPClientError: If the first load of a new key fails
+        """
+        snapshot = self._snapshots.get(key)
+        if key in self._snapshots:
+            self._snapshots.move_to_end(key)
+        self._reads[key] = self._reads.get(key, 0) + 1
+        self._last_read[key] = time.monotonic()
+        if snapshot is None:
+            self.track(key)
+            try:
+                return await self.refresh(key)
+            except Exception:
+                # Never loaded: stop tracking so the refresher does not retry it forever
+                if self._snapshots.get(key, False) is None:
+                    del self._snapshots[key]
+                    self._forget(key)
+                raise
+        if snapshot.age > self.max_staleness:
+            if (
+                self.upstream_down is not None and self.upstream_down(key)
+                and snapshot.age <= self.max_staleness + self.stale_if_error
+            ):
+                if not snapshot.stale:
+                    logger.warning(f"Serving stale {self.name} snapshot {key!r} while it cannot be refreshed")
+                    snapshot.stale = True
+                return snapshot
+            logger.error(f"Refusing {self.name} snapshot {key!r}: {snapshot.age:.0f}s old")
+            raise SnapshotUnavailableError(
+                f"Data is {snapshot.age:.0f}s old (max {self.max_staleness:.0f}s)"
+            )
+        return snapshot
+
+    async def _load(self, key: Hashable) -> Snapshot:
+        data = await self.loader(key)
+        if isinstance(data, Fetched):
+            return self.put(key, data.data, fetched_at=data.fetched_at, modified_at=data.modified_at)
+        return self.put(key, data)
+
+    def _forget(self, key: Hashable) -> None:
+        self._reads.pop(key, None)
+        self._last_read.pop(key, None)
+
+    def _evict(self) -> None:
+        """Drop least recently read keys beyond ``max_keys``."""
+        while len(self._snapshots) > self.max_keys:
+            evicted, _ = self._snapshots.popitem(last=False)
+            self._forget(evicted)
+            logger.debug(f"Stopped tracking {self.name} snapshot {evicted!r}")
+
+
+class SnapshotRefresher:
+    """Background task refreshing every tracked key of the given stores.
+
+    Each store is refreshed by its own loop every ``interval`` seconds plus
+    up to ``jitter`` seconds of random delay. After a failed round the loop
+    retries with exponential backoff starting at ``retry_delay`` and capped
+    at ``max_backoff``. An optional ``scheduler`` picks which tracked keys
+    each round actually refreshes.
+    """
+
+    def __init__(
+        self,
+        stores: List[SnapshotStore],
+        interval: float,
+        jitter: float = 0.0,
+        retry_delay: float = 5.0,
+        max_backoff: float = 300.0,
+        scheduler=None
+    ):
+        self.stores = stores
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_delay = retry_delay
+        self.max_backoff = max_backoff
+        self.scheduler = scheduler
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self) -> None:
+        """Start one refresh loop per store."""
+        if self.running:
+            return
+        self._tasks = [
+            asyncio.create_task(self._run(store), name=f"refresh-{store.name}")
+            for store in self.stores
+        ]
+        logger.info(f"Snapshot refresher started (interval={self.interval}s, jitter={self.jitter}s)")
+
+    async def stop(self) -> None:
+        """Cancel the refresh loops and wait for them to finish."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Snapshot refresher stopped")
+
+    async def refresh(self, store: SnapshotStore) -> None:
+        """Refresh the tracked keys of ``store`` once (those the scheduler picks, if any).
+
+        Raises:
+            HTTPClientError: If any key failed to refresh
+        """
+        keys = store.keys()
+        if self.scheduler is not None:
+            keys = self.scheduler.plan(store, keys)
+        results = await asyncio.gather(*(store.refresh(key) for key in keys), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            raise HTTPClientError(
+                f"{len(errors)}/{len(keys)} {store.name} snapshots failed to refresh: {errors[0]}"
+            )
+        if keys:
+            logger.debug(f"Refreshed {len(keys)} {store.name} snapshots")
+
+    async def _run(self, store: SnapshotStore) -> None:
+        failures = 0
+        while True:
+            try:
+                await self.refresh(store)
+                failures = 0
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failures += 1
+                delay = min(self.max_backoff, self.retry_delay * 2 ** (failures - 1))
+                logger.warning(f"Refreshing {store.name} failed ({failures} in a row), retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay + random.uniform(0, self.jitter))
@@ -0,0 +1,198 @@
+"""Push of listings changes to streaming (WebSocket / SSE) subscribers."""
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Hashable, Iterable, Set, Tuple
+
+import numpy as np
+
+from .codec import codec
+from .diff import DiffEngine, SnapshotDiff
+from .snapshot import Snapshot, SnapshotStore
+
+logger = logging.getLogger(__name__)
+
+# Fields pushed to subscribers, from the coin level or the convert's quote block
+STREAM_FIELDS: Tuple[str, ...] = (
+    "cmc_rank",
+    "price",
+    "volume_24h",
+    "market_cap",
+    "percent_change_1h",
+    "percent_change_24h",
+    "percent_change_7d",
+)
+
+
+class Subscription:
+    """One streaming client: the coins it follows and its pending messages.
+
+    At most ``max_pending`` messages wait for a slow client. When more
+    arrive, the pending ones are dropped and the client is sent a fresh
+    snapshot of its coins instead, so a slow client costs bounded memory and
+    always catches up to the current state.
+    """
+
+    def __init__(self, convert: str, ids: Set[int], max_pending: int):
+        self.convert = convert
+        self.ids = ids
+        self.max_pending = max_pending
+        self.needs_snapshot = True
+        self.resyncs = 0
+        self._pending: deque = deque()
+        self._wake = asyncio.Event()
+        self._wake.set()
+
+    def push(self, message: bytes) -> None:
+        if len(self._pending) >= self.max_pending:
+            self._pending.clear()
+            self.needs_snapshot = True
+            self.resyncs += 1
+        else:
+            self._pending.append(message)
+        self._wake.set()
+
+    def pop(self) -> bytes:
+        return self._pending.popleft()
+
+    def follow(self, ids: Iterable[int]) -> None:
+        """Add coins; the next message is a snapshot including them."""
+        self.ids |= set(ids)
+        self.resync()
+
+    def unfollow(self, ids: Iterable[int]) -> None:
+        self.ids -= set(ids)
+
+    def resync(self) -> None:
+        self._pending.clear()
+        self.needs_snapshot = True
+        self._wake.set()
+
+    async def wait(self) -> None:
+        """Wait until a message or a snapshot is due."""
+        while not self.needs_snapshot and not self._pending:
+            self._wake.clear()
+            await self._wake.wait()
+
+
+class PriceBroadcaster:
+    """Fan listings changes out to every subscription of a convert currency.
+
+    Changes come from the :class:`DiffEngine`, which compares each new
+    listings snapshot with the previous one once; the changes of every coin
+    are encoded once, and subscriptions following the same set of changed coins
+    share one encoded message. Publishing never waits for a client: see
+    :class:`Subscription` for how slow clients are handled.
+    """
+
+    def __init__(
+        self,
+        store: SnapshotStore,
+        diffs: DiffEngine,
+        fields: Tuple[str, ...] = STREAM_FIELDS,
+        max_pending: int = 32
+    ):
+        self.store = store
+        self.fields = fields
+        self.max_pending = max_pending
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self.rounds = 0
+        self.messages = 0
+        store.subscribe(self._on_snapshot)
+        diffs.subscribe(self._on_diff)
+
+    def __len__(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def subscribe(self, convert: str, ids: Iterable[int]) -> Subscription:
+        """Start following ``ids`` in ``convert``; the first message is their snapshot."""
+        subscription = Subscription(convert, set(ids), self.max_pending)
+        self._subscriptions.setdefault(convert, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.convert)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.convert]
+
+    async def next_message(self, subscription: Subscription) -> Tuple[str, bytes]:
+        """Wait for the next message of ``subscription``.
+
+        Returns:
+            Message type (``snapshot`` or ``update``) and its JSON body
+        """
+        await subscription.wait()
+        if subscription.needs_snapshot:
+            subscription.needs_snapshot = False
+            return "snapshot", self.snapshot_message(subscription)
+        return "update", subscription.pop()
+
+    def snapshot_message(self, subscription: Subscription) -> bytes:
+        """Current values of every coin ``subscription`` follows."""
+        snapshot = self.store.get(subscription.convert)
+        data, missing = {}, sorted(subscription.ids)
+        if snapshot is not None:
+            ids = np.array(missing, dtype=np.int64)
+            rows = snapshot.data.indices_of(ids)
+            fields = [name for name in self.fields if snapshot.data.has_column(name)]
+            for values in snapshot.data.iter_rows(("id", *fields), index=rows[rows >= 0]):
+                data[str(values.pop("id"))] = values
+            missing = ids[rows < 0].tolist()
+        return codec.dumps({
+            "type": "snapshot",
+            "convert": subscription.convert,
+            "updated_at": snapshot.updated_at if snapshot is not None else None,
+            "data": data,
+            "missing": missing,
+        })
+
+    def _on_snapshot(self, convert: Hashable, snapshot: Snapshot) -> None:
+        subscriptions = self._subscriptions.get(convert)
+        if subscriptions:
+            # Open streams count as reads, so the scheduler keeps refreshing their data
+            self.store.note_reads(convert, len(subscriptions))
+
+    def _on_diff(self, diff: SnapshotDiff) -> None:
+        convert = diff.convert
+        subscriptions = self._subscriptions.get(convert)
+        if not subscriptions:
+            return
+
+        changes = diff.field_changes(self.fields)
+        if not changes and not len(diff.removed):
+            return
+        self.rounds += 1
+        fragments = {coin_id: b'"%d":%s' % (coin_id, codec.dumps(values)) for coin_id, values in changes.items()}
+        removed_ids = set(diff.removed.tolist())
+        snapshot = self.store.get(convert)
+        updated_at = snapshot.updated_at if snapshot is not None else None
+        prefix = b'{"type":"update","convert":%s,"updated_at":%s,"data":{' % (
+            codec.dumps(convert), codec.dumps(updated_at)
+        )
+
+        encoded: Dict[Tuple[frozenset, frozenset], bytes] = {}
+        for subscription in subscriptions:
+            changed = frozenset(coin_id for coin_id in subscription.ids if coin_id in fragments)
+            gone = frozenset(subscription.ids & removed_ids) if removed_ids else frozenset()
+            if not changed and not gone:
+                continue
+            message = encoded.get((changed, gone))
+            if message is None:
+                message = encoded[(changed, gone)] = (
+                    prefix + b",".join(fragments[coin_id] for coin_id in sorted(changed))
+                    + b'},"removed":' + codec.dumps(sorted(gone)) + b"}"
+                )
+            subscription.push(message)
+            self.messages += 1
+
+    def stats(self) -> dict:
+        """Return counters for monitoring."""
+        subscriptions = [s for group in self._subscriptions.values() for s in group]
+        return {
+            "subscribers": len(subscriptions),
+            "rounds": self.rounds,
+            "messages": self.messages,
+            "resyncs": sum(s.resyncs for s in subscriptions),
+        }
@@ -0,0 +1,147 @@
+"""WebSocket and Server-Sent Events endpoints streaming listings changes."""
+import asyncio
+import logging
+from typing import List
+
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from . import cmc_client
+from .config import settings
+from .http_client import HTTPClientError
+from .models import ErrorResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Streaming"])
+
+
+def _parse_ids(ids: str) -> List[int]:
+    """Parse a comma-separated ID list.
+
+    Raises:
+        ValueError: If an ID is not a positive integer or there are too many
+    """
+    parts = [part.strip() for part in ids.split(',') if part.strip()]
+    if not parts or not all(part.isdigit() and int(part) >= 1 for part in parts):
+        raise ValueError("ids must be a comma-separated list of positive integers")
+    currency_ids = list(dict.fromkeys(int(part) for part in parts))
+    if len(currency_ids) > settings.LISTINGS_SNAPSHOT_LIMIT:
+        raise ValueError(f"At most {settings.LISTINGS_SNAPSHOT_LIMIT} ids per subscription")
+    return currency_ids
+
+
+@router.get(
+    "/stream/prices",
+    summary="Stream Price Changes (Server-Sent Events)",
+    description=(
+        "Subscribe to coins of the listings snapshot by ID. The first `snapshot` event holds their "
+        "current values; every later `update` event holds only the coins and fields that changed."
+    ),
+    responses={
+        200: {"description": "text/event-stream of snapshot and update events"},
+        400: {"model": ErrorResponse, "description": "Invalid ID list"},
+        503: {"model": ErrorResponse, "description": "Service unavailable - API error"}
+    }
+)
+async def stream_prices(
+    ids: str = Query(..., description="Comma-separated CoinMarketCap IDs (e.g., 1,1027,825)"),
+    convert: str = Query(default="USD", description="Currency to convert prices to (e.g., USD, EUR, BTC)")
+):
+    """Stream changes of the given coins as Server-Sent Events."""
+    try:
+        currency_ids = _parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    convert = convert.upper()
+    try:
+        await cmc_client.get_listings_snapshot(convert=convert)
+    except HTTPClientError as e:
+        raise HTTPException(status_code=503, detail=f"Unable to fetch cryptocurrency data: {str(e)}")
+
+    broadcaster = cmc_client.price_broadcaster
+    subscription = broadcaster.subscribe(convert, currency_ids)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    kind, body = await asyncio.wait_for(
+                        broadcaster.next_message(subscription),
+                        timeout=settings.STREAM_HEARTBEAT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"  # Keeps proxies from closing an idle stream
+                    continue
+                yield b"event: " + kind.encode() + b"\ndata: " + body + b"\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws/prices")
+async def websocket_prices(
+    websocket: WebSocket,
+    ids: str = Query(default="", description="Comma-separated CoinMarketCap IDs to start with"),
+    convert: str = Query(default="USD", description="Currency to convert prices to")
+):
+    """Stream changes of subscribed coins over a WebSocket.
+
+    Clients change their subscription by sending
+    ``{"action": "subscribe" | "unsubscribe", "ids": [1, 1027]}``; every
+    subscribe is answered with a fresh ``snapshot`` message.
+    """
+    await websocket.accept()
+    convert = convert.upper()
+    try:
+        currency_ids = _parse_ids(ids) if ids else []
+        await cmc_client.get_listings_snapshot(convert=convert)
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    except HTTPClientError:
+        await websocket.close(code=1013, reason="Data temporarily unavailable")
+        return
+
+    broadcaster = cmc_client.price_broadcaster
+    subscription = broadcaster.subscribe(convert, currency_ids)
+
+    async def send():
+        while True:
+            _, body = await broadcaster.next_message(subscription)
+            await websocket.send_text(body.decode())
+
+    sender = asyncio.create_task(send())
+    try:
+        while True:
+            message = await websocket.receive_json()
+            action = message.get("action") if isinstance(message, dict) else None
+            requested = message.get("ids") if isinstance(message, dict) else None
+            if action not in ("subscribe", "unsubscribe") or not isinstance(requested, list):
+                await websocket.send_json({"type": "error", "detail": "Expected {\"action\": \"subscribe\"|\"unsubscribe\", \"ids\": [...]}"})
+                continue
+            try:
+                changed = _parse_ids(",".join(map(str, requested)))
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            if action == "subscribe":
+                if len(subscription.ids | set(changed)) > settings.LISTINGS_SNAPSHOT_LIMIT:
+                    await websocket.send_json({"type": "error", "detail": "Too many ids"})
+                    continue
+                subscription.follow(changed)
+            else:
+                subscription.unfollow(changed)
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Closing price stream: {e}")
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        broadcaster.unsubscribe(subscription)
@@ -0,0 +1 @@
+"""Tests of the Crypto Tracker backend."""
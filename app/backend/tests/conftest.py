@@ -0,0 +1,11 @@
+import os
+
+import pytest
+
+# Settings are read at import time and require an API key
+os.environ.setdefault("CMC_API_KEY", "test-api-key-0000")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
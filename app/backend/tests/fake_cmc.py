@@ -0,0 +1,57 @@
+"""A local stand-in for the CoinMarketCap API, served by aiohttp's test server."""
+from typing import Callable, List, Optional
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+
+def listings_body(count: int = 3, credit_count: int = 1) -> dict:
+    return {
+        "status": {"error_code": 0, "error_message": None, "credit_count": credit_count},
+        "data": [
+            {"id": i, "name": f"Coin {i}", "symbol": f"C{i}", "cmc_rank": i, "quote": {"USD": {"price": 100.0 / i}}}
+            for i in range(1, count + 1)
+        ],
+    }
+
+
+def reply(status: int = 200, body: Optional[dict] = None, headers: Optional[dict] = None) -> Callable:
+    """A handler answering ``status`` with ``body`` (a listings body by default)."""
+    async def handler(request: web.Request) -> web.Response:
+        return web.json_response(listings_body() if body is None else body, status=status, headers=headers)
+    return handler
+
+
+class FakeCMC:
+    """Answer upstream requests from a script of handlers, one per request.
+
+    The last handler of the script keeps answering once the others are used
+    up. Every request received is recorded in ``requests``.
+    """
+
+    def __init__(self, *script: Callable):
+        self.script: List[Callable] = list(script) or [reply()]
+        self.requests: List[web.Request] = []
+        app = web.Application()
+        app.router.add_route("GET", "/{path:.*}", self._handle)
+        self.server = TestServer(app)
+
+    def answer(self, *script: Callable) -> None:
+        """Replace the handlers still to come."""
+        self.script = list(script)
+
+    @property
+    def url(self) -> str:
+        return str(self.server.make_url("")).rstrip("/")
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.requests.append(request)
+        handler = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        return await handler(request)
+
+    async def __aenter__(self) -> "FakeCMC":
+        await self.server.start_server()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.server.close()
@@ -0,0 +1,103 @@
+"""Alert matching: firing through the outbox, failures, and matching off the event loop."""
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app.backend.src.alerts import ABOVE, BELOW, AlertEngine
+from app.backend.src.market import MarketSnapshot
+
+from .fake_cmc import listings_body
+
+
+def listings(**prices) -> MarketSnapshot:
+    """Listings of coins 1-5 (price 100/id), with the prices given as ``c<id>=price`` replaced."""
+    body = listings_body(count=5)
+    for coin in body["data"]:
+        coin["quote"]["USD"]["price"] = prices.get(f"c{coin['id']}", coin["quote"]["USD"]["price"])
+    return MarketSnapshot.from_listings(body["data"], convert="USD")
+
+
+def diff(snapshot: MarketSnapshot) -> SimpleNamespace:
+    return SimpleNamespace(convert="USD", current=snapshot)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = AlertEngine(str(tmp_path / "alerts.db"))
+    yield engine
+    engine.close()
+
+
+def test_alerts_fire_once_into_the_outbox(engine):
+    engine.create(7, 1, "USD", ABOVE, 150.0)
+    engine.create(7, 1, "USD", ABOVE, 300.0)
+    engine.create(8, 2, "USD", BELOW, 40.0)
+
+    assert engine.on_diff(diff(listings())).result() == 0
+    assert engine.on_diff(diff(listings(c1=200.0, c2=30.0))).result() == 2
+    assert engine.on_diff(diff(listings(c1=200.0, c2=30.0))).result() == 0
+
+    fired = engine.notifications()
+    assert [(n["user_id"], n["coin_id"], n["threshold"], n["value"]) for n in fired] == [
+        (7, 1, 150.0, 200.0), (8, 2, 40.0, 30.0)
+    ]
+    assert [alert.threshold for alert in engine.user_alerts(7)] == [300.0]
+
+
+def test_alerts_fire_after_a_failed_transaction(engine, monkeypatch):
+    engine.create(7, 1, "USD", ABOVE, 150.0)
+    engine.on_diff(diff(listings())).result()
+
+    fire = engine._fire
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(engine, "_fire", locked)
+    assert engine.on_diff(diff(listings(c1=200.0))).result() == 0
+    assert engine.errors == 1
+    assert engine.notifications() == []
+
+    monkeypatch.setattr(engine, "_fire", fire)
+    assert engine.on_diff(diff(listings(c1=200.0))).result() == 1
+    assert [n["alert_id"] for n in engine.notifications()] == [1]
+    assert engine.stats()["indexed"] == 0
+
+
+def test_matching_waits_for_the_write_lock_off_the_caller(engine, tmp_path):
+    engine.create(7, 1, "USD", ABOVE, 150.0)
+    engine.on_diff(diff(listings())).result()
+
+    # Another worker holds the write lock
+    other = sqlite3.connect(str(tmp_path / "alerts.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    pending = engine.on_diff(diff(listings(c1=200.0)))
+    assert time.monotonic() - started < 0.1
+    time.sleep(0.3)
+    assert not pending.done()
+
+    other.execute("COMMIT")
+    other.close()
+    assert pending.result(timeout=10) == 1
+
+
+def test_request_threads_each_use_their_own_connection(engine, tmp_path):
+    engine.create(7, 1, "USD", ABOVE, 150.0)
+
+    other = sqlite3.connect(str(tmp_path / "alerts.db"), isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        # Waits for the write lock on a request thread while this one keeps reading
+        pending = pool.submit(engine.create, 7, 2, "USD", BELOW, 40.0)
+        time.sleep(0.2)
+        assert not pending.done()
+        assert [alert.coin_id for alert in engine.user_alerts(7)] == [1]
+
+        other.execute("COMMIT")
+        other.close()
+        assert pending.result(timeout=10).coin_id == 2
+    assert [alert.coin_id for alert in engine.user_alerts(7)] == [1, 2]
@@ -0,0 +1,147 @@
+"""Redis refresh locks and SharedLoader coordination between replicas, on fakeredis."""
+import asyncio
+import time
+
+import fakeredis
+import pytest
+
+from app.backend.src import cache_backend
+from app.backend.src.cache_backend import RedisBackend, SharedLoader
+from app.backend.src.market import MarketSnapshot
+
+from .fake_cmc import listings_body
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def redis_server(monkeypatch) -> fakeredis.FakeServer:
+    """One fake Redis server that every RedisBackend created in a test connects to."""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        cache_backend.redis, "from_url", lambda url: fakeredis.FakeAsyncRedis(server=server)
+    )
+    return server
+
+
+def counting_gets(backend: RedisBackend) -> list:
+    """Record the keys ``backend`` GETs."""
+    keys = []
+    get = backend.get
+
+    async def counted(key):
+        keys.append(key)
+        return await get(key)
+
+    backend.get = counted
+    return keys
+
+
+class Replica:
+    """A SharedLoader as one API replica runs it, with its own connection."""
+
+    def __init__(self, lock_ttl: float = 5.0, load_time: float = 0.3):
+        self.backend = RedisBackend("redis://fake")
+        self.gets = counting_gets(self.backend)
+        self.loads = 0
+        self.load_time = load_time
+        self.loader = SharedLoader(
+            self.backend, "listings", self._load, fresh_for=60.0, ttl=120.0, lock_ttl=lock_ttl
+        )
+
+    async def _load(self, convert):
+        self.loads += 1
+        await asyncio.sleep(self.load_time)
+        return MarketSnapshot.from_listings(listings_body(count=50)["data"], convert=convert)
+
+    @property
+    def value_gets(self) -> int:
+        """GETs of the snapshot value itself, rather than its version."""
+        return sum(1 for key in self.gets if not key.startswith("version:"))
+
+
+async def test_lock_is_taken_by_one_holder_and_expires(redis_server):
+    backend = RedisBackend("redis://fake")
+    token = await backend.acquire_lock("lock:listings:USD", 0.2)
+    assert token
+    assert await backend.acquire_lock("lock:listings:USD", 0.2) is None
+    ttl = await backend._client.pttl(backend.prefix + "lock:listings:USD")
+    assert 0 < ttl <= 200
+
+    await asyncio.sleep(0.25)
+    assert await backend.acquire_lock("lock:listings:USD", 0.2)
+
+
+async def test_lock_is_released_only_by_its_holder(redis_server):
+    backend = RedisBackend("redis://fake")
+    token = await backend.acquire_lock("lock:listings:USD", 5.0)
+
+    await backend.release_lock("lock:listings:USD", "not-the-token")
+    assert await backend.acquire_lock("lock:listings:USD", 5.0) is None
+
+    await backend.release_lock("lock:listings:USD", token)
+    assert await backend.acquire_lock("lock:listings:USD", 5.0)
+
+
+async def test_one_replica_loads_while_the_others_wait(redis_server):
+    replicas = [Replica() for _ in range(5)]
+    results = await asyncio.gather(*(replica.loader("USD") for replica in replicas))
+
+    assert sum(replica.loads for replica in replicas) == 1
+    assert sum(replica.loader.waits for replica in replicas) == 4
+    assert sum(replica.loader.shared_hits for replica in replicas) == 4
+    digests = {getattr(result, "data", result).digest() for result in results}
+    assert len(digests) == 1
+
+
+async def test_waiting_replicas_fetch_the_value_once(redis_server):
+    replicas = [Replica(load_time=0.6) for _ in range(4)]
+    await asyncio.gather(*(replica.loader("USD") for replica in replicas))
+
+    waiters = [replica for replica in replicas if not replica.loads]
+    assert len(waiters) == 3
+    for waiter in waiters:
+        # Several polls of the version key while the leader loads, one fetch of the value
+        assert len(waiter.gets) > 3
+        assert waiter.value_gets == 1
+
+
+async def test_fresh_value_is_served_from_the_cache(redis_server):
+    first, second = Replica(), Replica()
+    await first.loader("USD")
+
+    cached = await second.loader("USD")
+
+    assert second.loads == 0
+    assert second.loader.waits == 0
+    assert second.value_gets == 1
+    assert len(cached.data) == 50
+    assert time.time() - cached.fetched_at < 5
+
+
+async def test_waiters_load_themselves_once_a_dead_holders_lock_expires(redis_server):
+    dead = RedisBackend("redis://fake")
+    # A replica took the lock and died without publishing or releasing it
+    assert await dead.acquire_lock("lock:listings:USD", 0.4)
+
+    replica = Replica(lock_ttl=5.0, load_time=0.0)
+    started = time.monotonic()
+    data = await replica.loader("USD")
+
+    assert replica.loads == 1
+    assert replica.loader.waits == 1
+    assert time.monotonic() - started >= 0.35
+    assert len(data) == 50
+    # The value it loaded is published for the others
+    assert await Replica().loader("USD") is not None
+
+
+async def test_unreachable_backend_loads_locally(redis_server):
+    redis_server.connected = False
+    replica = Replica(load_time=0.0)
+
+    data = await replica.loader("USD")
+
+    assert replica.loads == 1
+    assert len(data) == 50
+    assert replica.loader.errors > 0
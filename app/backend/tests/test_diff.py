@@ -0,0 +1,68 @@
+"""Diffs of consecutive listings snapshots: events, changed fields, and the event ring."""
+from typing import Sequence, Tuple
+
+from app.backend.src.diff import ADDED, ENTERED_TOP, LEFT_TOP, PRICE, RANK, REMOVED, ChangeEvent, DiffEngine, SnapshotDiff
+from app.backend.src.market import MarketSnapshot
+from app.backend.src.snapshot import SnapshotStore
+
+
+def listings(coins: Sequence[Tuple[int, int, float]]) -> MarketSnapshot:
+    """Listings of ``(id, rank, price)`` coins."""
+    return MarketSnapshot.from_listings([
+        {"id": coin_id, "name": f"Coin {coin_id}", "symbol": f"C{coin_id}", "cmc_rank": rank,
+         "quote": {"USD": {"price": price}}}
+        for coin_id, rank, price in coins
+    ], convert="USD")
+
+
+BEFORE = listings([(1, 1, 100.0), (2, 2, 50.0), (3, 3, 30.0), (4, 4, 25.0), (5, 5, 20.0)])
+# Coin 1 up 2%, coin 2 up 0.4%, coins 2 and 3 swap ranks, coin 5 replaced by coin 6
+AFTER = listings([(1, 1, 102.0), (3, 2, 30.0), (2, 3, 50.2), (4, 4, 25.0), (6, 5, 19.0)])
+
+
+def test_events_of_every_kind():
+    diff = SnapshotDiff("USD", BEFORE, AFTER, price_threshold=1.0, top_n=2)
+
+    assert list(diff.events()) == [
+        ChangeEvent(PRICE, 1, 100.0, 102.0),
+        ChangeEvent(RANK, 3, 3, 2),
+        ChangeEvent(RANK, 2, 2, 3),
+        ChangeEvent(ENTERED_TOP, 3, None, None),
+        ChangeEvent(LEFT_TOP, 2, None, None),
+        ChangeEvent(ADDED, 6, None, None),
+        ChangeEvent(REMOVED, 5, None, None),
+    ]
+    assert len(diff) == 7
+
+
+def test_field_changes_hold_only_the_changed_fields():
+    diff = SnapshotDiff("USD", BEFORE, AFTER, price_threshold=1.0, top_n=2)
+
+    # Fields the snapshot lacks are left out
+    assert diff.field_changes(("price", "cmc_rank", "market_cap")) == {
+        1: {"price": 102.0},
+        3: {"cmc_rank": 2},
+        2: {"price": 50.2, "cmc_rank": 3},
+        # A new coin's fields all count as changed
+        6: {"price": 19.0, "cmc_rank": 5},
+    }
+    # Compared once per set of fields, however many subscribers ask
+    assert diff.changed_fields(["price"]) is diff.changed_fields(("price",))
+
+
+def test_events_since_reports_dropped_events():
+    store = SnapshotStore("listings", loader=None, max_staleness=900.0)
+    engine = DiffEngine(store, price_threshold=1.0, top_n=2, max_events=3)
+    store.put("USD", BEFORE)
+    store.put("USD", AFTER)  # Events 1-7, of which the ring keeps 5-7
+
+    assert engine.events_since("USD", 7) == ([], False)
+    events, truncated = engine.events_since("USD", 4)
+    assert [seq for seq, _ in events] == [5, 6, 7] and not truncated
+    events, truncated = engine.events_since("USD", 2)
+    assert [seq for seq, _ in events] == [5, 6, 7] and truncated
+    assert engine.events_since("EUR", 2) == ([], False)
+
+    # The same content again is no new snapshot, so no diff
+    store.put("USD", listings([(1, 1, 102.0), (3, 2, 30.0), (2, 3, 50.2), (4, 4, 25.0), (6, 5, 19.0)]))
+    assert (engine.diffs, engine.seq) == (1, 7)
@@ -0,0 +1,166 @@
+"""The on-disk history format: block encoding, torn writes, and reads."""
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.backend.src import history
+from app.backend.src.history import HistoryStore, _decode_block, _encode_blocks, _read_chunks, map_file, read_records
+
+HOUR_MS = 3_600_000
+FIELDS = 3
+
+
+@pytest.fixture
+def store(tmp_path) -> HistoryStore:
+    """A store whose chunks are sealed by the test rather than in the background."""
+    store = HistoryStore(str(tmp_path / "history"), chunk_interval=3600, retention_days=2)
+    store._seal_later = lambda: None
+    return store
+
+
+def hours_ago(hours: int) -> int:
+    """Start (ms) of the chunk ``hours`` before the current one."""
+    return (int(time.time() * 1000) // HOUR_MS - hours) * HOUR_MS
+
+
+def record(store: HistoryStore, timestamp: int, ids=(1, 5, 9)) -> np.ndarray:
+    """Add one record of ``ids`` at ``timestamp``; return its values."""
+    ids = np.array(ids, dtype=np.int64)
+    values = np.vstack([ids * 100.0 + timestamp % 1000, ids * 10.0, ids * 1e6]).astype(np.float64)
+    assert store.add("USD", timestamp, ids, values)
+    return values
+
+
+def head_path(store: HistoryStore, chunk_start: int) -> str:
+    return os.path.join(store.convert_dir("USD"), f"{chunk_start}.head")
+
+
+def test_blocks_round_trip_bit_for_bit():
+    # Sorted by (coin, time), as sealing sorts them
+    ids = np.array([1, 1, 1, 5, 5, 9], dtype=np.int64)
+    times = np.array([1000, 61000, 122500, 1000, 61000, 5000], dtype=np.int64)
+    values = np.array([
+        [65000.5, 65010.25, np.nan, 0.0012, 0.0011, -1.0],
+        [1e10, 1e10, 2e10, np.nan, np.nan, np.inf],
+        [1.2e12, 1.3e12, 1.3e12, 5e6, 5e6, 7.0],
+    ])
+
+    coins, counts, blocks = _encode_blocks(ids, times, values, level=6)
+
+    assert coins.tolist() == [1, 5, 9]
+    assert counts == [3, 2, 1]
+    start = 0
+    for count, blob in zip(counts, blocks):
+        block_times, block_values = _decode_block(blob, count, FIELDS)
+        assert block_times.tolist() == times[start:start + count].tolist()
+        assert block_values.view(np.uint64).tolist() == values[:, start:start + count].view(np.uint64).tolist()
+        start += count
+
+
+def test_torn_head_record_is_cut_before_appending(store):
+    chunk = hours_ago(0)
+    record(store, chunk + 1000)
+    record(store, chunk + 2000)
+    path = head_path(store, chunk)
+    complete = os.path.getsize(path)
+    with open(path, "ab") as file:
+        file.write(b"\x01" * 30)  # Part of a record, as a crash mid-write leaves it
+
+    # As after a restart: the first append to the head checks its end
+    restarted = HistoryStore(store.directory, chunk_interval=3600, retention_days=2)
+    restarted._seal_later = lambda: None
+    record(restarted, chunk + 3000)
+
+    records = list(read_records(map_file(path), FIELDS))
+    assert [timestamp for timestamp, _, _ in records] == [chunk + 1000, chunk + 2000, chunk + 3000]
+    assert os.path.getsize(path) == complete + (complete // 2)
+
+
+def test_sealing_drops_a_torn_chunk_from_the_segment(store):
+    first, second = hours_ago(2), hours_ago(1)
+    if history._day(first) != history._day(second):
+        first, second = hours_ago(3), hours_ago(2)
+    record(store, first + 1000)
+    store._seal(head_path(store, first))
+    segment = store._segment_path("USD", first)
+    size = os.path.getsize(segment)
+    with open(segment, "r+b") as file:
+        chunk = file.read(48)
+        file.seek(size)
+        file.write(chunk)  # A chunk header whose body never made it to disk
+
+    record(store, second + 1000)
+    store._seal(head_path(store, second))
+
+    chunks, end = _read_chunks(map_file(segment))
+    assert len(chunks) == 2
+    assert end == os.path.getsize(segment)
+    times, _ = store.read("USD", 5, first / 1000, time.time())
+    assert times.tolist() == [first + 1000, second + 1000]
+
+
+def test_sealed_samples_read_back_with_heads(store):
+    sealed, open_chunk = hours_ago(2), hours_ago(0)
+    expected = {}
+    for offset in (1000, 61000, 121000):
+        expected[sealed + offset] = record(store, sealed + offset)[:, 1]
+    store._seal(head_path(store, sealed))
+    expected[open_chunk + 1000] = record(store, open_chunk + 1000)[:, 1]
+
+    times, values = store.read("USD", 5, sealed / 1000, time.time())
+
+    assert times.tolist() == sorted(expected)
+    assert values.tolist() == np.column_stack([expected[t] for t in sorted(expected)]).tolist()
+    assert store.read("USD", 2, sealed / 1000, time.time())[0].tolist() == []
+
+
+def test_chunk_seen_as_head_and_segment_is_read_once(store):
+    chunk = hours_ago(1)
+    for offset in (1000, 2000, 3000):
+        record(store, chunk + offset)
+    path = head_path(store, chunk)
+    with open(path, "rb") as file:
+        head = file.read()
+    store._seal(path)
+    # A reader that listed the head just before it was sealed sees both
+    with open(path, "wb") as file:
+        file.write(head)
+
+    times, values = store.read("USD", 9, chunk / 1000, time.time())
+
+    assert times.tolist() == [chunk + 1000, chunk + 2000, chunk + 3000]
+    assert values.shape == (FIELDS, 3)
+
+
+def test_read_range_is_clamped_to_the_days_kept(store, monkeypatch):
+    chunk = hours_ago(1)
+    record(store, chunk + 1000)
+    store._seal(head_path(store, chunk))
+    segments = []
+    chunks = store._chunks
+    monkeypatch.setattr(store, "_chunks", lambda path: segments.append(path) or chunks(path))
+
+    times, _ = store.read("USD", 1, 0, 4e12)
+
+    assert times.tolist() == [chunk + 1000]
+    # retention_days back from today, not from 1970, and not past today
+    assert len(segments) <= store.retention_days + 1
+
+
+def test_too_many_samples_are_refused_before_decoding(store, monkeypatch):
+    chunk = hours_ago(2)
+    for offset in range(0, 600_000, 60_000):
+        record(store, chunk + offset)
+    store._seal(head_path(store, chunk))
+
+    def undecodable(*args):
+        raise AssertionError("decoded a block")
+
+    monkeypatch.setattr(history, "_decode_block", undecodable)
+    with pytest.raises(ValueError):
+        store.read("USD", 1, chunk / 1000, time.time(), max_points=5)
+    monkeypatch.undo()
+
+    assert len(store.read("USD", 1, chunk / 1000, time.time(), max_points=10)[0]) == 10
@@ -0,0 +1,251 @@
+"""CMCHTTPClient retries and circuit breaking against a fake CoinMarketCap API."""
+import asyncio
+import time
+from email.utils import formatdate
+
+import pytest
+
+from app.backend.src.http_client import CMCHTTPClient, HTTPClientError, PoolConfig
+from app.backend.src.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, RetryPolicy
+
+from .fake_cmc import FakeCMC, reply
+
+pytestmark = pytest.mark.anyio
+
+
+def make_client(upstream: FakeCMC, retry_policy=None, breaker=None) -> CMCHTTPClient:
+    return CMCHTTPClient(
+        upstream.url, "test-key", retry_policy=retry_policy, breaker=breaker,
+        pool=PoolConfig(total_timeout=5.0, read_timeout=5.0)
+    )
+
+
+def slow(seconds: float):
+    async def handler(request):
+        await asyncio.sleep(seconds)
+        return await reply()(request)
+    return handler
+
+
+async def test_listings_are_fetched_with_api_key():
+    async with FakeCMC() as upstream:
+        client = make_client(upstream)
+        try:
+            listings = await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert [coin["id"] for coin in listings] == [1, 2, 3]
+    request = upstream.requests[0]
+    assert request.path == "/v1/cryptocurrency/listings/latest"
+    assert request.headers["X-CMC_PRO_API_KEY"] == "test-key"
+    assert request.query["limit"] == "3"
+
+
+async def test_retryable_errors_are_retried_until_success():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+    async with FakeCMC(reply(503), reply(502), reply()) as upstream:
+        client = make_client(upstream, retry_policy=policy)
+        try:
+            listings = await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert len(listings) == 3
+    assert len(upstream.requests) == 3
+    assert policy.retries == 2
+
+
+async def test_retries_stop_after_max_attempts():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+    async with FakeCMC(reply(500)) as upstream:
+        client = make_client(upstream, retry_policy=policy)
+        try:
+            with pytest.raises(HTTPClientError) as raised:
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert raised.value.status == 500
+    assert raised.value.retryable
+    assert len(upstream.requests) == 3
+
+
+async def test_client_errors_are_not_retried():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05)
+    async with FakeCMC(reply(401, {"status": {"error_code": 1002}})) as upstream:
+        client = make_client(upstream, retry_policy=policy)
+        try:
+            with pytest.raises(HTTPClientError) as raised:
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert raised.value.status == 401
+    assert not raised.value.retryable
+    assert len(upstream.requests) == 1
+
+
+async def test_network_errors_are_retried():
+    policy = RetryPolicy(max_attempts=2, base_delay=0.01, max_delay=0.05)
+    async with FakeCMC() as upstream:
+        url = upstream.url
+    # The server is gone: connections are refused
+    client = CMCHTTPClient(url, "test-key", retry_policy=policy)
+    try:
+        with pytest.raises(HTTPClientError) as raised:
+            await client.get_listings(limit=3)
+    finally:
+        await client.close()
+    assert raised.value.retryable
+    assert policy.retries == 1
+
+
+def test_backoff_is_exponential_with_full_jitter_and_capped():
+    policy = RetryPolicy(max_attempts=10, base_delay=0.5, max_delay=3.0)
+    error = HTTPClientError("HTTP error: 503", status=503, retryable=True)
+    for attempt, ceiling in [(1, 0.5), (2, 1.0), (3, 2.0), (4, 3.0), (8, 3.0)]:
+        delays = [policy.delay(attempt, error) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2  # Jittered over the whole range
+    assert policy.delay(10, error) is None
+
+
+async def test_429_waits_for_retry_after():
+    policy = RetryPolicy(max_attempts=2, base_delay=0.0, max_delay=5.0)
+    async with FakeCMC(reply(429, headers={"Retry-After": "1"}), reply()) as upstream:
+        client = make_client(upstream, retry_policy=policy)
+        try:
+            started = time.monotonic()
+            listings = await client.get_listings(limit=3)
+            elapsed = time.monotonic() - started
+        finally:
+            await client.close()
+    assert len(listings) == 3
+    assert len(upstream.requests) == 2
+    # base_delay=0 would retry at once: the wait comes from Retry-After
+    assert elapsed >= 0.9
+
+
+async def test_429_with_retry_after_beyond_max_delay_is_raised_at_once():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=5.0)
+    async with FakeCMC(reply(429, headers={"Retry-After": "60"})) as upstream:
+        client = make_client(upstream, retry_policy=policy)
+        try:
+            with pytest.raises(HTTPClientError) as raised:
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert raised.value.status == 429
+    assert raised.value.retry_after == 60
+    assert len(upstream.requests) == 1
+
+
+async def test_429_retry_after_as_http_date():
+    async with FakeCMC(reply(429, headers={"Retry-After": formatdate(time.time() + 30, usegmt=True)})) as upstream:
+        client = make_client(upstream)
+        try:
+            with pytest.raises(HTTPClientError) as raised:
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert 25 <= raised.value.retry_after <= 31
+
+
+async def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("CMC", failure_threshold=2, reset_timeout=60.0)
+    async with FakeCMC(reply(500)) as upstream:
+        client = make_client(upstream, breaker=breaker)
+        try:
+            for _ in range(2):
+                with pytest.raises(HTTPClientError):
+                    await client.get_listings(limit=3)
+            assert breaker.state == OPEN
+            with pytest.raises(CircuitOpenError):
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    # The open breaker failed fast without calling the upstream
+    assert len(upstream.requests) == 2
+
+
+async def test_breaker_ignores_non_retryable_errors():
+    breaker = CircuitBreaker("CMC", failure_threshold=2, reset_timeout=60.0)
+    async with FakeCMC(reply(400, {"status": {"error_code": 400}})) as upstream:
+        client = make_client(upstream, breaker=breaker)
+        try:
+            for _ in range(3):
+                with pytest.raises(HTTPClientError):
+                    await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+async def test_half_open_trial_success_closes_breaker():
+    breaker = CircuitBreaker("CMC", failure_threshold=1, reset_timeout=0.2)
+    async with FakeCMC(reply(503), reply()) as upstream:
+        client = make_client(upstream, breaker=breaker)
+        try:
+            with pytest.raises(HTTPClientError):
+                await client.get_listings(limit=3)
+            assert breaker.state == OPEN
+            await asyncio.sleep(0.25)
+            assert breaker.state == HALF_OPEN
+            listings = await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert len(listings) == 3
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+async def test_half_open_trial_failure_reopens_breaker():
+    breaker = CircuitBreaker("CMC", failure_threshold=1, reset_timeout=0.2)
+    async with FakeCMC(reply(503)) as upstream:
+        client = make_client(upstream, breaker=breaker)
+        try:
+            with pytest.raises(HTTPClientError):
+                await client.get_listings(limit=3)
+            await asyncio.sleep(0.25)
+            assert breaker.state == HALF_OPEN
+            with pytest.raises(HTTPClientError) as raised:
+                await client.get_listings(limit=3)
+            assert not isinstance(raised.value, CircuitOpenError)
+            assert breaker.state == OPEN
+            with pytest.raises(CircuitOpenError):
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    assert len(upstream.requests) == 2
+
+
+async def test_half_open_lets_a_single_trial_through():
+    breaker = CircuitBreaker("CMC", failure_threshold=1, reset_timeout=0.2)
+    async with FakeCMC(reply(503), slow(0.2)) as upstream:
+        client = make_client(upstream, breaker=breaker)
+        try:
+            with pytest.raises(HTTPClientError):
+                await client.get_listings(limit=3)
+            await asyncio.sleep(0.25)
+            results = await asyncio.gather(
+                client.get_listings(limit=3), client.get_listings(limit=3), return_exceptions=True
+            )
+        finally:
+            await client.close()
+    assert sum(isinstance(result, CircuitOpenError) for result in results) == 1
+    assert sum(isinstance(result, list) for result in results) == 1
+    assert len(upstream.requests) == 2
+    assert breaker.state == CLOSED
+
+
+async def test_retries_stop_when_breaker_opens():
+    breaker = CircuitBreaker("CMC", failure_threshold=2, reset_timeout=60.0)
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, max_delay=0.05)
+    async with FakeCMC(reply(503)) as upstream:
+        client = make_client(upstream, retry_policy=policy, breaker=breaker)
+        try:
+            with pytest.raises(HTTPClientError):
+                await client.get_listings(limit=3)
+        finally:
+            await client.close()
+    # Two failures open the breaker; the remaining attempts fail fast
+    assert len(upstream.requests) == 2
+    assert breaker.state == OPEN
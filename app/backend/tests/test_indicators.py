@@ -0,0 +1,96 @@
+"""Cached, incrementally extended indicators against a fold of the whole series."""
+import numpy as np
+import pytest
+
+from app.backend.src import indicators
+from app.backend.src.indicators import INDICATORS, IndicatorEngine, make_indicator
+from app.backend.src.rollup import BAR_FIELDS
+
+INTERVAL = 3600
+BASE = 1_700_000_000 // INTERVAL * INTERVAL  # Seconds, at a bar start
+WINDOW = 5
+
+
+class Clock:
+    def __init__(self):
+        self.now = float(BASE)
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeRollups:
+    """Hourly bars up to the clock; the still open bar has a provisional close."""
+
+    def __init__(self, clock: Clock, count: int = 400):
+        self.clock = clock
+        self.times = (BASE + np.arange(count, dtype=np.int64) * INTERVAL) * 1000
+        rng = np.random.default_rng(3)
+        self.closes = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.01, count)))
+
+    def closes_at(self, now: float) -> np.ndarray:
+        """Every bar's close as a reader at ``now`` sees it."""
+        closes = self.closes.copy()
+        closes[self.times + INTERVAL * 1000 > now * 1000] *= 1.05
+        return closes
+
+    def bars(self, convert, coin_id, start, end, interval):
+        start -= start % interval
+        keep = (self.times >= start * 1000) & (self.times <= end * 1000) & (self.times <= self.clock.now * 1000)
+        bars = np.full((len(BAR_FIELDS), int(keep.sum())), np.nan)
+        bars[BAR_FIELDS.index("close")] = self.closes_at(self.clock.now)[keep]
+        return "1h", self.times[keep], bars
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(indicators, "time", clock)
+    return clock
+
+
+def from_scratch(rollups: FakeRollups, first_bar: int, start: float, end: float):
+    """Each indicator folded over every bar from ``first_bar`` up to the clock, at once."""
+    now = rollups.clock.now
+    seen = (rollups.times >= rollups.times[first_bar]) & (rollups.times <= now * 1000)
+    times, closes = rollups.times[seen], rollups.closes_at(now)[seen]
+    keep = (times >= start * 1000) & (times <= end * 1000)
+    return times[keep], {
+        kind: make_indicator(kind, WINDOW, INTERVAL).fold(closes)[keep] for kind in INDICATORS
+    }
+
+
+def bar(index: float) -> float:
+    return BASE + index * INTERVAL
+
+
+def test_incremental_compute_equals_a_fold_from_scratch(clock):
+    rollups = FakeRollups(clock)
+    engine = IndicatorEngine(rollups, max_series=4, max_points=60)
+    warmup = WINDOW * max(make_indicator(kind, WINDOW, INTERVAL).warmup for kind in INDICATORS) + 1
+    first_bar = 200 - warmup
+
+    # Bar 250 is open; then bars close, the series grows past max_points and is trimmed
+    for now, start in ((250.5, 200), (320.5, 290), (321.2, 300), (330.5, 300)):
+        clock.now = bar(now)
+        times, closes, results = engine.compute("USD", 1, INDICATORS, WINDOW, INTERVAL, bar(start), clock.now)
+
+        expected_times, expected = from_scratch(rollups, first_bar, bar(start), clock.now)
+        assert times.tolist() == expected_times.tolist()
+        assert closes[-1] == rollups.closes[int(now)] * 1.05  # The open bar, provisional
+        for kind in INDICATORS:
+            np.testing.assert_allclose(results[kind], expected[kind], rtol=1e-9, equal_nan=True, err_msg=kind)
+            assert not np.isnan(results[kind][-1])
+
+    assert (engine.misses, engine.hits) == (1, 3)
+    (series,) = engine._series.values()
+    assert len(series.times) <= engine.max_points + warmup
+
+
+def test_earlier_start_than_cached_reloads_the_series(clock):
+    engine = IndicatorEngine(FakeRollups(clock), max_points=60)
+    clock.now = bar(300.5)
+    engine.compute("USD", 1, ["sma"], WINDOW, INTERVAL, bar(280), clock.now)
+    engine.compute("USD", 1, ["sma"], WINDOW, INTERVAL, bar(100), bar(150))
+
+    assert (engine.misses, engine.hits) == (2, 0)
@@ -0,0 +1,122 @@
+"""Watchlists and portfolios: valuation against a snapshot, list limits, and the endpoints."""
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.src import cmc_client
+from app.backend.src.market import MarketSnapshot
+from app.backend.src.portfolio import PortfolioStore, value_portfolio, watched_coins
+from app.backend.src.portfolio_router import router
+from app.backend.src.snapshot import SnapshotStore
+
+from .fake_cmc import listings_body
+
+
+def listings(**changes) -> MarketSnapshot:
+    """Listings of coins 1-5 (price 100/id), with 24h changes given as ``c<id>=percent``."""
+    body = listings_body(count=5)
+    for coin in body["data"]:
+        if f"c{coin['id']}" in changes:
+            coin["quote"]["USD"]["percent_change_24h"] = changes[f"c{coin['id']}"]
+    return MarketSnapshot.from_listings(body["data"], convert="USD")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PortfolioStore(str(tmp_path / "portfolios.db"), max_coins=3)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    listings_store = SnapshotStore("listings", loader=None, max_staleness=900.0)
+    listings_store.put("USD", listings(c1=25.0))
+    monkeypatch.setattr(cmc_client, "listings_store", listings_store)
+    monkeypatch.setattr(cmc_client, "portfolio_store", store)
+    app = FastAPI()
+    app.include_router(router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_holdings_are_valued_at_the_snapshot_prices():
+    ids = np.array([1, 99, 2], dtype=np.int64)
+    quantities = np.array([0.5, 7.0, 3.0])
+
+    valued = value_portfolio(listings(c1=25.0), ids, quantities)
+
+    # Coin 1: 0.5 x 100, up 25% from 40; coin 2: 3 x 50, no 24h change so counted flat
+    assert valued["total_value"] == 200.0
+    assert valued["change_24h"] == pytest.approx(10.0)
+    assert valued["percent_change_24h"] == pytest.approx(200.0 / 190.0 * 100.0 - 100.0)
+    assert [(coin["id"], coin["quantity"], coin["value"]) for coin in valued["data"]] == [(2, 3.0, 150.0), (1, 0.5, 50.0)]
+    assert [coin["weight"] for coin in valued["data"]] == [75.0, 25.0]
+    assert valued["missing"] == [99]
+
+
+def test_empty_portfolio_has_no_change():
+    valued = value_portfolio(listings(), np.array([], dtype=np.int64), np.array([]))
+
+    assert (valued["total_value"], valued["percent_change_24h"], valued["data"]) == (0.0, None, [])
+
+
+def test_watched_coins_keep_the_watchlist_order():
+    watched = watched_coins(listings(), np.array([3, 42, 1], dtype=np.int64))
+
+    assert [(coin["id"], coin["price"]) for coin in watched["data"]] == [(3, 100.0 / 3), (1, 100.0)]
+    assert watched["missing"] == [42]
+
+
+def test_lists_hold_at_most_max_coins(store):
+    for coin_id in (1, 2, 3):
+        assert store.watch(7, coin_id)
+        assert store.hold(7, coin_id, 1.0)
+
+    with pytest.raises(ValueError):
+        store.watch(7, 4)
+    with pytest.raises(ValueError):
+        store.hold(7, 4, 1.0)
+    # Coins already listed can still be watched and re-weighed; other users are not limited
+    assert not store.watch(7, 2)
+    assert not store.hold(7, 2, 5.0)
+    assert store.watch(8, 4)
+
+    assert store.sell(7, 1)
+    assert store.hold(7, 4, 2.0)
+    ids, quantities = store.holdings(7)
+    assert dict(zip(ids.tolist(), quantities.tolist())) == {2: 5.0, 3: 1.0, 4: 2.0}
+    assert store.watchlist(7).tolist() == [1, 2, 3]
+
+
+def test_watching_and_unwatching_are_idempotent(client):
+    assert client.put("/users/7/watchlist/2").json() == {"id": 2, "added": True}
+    assert client.put("/users/7/watchlist/2").json() == {"id": 2, "added": False}
+    assert client.put("/users/7/watchlist/5").json()["added"]
+
+    watchlist = client.get("/users/7/watchlist").json()
+    assert [coin["id"] for coin in watchlist["data"]] == [2, 5]
+    assert (watchlist["count"], watchlist["missing"], watchlist["convert"]) == (2, [], "USD")
+
+    assert client.delete("/users/7/watchlist/2").json() == {"id": 2, "removed": True}
+    assert client.delete("/users/7/watchlist/2").status_code == 404
+    assert [coin["id"] for coin in client.get("/users/7/watchlist").json()["data"]] == [5]
+
+
+def test_portfolio_endpoints(client):
+    assert client.put("/users/7/portfolio/1", json={"quantity": 0.5}).json() == {
+        "id": 1, "quantity": 0.5, "added": True
+    }
+    assert client.put("/users/7/portfolio/2", json={"quantity": 1.0}).json()["added"] is True
+    assert client.put("/users/7/portfolio/2", json={"quantity": 3.0}).json()["added"] is False
+    # Unlisted coins are refused rather than held unvalued
+    assert client.put("/users/7/portfolio/99", json={"quantity": 1.0}).status_code == 400
+
+    portfolio = client.get("/users/7/portfolio").json()
+    assert (portfolio["total_value"], portfolio["count"]) == (200.0, 2)
+    assert [coin["id"] for coin in portfolio["data"]] == [2, 1]
+
+    assert client.delete("/users/7/portfolio/1").json() == {"id": 1, "removed": True}
+    assert client.delete("/users/7/portfolio/1").status_code == 404
+    assert client.get("/users/7/portfolio").json()["total_value"] == 150.0
@@ -0,0 +1,120 @@
+"""OHLC rollups: bar rollover, handover between workers, and bars served from them."""
+import glob
+import os
+import time
+
+import numpy as np
+import pytest
+
+from app.backend.src.history import HistoryStore, map_file, read_records
+from app.backend.src.rollup import BAR_FIELDS, OHLCRollup, RollupPipeline
+
+HOUR_MS = 3_600_000
+
+
+@pytest.fixture(autouse=True)
+def no_sealing(monkeypatch):
+    """Chunks stay heads, read in place, instead of being sealed in the background."""
+    monkeypatch.setattr(HistoryStore, "_seal_later", lambda self: None)
+
+
+def hours_ago(hours: int) -> int:
+    return (int(time.time() * 1000) // HOUR_MS - hours) * HOUR_MS
+
+
+def samples(*prices: float) -> np.ndarray:
+    """Raw history samples of coins priced ``prices``: price, 24h volume, market cap."""
+    price = np.array(prices, dtype=np.float64)
+    return np.vstack([price, price * 10, price * 1000])
+
+
+def stored_bars(rollup: OHLCRollup) -> list:
+    """Records of the finished bars, as (start, ids, values)."""
+    bars = []
+    for path in sorted(glob.glob(os.path.join(rollup.store.convert_dir("USD"), "*.head"))):
+        bars.extend(
+            (start, ids.tolist(), values.tolist())
+            for start, ids, values in read_records(map_file(path), len(BAR_FIELDS))
+        )
+    return bars
+
+
+def test_a_new_bar_appends_the_finished_one_once(tmp_path):
+    rollup = OHLCRollup("1m", 60, HistoryStore(str(tmp_path / "1m"), fields=BAR_FIELDS))
+    ids = np.array([1, 2], dtype=np.int64)
+    bar = hours_ago(1)
+
+    rollup.update("USD", bar + 1000, ids, samples(100.0, 10.0))
+    rollup.update("USD", bar + 20000, ids, samples(105.0, 9.0))
+    rollup.update("USD", bar + 40000, ids, samples(98.0, 11.0))
+    assert stored_bars(rollup) == []
+
+    rollup.update("USD", bar + 61000, ids, samples(99.0, 12.0))
+    rollup.update("USD", bar + 62000, ids, samples(101.0, 12.5))
+
+    assert rollup.bars == 1
+    (start, bar_ids, values), = stored_bars(rollup)
+    assert start == bar and bar_ids == [1, 2]
+    assert [column[0] for column in values] == [100.0, 105.0, 98.0, 98.0, 980.0, 98000.0]
+    assert [column[1] for column in values] == [10.0, 11.0, 9.0, 11.0, 110.0, 11000.0]
+
+
+def test_another_worker_continues_the_open_bar(tmp_path):
+    directory = str(tmp_path / "1m")
+    bar = hours_ago(1)
+    ids = np.array([1], dtype=np.int64)
+    first = OHLCRollup("1m", 60, HistoryStore(directory, fields=BAR_FIELDS))
+    first.update("USD", bar + 1000, ids, samples(100.0))
+    first.update("USD", bar + 2000, ids, samples(120.0))
+
+    # Elected after the first worker stopped: carries on from partial.bar
+    second = OHLCRollup("1m", 60, HistoryStore(directory, fields=BAR_FIELDS))
+    second.update("USD", bar + 3000, ids, samples(90.0))
+    # Back to the first, which must pick up what the second wrote since
+    first.update("USD", bar + 4000, ids, samples(95.0))
+    first.update("USD", bar + 61000, ids, samples(96.0))
+
+    (start, _, values), = stored_bars(first)
+    assert start == bar
+    assert [column[0] for column in values][:4] == [100.0, 120.0, 90.0, 95.0]
+
+
+def test_bars_match_an_aggregation_of_the_samples(tmp_path):
+    raw = HistoryStore(str(tmp_path / "history"))
+    pipeline = RollupPipeline(raw, str(tmp_path / "history" / "rollups"), {"1m": 90, "1h": 90, "1d": 90})
+    rng = np.random.default_rng(7)
+    start = hours_ago(5)
+    timestamps = np.arange(start + 500, int(time.time() * 1000), 45_000)
+    for i, timestamp in enumerate(timestamps.tolist()):
+        # Coin 9 drops out of the listings now and then
+        ids = np.array([1, 5] if i % 7 == 3 else [1, 5, 9], dtype=np.int64)
+        values = samples(*rng.uniform(50.0, 150.0, len(ids)))
+        raw.add("USD", timestamp, ids, values)
+        pipeline.update("USD", timestamp, ids, values)
+
+    for coin_id in (1, 9):
+        times, values = raw.read("USD", coin_id, start / 1000, time.time())
+        for interval, source in ((60, "1m"), (300, "1m"), (3600, "1h"), (7200, "1h")):
+            resolution, bar_times, bars = pipeline.bars("USD", coin_id, start / 1000, time.time(), interval)
+            assert resolution == source
+
+            buckets = times // (interval * 1000)
+            expected_times, expected = [], []
+            for bucket in np.unique(buckets):
+                price, volume, market_cap = values[:, buckets == bucket]
+                expected_times.append(int(bucket) * interval * 1000)
+                expected.append([price[0], price.max(), price.min(), price[-1], volume[-1], market_cap[-1]])
+            assert bar_times.tolist() == expected_times
+            assert bars.T.tolist() == expected
+
+
+def test_sources_and_automatic_intervals(tmp_path):
+    pipeline = RollupPipeline(HistoryStore(str(tmp_path)), str(tmp_path / "rollups"), {"1m": 1, "1h": 1, "1d": 1})
+
+    assert pipeline.source(90) is None
+    assert pipeline.source(300).name == "1m"
+    assert pipeline.source(3 * 3600).name == "1h"
+    assert pipeline.source(7 * 86400).name == "1d"
+    assert pipeline.auto_interval(0, 86400, 5000) == 60
+    assert pipeline.auto_interval(0, 30 * 86400, 5000) == 3600
+    assert pipeline.auto_interval(0, 5 * 365 * 86400, 5000) == 86400
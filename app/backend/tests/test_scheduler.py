@@ -0,0 +1,136 @@
+"""Budget-paced refreshes keep snapshots servable, and only those."""
+import pytest
+
+from app.backend.src import rate_limit, scheduler, snapshot
+from app.backend.src.http_client import HTTPClientError
+from app.backend.src.rate_limit import CreditBudget
+from app.backend.src.resilience import CircuitBreaker
+from app.backend.src.scheduler import RefreshScheduler
+from app.backend.src.snapshot import SnapshotRefresher, SnapshotStore, SnapshotUnavailableError
+
+pytestmark = pytest.mark.anyio
+
+DAY = 86400.0
+LISTINGS_COST = 25  # Credits of one 5000-coin listings call
+
+
+class FakeClock:
+    """Stands in for the ``time`` module; starts at a UTC midnight."""
+
+    def __init__(self):
+        self.now = 19675 * DAY
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    for module in (scheduler, snapshot, rate_limit):
+        monkeypatch.setattr(module, "time", clock)
+    monkeypatch.setattr(CreditBudget, "_today", staticmethod(lambda: str(int(clock.now // DAY))))
+    monkeypatch.setattr(CreditBudget, "seconds_until_reset", staticmethod(lambda: DAY - clock.now % DAY))
+    return clock
+
+
+def paced_store(
+    budget: CreditBudget, refresh_scheduler: RefreshScheduler, loads: list, fail_after: int = -1
+) -> SnapshotStore:
+    """A listings-like store wired as in cmc_client, whose loader spends budget credits.
+
+    Loads after the first ``fail_after`` fail, as when CoinMarketCap errors
+    without the breaker opening.
+    """
+    breaker = CircuitBreaker("CMC")
+
+    async def load(convert):
+        await budget.acquire(LISTINGS_COST)
+        if 0 <= fail_after <= len(loads):
+            raise HTTPClientError("CMC API error: 500")
+        loads.append(convert)
+        return {"convert": convert, "load": len(loads)}
+
+    store = SnapshotStore(
+        name="listings",
+        loader=load,
+        max_staleness=900.0,
+        upstream_down=lambda key: breaker.is_open or budget.exhausted or refresh_scheduler.deferred("listings", key),
+        stale_if_error=DAY,
+        cost=lambda convert: LISTINGS_COST
+    )
+    store.track("USD", pinned=True)
+    return store
+
+
+async def test_paced_refreshes_never_refuse_reads(clock):
+    budget = CreditBudget(per_day=333)
+    refresh_scheduler = RefreshScheduler(budget=budget, idle_timeout=3600.0)
+    loads = []
+    store = paced_store(budget, refresh_scheduler, loads)
+    refresher = SnapshotRefresher([store], interval=300.0, scheduler=refresh_scheduler)
+
+    stale_reads = 0
+    for _ in range(int(2 * DAY / 300)):
+        await refresher.refresh(store)
+        served = await store.read("USD")  # Raises SnapshotUnavailableError on a refusal
+        stale_reads += served.stale
+        clock.advance(300.0)
+
+    # Refreshes fit the budget, so most of the time the data is past max_staleness
+    assert len(loads) <= 2 * 333 // LISTINGS_COST + 1
+    assert len(loads) >= 2 * 333 // LISTINGS_COST - 2
+    assert stale_reads > 0
+    assert budget.rejected == 0
+
+
+async def test_first_round_loads_without_banked_credits(clock):
+    budget = CreditBudget(per_day=333)
+    refresh_scheduler = RefreshScheduler(budget=budget, idle_timeout=3600.0)
+    loads = []
+    store = paced_store(budget, refresh_scheduler, loads)
+    refresher = SnapshotRefresher([store], interval=300.0, scheduler=refresh_scheduler)
+
+    await refresher.refresh(store)
+
+    assert loads == ["USD"]
+    assert store.get("USD") is not None
+    # The overdraft is paid back before the next refresh
+    assert refresh_scheduler.banked < 0
+
+
+async def test_old_snapshots_are_refused_without_pacing(clock):
+    budget = CreditBudget()
+    refresh_scheduler = RefreshScheduler(budget=budget, idle_timeout=3600.0)
+    store = paced_store(budget, refresh_scheduler, [])
+
+    await store.read("USD")
+    clock.advance(901.0)
+    with pytest.raises(SnapshotUnavailableError):
+        await store.read("USD")
+
+
+async def test_failed_refreshes_are_refused_despite_a_budget(clock):
+    budget = CreditBudget(per_day=100_000)
+    refresh_scheduler = RefreshScheduler(budget=budget, idle_timeout=3600.0)
+    loads = []
+    store = paced_store(budget, refresh_scheduler, loads, fail_after=1)
+    refresher = SnapshotRefresher([store], interval=300.0, scheduler=refresh_scheduler)
+    await refresher.refresh(store)
+
+    # Credits cover every round, so nothing is deferred: the refreshes just fail
+    for _ in range(3):
+        clock.advance(301.0)
+        with pytest.raises(HTTPClientError):
+            await refresher.refresh(store)
+        assert not refresh_scheduler.deferred("listings", "USD")
+
+    assert loads == ["USD"]
+    with pytest.raises(SnapshotUnavailableError):
+        await store.read("USD")
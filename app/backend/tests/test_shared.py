@@ -0,0 +1,159 @@
+"""Snapshots shared between workers through a directory: election, publishing and demand."""
+import asyncio
+import os
+from typing import Optional
+
+import pytest
+
+from app.backend.src.market import MarketSnapshot
+from app.backend.src.rate_limit import CreditBudget
+from app.backend.src.scheduler import RefreshScheduler
+from app.backend.src.shared import FOLLOWER, LEADER, SharedSnapshots
+from app.backend.src.snapshot import SnapshotRefresher, SnapshotStore
+
+from .fake_cmc import listings_body
+
+pytestmark = pytest.mark.anyio
+
+
+class Worker:
+    """The listings and quotes stores of one worker process, shared through ``directory``."""
+
+    def __init__(self, directory: str, scheduler: Optional[RefreshScheduler] = None):
+        self.loads = []
+        self.listings = SnapshotStore("listings", loader=self._load, max_staleness=900.0)
+        self.quotes = SnapshotStore("quotes", loader=self._load, max_staleness=900.0)
+        self.shared = SharedSnapshots(
+            directory, SnapshotRefresher([], interval=3600.0, scheduler=scheduler), poll_interval=0.05, wait=0.5
+        )
+        self.shared.add_store(self.listings, columnar=True)
+        self.shared.add_store(self.quotes)
+
+    async def _load(self, key):
+        self.loads.append(key)
+        return {"id": key[0], "price": 1.0}
+
+
+@pytest.fixture
+async def workers(tmp_path):
+    started = []
+
+    async def start(count: int):
+        for _ in range(count):
+            worker = Worker(str(tmp_path / "shared"))
+            await worker.shared.start()
+            started.append(worker)
+        return started[-count:]
+
+    yield start
+    for worker in started:
+        await worker.shared.stop()
+
+
+async def published() -> None:
+    """Let the leader's batched publish run."""
+    await asyncio.sleep(0)
+
+
+async def test_one_worker_leads_and_another_takes_over(workers):
+    leader, follower = await workers(2)
+
+    assert (leader.shared.role, follower.shared.role) == (LEADER, FOLLOWER)
+
+    await leader.shared.stop()
+    await asyncio.sleep(0.2)
+    assert follower.shared.role == LEADER
+
+
+async def test_published_snapshots_are_installed_by_followers(workers):
+    leader, follower = await workers(2)
+    listings = MarketSnapshot.from_listings(listings_body(count=20)["data"], convert="USD")
+    leader.listings.put("USD", listings, fetched_at=1000.0, modified_at=900.0)
+    leader.quotes.put((1, "USD"), {"id": 1, "price": 65000.0}, fetched_at=1000.0)
+    leader.quotes.put((1027, "USD"), {"id": 1027, "price": 3000.0}, fetched_at=1000.0)
+    await published()
+
+    follower.shared.sync()
+
+    mapped = follower.listings.get("USD")
+    assert (mapped.fetched_at, mapped.modified_at) == (1000.0, 900.0)
+    assert mapped.data.digest() == listings.digest()
+    assert mapped.version == leader.listings.get("USD").version
+    assert follower.quotes.get((1, "USD")).data == {"id": 1, "price": 65000.0}
+    assert follower.quotes.get((1027, "USD")).data["price"] == 3000.0
+    assert follower.shared.installed == 3
+
+
+async def test_followers_install_only_the_keys_that_changed(workers):
+    leader, follower = await workers(2)
+    for coin_id in range(1, 51):
+        leader.quotes.put((coin_id, "USD"), {"id": coin_id, "price": 1.0})
+    await published()
+    follower.shared.sync()
+    installed = follower.shared.installed
+
+    leader.quotes.put((7, "USD"), {"id": 7, "price": 2.0})
+    await published()
+    follower.shared.sync()
+
+    assert follower.shared.installed == installed + 1
+    assert follower.quotes.get((7, "USD")).data["price"] == 2.0
+
+
+async def test_keys_never_leave_the_shared_directory(workers, tmp_path):
+    leader, follower = await workers(2)
+    # A convert currency as a request may spell it
+    leader.listings.put("../../escaped", MarketSnapshot.from_listings(listings_body(count=5)["data"], convert="USD"))
+    leader.quotes.put((1, "../escaped"), {"id": 1, "price": 1.0})
+    await published()
+
+    assert not os.path.exists(tmp_path / "escaped.snap")
+    assert all(".." not in name for name in os.listdir(tmp_path / "shared"))
+    follower.shared.sync()
+    assert len(follower.listings.get("../../escaped").data) == 5
+    assert follower.quotes.get((1, "../escaped")).data == {"id": 1, "price": 1.0}
+
+
+async def test_followers_report_what_they_read_to_the_leader(workers):
+    leader, follower = await workers(2)
+    leader.quotes.put((1, "USD"), {"id": 1, "price": 1.0})
+    await published()
+    follower.shared.sync()
+
+    await follower.quotes.read((1, "USD"))
+    await follower.quotes.read((1, "USD"))
+    # A key the leader does not track yet, loaded by the follower itself
+    await follower.quotes.read((825, "USD"))
+    follower.shared._report_demand()
+    leader.shared._collect_demand()
+
+    assert follower.loads == [(825, "USD")]
+    assert set(leader.quotes.keys()) == {(1, "USD"), (825, "USD")}
+    assert leader.quotes.take_reads((1, "USD")) == 2
+    assert leader.quotes.take_reads((825, "USD")) == 1
+
+
+async def test_followers_serve_stale_only_what_the_leader_deferred(tmp_path):
+    schedulers = [RefreshScheduler(CreditBudget(per_day=1000), idle_timeout=3600.0) for _ in range(2)]
+    leader, follower = (Worker(str(tmp_path / "shared"), scheduler) for scheduler in schedulers)
+    for worker in (leader, follower):
+        await worker.shared.start()
+    try:
+        leader.quotes.put((1, "USD"), {"id": 1, "price": 1.0})
+        leader.quotes.put((2, "USD"), {"id": 2, "price": 1.0})
+        await published()
+        # No credits banked yet: the round puts off both refreshes
+        assert schedulers[0].plan(leader.quotes, leader.quotes.keys()) == []
+        leader.shared._publish_deferred()
+        follower.shared.sync()
+        assert schedulers[1].deferred("quotes", (1, "USD"))
+
+        schedulers[0].defer("quotes", [(2, "USD")])
+        leader.shared._publish_deferred()
+        follower.shared.sync()
+
+        assert not schedulers[1].deferred("quotes", (1, "USD"))
+        assert schedulers[1].deferred("quotes", (2, "USD"))
+    finally:
+        for worker in (leader, follower):
+            await worker.shared.stop()
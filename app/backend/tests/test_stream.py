@@ -0,0 +1,83 @@
+"""Streaming listings changes: shared update messages and resyncing slow subscribers."""
+import json
+
+import pytest
+
+from app.backend.src.diff import DiffEngine
+from app.backend.src.market import MarketSnapshot
+from app.backend.src.snapshot import SnapshotStore
+from app.backend.src.stream import PriceBroadcaster
+
+from .fake_cmc import listings_body
+
+pytestmark = pytest.mark.anyio
+
+
+def listings(count: int = 5, **prices) -> MarketSnapshot:
+    """Listings of coins 1-``count`` (price 100/id), with the prices given as ``c<id>=price`` replaced."""
+    body = listings_body(count=count)
+    for coin in body["data"]:
+        coin["quote"]["USD"]["price"] = prices.get(f"c{coin['id']}", coin["quote"]["USD"]["price"])
+    return MarketSnapshot.from_listings(body["data"], convert="USD")
+
+
+@pytest.fixture
+def store() -> SnapshotStore:
+    return SnapshotStore("listings", loader=None, max_staleness=900.0)
+
+
+@pytest.fixture
+def broadcaster(store) -> PriceBroadcaster:
+    broadcaster = PriceBroadcaster(store, DiffEngine(store), max_pending=2)
+    store.put("USD", listings())
+    return broadcaster
+
+
+async def test_subscribers_of_the_same_coins_share_one_message(store, broadcaster):
+    first, second = broadcaster.subscribe("USD", [1, 2]), broadcaster.subscribe("USD", [2, 1])
+    other = broadcaster.subscribe("USD", [3])
+    for subscription in (first, second, other):
+        kind, _ = await broadcaster.next_message(subscription)
+        assert kind == "snapshot"
+
+    store.put("USD", listings(count=4, c1=120.0, c5=1.0))
+
+    (kind, message), (_, shared) = [await broadcaster.next_message(s) for s in (first, second)]
+    assert kind == "update" and message is shared
+    update = json.loads(message)
+    assert update["data"] == {"1": {"price": 120.0}}
+    assert update["removed"] == []
+    assert not other._pending and not other.needs_snapshot
+    assert broadcaster.stats()["messages"] == 2
+
+
+async def test_followed_coins_dropping_out_are_reported_removed(store, broadcaster):
+    subscription = broadcaster.subscribe("USD", [4, 5])
+    await broadcaster.next_message(subscription)
+
+    store.put("USD", listings(count=4))
+
+    _, message = await broadcaster.next_message(subscription)
+    assert json.loads(message)["removed"] == [5]
+
+
+async def test_slow_subscriber_is_resynced_with_a_snapshot(store, broadcaster):
+    subscription = broadcaster.subscribe("USD", [1, 2])
+    await broadcaster.next_message(subscription)
+
+    # More updates than max_pending arrive while the client reads nothing
+    for price in (101.0, 102.0, 103.0):
+        store.put("USD", listings(c1=price))
+    assert subscription.resyncs == 1 and not subscription._pending
+
+    kind, message = await broadcaster.next_message(subscription)
+    assert kind == "snapshot"
+    snapshot = json.loads(message)
+    assert snapshot["data"]["1"]["price"] == 103.0
+    assert snapshot["data"]["2"]["price"] == 50.0
+
+    # Caught up: later changes arrive as updates again
+    store.put("USD", listings(c1=104.0))
+    kind, message = await broadcaster.next_message(subscription)
+    assert kind == "update" and json.loads(message)["data"] == {"1": {"price": 104.0}}
+    assert broadcaster.stats()["resyncs"] == 1
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from aiohttp import ClientSession, ClientError, ClientTimeout, TCPConnector
+from config import config
+from resilience import CLOSED, RETRYABLE_STATUSES, BackendError, CircuitBreaker, RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Small cache of backend responses, least recently used evicted first.
+
+    Entries outlive their TTL: :meth:`get` only returns fresh ones, while
+    :meth:`get_stale` returns the last good response however old, to answer
+    with while the backend is down.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[float, float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return the last cached value and its age in seconds, expired or not."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, _, value = entry
+        return value, time.monotonic() - stored_at
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Cache ``value``; it is fresh for ``ttl`` seconds (0: only kept as a fallback)."""
+        now = time.monotonic()
+        self._entries[key] = (now, now + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class APIClient:
+    """HTTP client for backend API communication.
+
+    One session, and so one pool of keep-alive connections, serves every
+    command for the bot's whole lifetime: :meth:`start` and :meth:`close`
+    are called from the bot's startup and shutdown hooks. Responses can be
+    cached for a few seconds, and identical requests in flight at the same
+    time share one backend call.
+
+    Failed requests are retried with jittered backoff, but never past
+    ``deadline`` seconds per request. A circuit breaker shared by all
+    handlers stops calling a backend that keeps failing; meanwhile requests
+    are answered at once with the last good response, marked
+    ``"stale": True``, or None if there is none.
+    """
+
+    def __init__(self, base_url: str, timeout: int, deadline: float,
+                 retry_policy: RetryPolicy, breaker: CircuitBreaker):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.deadline = deadline
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+        self.cache = ResponseCache()
+        self._session: Optional[ClientSession] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is currently considered up."""
+        return self.breaker.state == CLOSED
+
+    async def start(self) -> None:
+        """Open the shared session."""
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                timeout=ClientTimeout(total=self.timeout),
+                connector=TCPConnector(limit=config.POOL_SIZE, keepalive_timeout=60)
+            )
+            logger.info(f"Backend API session opened (pool={config.POOL_SIZE})")
+
+    async def close(self) -> None:
+        """Close the shared session and its connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self.cache.clear()
+
+    async def make_request(self, endpoint: str, timeout: int = None, cache_ttl: float = 0) -> Optional[dict]:
+        """Make HTTP request to backend API with error handling.
+
+        Args:
+            endpoint: Path and query below the backend URL
+            timeout: Per-attempt timeout in seconds (defaults to the configured one)
+            cache_ttl: Seconds a successful response may be reused (0 disables caching)
+
+        Returns:
+            Decoded JSON body; the last good body with ``"stale": True`` if the
+            backend is unavailable; None if the request failed otherwise
+        """
+        if cache_ttl > 0:
+            cached = self.cache.get(endpoint)
+            if cached is not None:
+                logger.debug(f"Cache hit for {endpoint}")
+                return cached
+
+        inflight = self._inflight.get(endpoint)
+        if inflight is not None:
+            # Same request already running (e.g. a burst in a group chat): share its result
+            return await asyncio.shield(inflight)
+
+        if not self.breaker.allow():
+            logger.debug(f"Backend circuit open, not requesting {endpoint}")
+            return self._fallback(endpoint)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[endpoint] = future
+        try:
+            try:
+                data = await self._request(endpoint, timeout)
+            except BackendError as e:
+                logger.error(f"Request to {endpoint} failed: {e}")
+                data = self._fallback(endpoint) if e.retryable else None
+            else:
+                if data is not None:
+                    # Kept past its TTL as the fallback answer while the backend is down
+                    self.cache.set(endpoint, data, cache_ttl)
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            self.breaker.release()
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[endpoint]
+
+    async def send(self, method: str, endpoint: str, payload: Optional[dict] = None) -> Optional[dict]:
+        """Send a request that changes backend state (POST, PUT, DELETE).
+
+        Unlike :meth:`make_request` it is neither cached nor shared, and it
+        is attempted once: repeating it after a timeout could apply it twice.
+
+        Args:
+            method: HTTP method
+            endpoint: Path and query below the backend URL
+            payload: JSON body, if any
+
+        Returns:
+            Decoded JSON body, or None if the resource does not exist
+
+        Raises:
+            BackendError: If the backend is unavailable or refused the
+                request; ``str(error)`` is its explanation for a 400
+        """
+        if not self.breaker.allow():
+            raise BackendError("Backend circuit open", retryable=True)
+        if self._session is None or self._session.closed:
+            await self.start()
+        url = f"{self.base_url}{endpoint}"
+        try:
+            async with self._session.request(method, url, json=payload) as response:
+                if response.status == 200:
+                    self.breaker.record_success()
+                    return await response.json()
+                if response.status == 404:
+                    self.breaker.record_success()
+                    return None
+                retryable = response.status in RETRYABLE_STATUSES
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                detail = f"HTTP {response.status}"
+                if response.status == 400:
+                    detail = (await response.json()).get("detail", detail)
+                raise BackendError(detail, status=response.status, retryable=retryable)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except (ClientError, asyncio.TimeoutError) as e:
+            self.breaker.record_failure()
+            raise BackendError(f"{type(e).__name__}: {e}", retryable=True) from e
+
+    def _fallback(self, endpoint: str) -> Optional[dict]:
+        cached = self.cache.get_stale(endpoint)
+        if cached is None:
+            return None
+        data, age = cached
+        logger.warning(f"Backend unavailable, answering {endpoint} from a {age:.0f}s old response")
+        return {**data, "stale": True}
+
+    async def _request(self, endpoint: str, timeout: Optional[int]) -> Optional[dict]:
+        """Request ``endpoint``, retrying retryable failures until the deadline.
+
+        Returns:
+            Decoded JSON body, or None if the resource does not exist
+
+        Raises:
+            BackendError: The last failure once retries are exhausted
+        """
+        if self._session is None or self._session.closed:
+            await self.start()
+        url = f"{self.base_url}{endpoint}"
+        deadline = time.monotonic() + self.deadline
+
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - time.monotonic()
+            try:
+                logger.debug(f"Making request to: {url} (attempt {attempt})")
+                data = await self._attempt(url, min(timeout or self.timeout, remaining))
+            except BackendError as e:
+                if e.retryable:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()  # The backend answered, just not with data
+                delay = self.retry_policy.delay(attempt, e, deadline - time.monotonic())
+                if delay is None or not self.available:
+                    raise
+                logger.warning(f"Attempt {attempt} for {endpoint} failed, retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return data
+
+    async def _attempt(self, url: str, timeout: float) -> Optional[dict]:
+        try:
+            async with self._session.get(url, timeout=ClientTimeout(total=timeout)) as response:
+                if response.status == 200:
+                    return await response.json()
+                if response.status == 404:
+                    logger.warning(f"Resource not found: {url}")
+                    return None
+                retry_after = response.headers.get("Retry-After")
+                raise BackendError(
+                    f"HTTP {response.status}",
+                    status=response.status,
+                    retryable=response.status in RETRYABLE_STATUSES,
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+        except (ClientError, asyncio.TimeoutError) as e:
+            raise BackendError(f"{type(e).__name__}: {e}", retryable=True) from e
+
+
+api_client = APIClient(
+    base_url=config.BACKEND_URL,
+    timeout=config.REQUEST_TIMEOUT,
+    deadline=config.REQUEST_DEADLINE,
+    retry_policy=RetryPolicy(
+        max_attempts=config.MAX_RETRIES,
+        base_delay=config.RETRY_BASE_DELAY,
+        max_delay=config.RETRY_MAX_DELAY
+    ),
+    breaker=CircuitBreaker(
+        failure_threshold=config.BACKEND_CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=config.BACKEND_CIRCUIT_RESET_TIMEOUT
+    )
+)
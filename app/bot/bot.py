@@ -5,7 +5,9 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
+from api_client import api_client
 from config import config
+from notifier import AlertNotifier
 from router import router
 
 # Configure logging
@@ -28,6 +30,14 @@ dp = Dispatcher()
 # Include router
 dp.include_router(router)
 
+# Delivers fired price alerts
+notifier = AlertNotifier(
+    bot,
+    api_client,
+    poll_interval=config.ALERT_POLL_INTERVAL,
+    rate=config.ALERT_SEND_RATE
+)
+
 
 async def on_startup():
     """Actions to perform on bot startup."""
@@ -35,11 +45,15 @@ async def on_startup():
     logger.info(f"Backend URL: {config.BACKEND_URL}")
     logger.info(f"Request timeout: {config.REQUEST_TIMEOUT}s")
     logger.info(f"Max retries: {config.MAX_RETRIES}")
+    await api_client.start()
+    notifier.start()
 
 
 async def on_shutdown():
     """Actions to perform on bot shutdown."""
     logger.info("🛑 Crypto Tracker Bot is shutting down...")
+    await notifier.stop()
+    await api_client.close()
     await bot.session.close()
 
 
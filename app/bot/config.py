@@ -19,6 +19,42 @@ class BotConfig(BaseModel):
         default=3,
         description="Maximum number of retry attempts"
     )
+    REQUEST_DEADLINE: float = Field(
+        default=20,
+        description="Seconds a request may take including all retries"
+    )
+    RETRY_BASE_DELAY: float = Field(
+        default=0.5,
+        description="Initial retry backoff in seconds (doubles per attempt, jittered)"
+    )
+    RETRY_MAX_DELAY: float = Field(
+        default=4,
+        description="Maximum retry backoff in seconds"
+    )
+    BACKEND_CIRCUIT_FAILURE_THRESHOLD: int = Field(
+        default=3,
+        description="Consecutive backend failures that open the circuit breaker"
+    )
+    BACKEND_CIRCUIT_RESET_TIMEOUT: float = Field(
+        default=30,
+        description="Seconds the circuit stays open before a trial request"
+    )
+    POOL_SIZE: int = Field(
+        default=20,
+        description="Maximum open connections to the backend"
+    )
+    RESPONSE_CACHE_TTL: int = Field(
+        default=15,
+        description="Seconds /top and /trending results are reused (0 disables)"
+    )
+    ALERT_POLL_INTERVAL: float = Field(
+        default=5.0,
+        description="Seconds between checks for fired price alerts to deliver"
+    )
+    ALERT_SEND_RATE: float = Field(
+        default=25.0,
+        description="Most alert messages sent per second (Telegram allows about 30)"
+    )
     LOG_LEVEL: str = Field(
         default="INFO",
         description="Logging level"
@@ -38,6 +74,20 @@ class BotConfig(BaseModel):
             raise ValueError('BACKEND_URL must start with http:// or https://')
         return v.rstrip('/')  # Remove trailing slash
     
+    @validator('MAX_RETRIES', 'BACKEND_CIRCUIT_FAILURE_THRESHOLD')
+    def validate_positive_count(cls, v):
+        """Validate counts that must allow at least one attempt."""
+        if v < 1:
+            raise ValueError('must be at least 1')
+        return v
+    
+    @validator('ALERT_POLL_INTERVAL', 'ALERT_SEND_RATE')
+    def validate_alert_delivery(cls, v):
+        """Validate alert delivery pacing."""
+        if v <= 0:
+            raise ValueError('ALERT_POLL_INTERVAL and ALERT_SEND_RATE must be positive')
+        return v
+    
     @validator('LOG_LEVEL')
     def validate_log_level(cls, v):
         """Validate log level."""
@@ -53,5 +103,14 @@ config = BotConfig(
     BACKEND_URL=os.getenv('BACKEND_URL', 'http://localhost:8000'),
     REQUEST_TIMEOUT=int(os.getenv('REQUEST_TIMEOUT', '10')),
     MAX_RETRIES=int(os.getenv('MAX_RETRIES', '3')),
+    REQUEST_DEADLINE=float(os.getenv('REQUEST_DEADLINE', '20')),
+    RETRY_BASE_DELAY=float(os.getenv('RETRY_BASE_DELAY', '0.5')),
+    RETRY_MAX_DELAY=float(os.getenv('RETRY_MAX_DELAY', '4')),
+    BACKEND_CIRCUIT_FAILURE_THRESHOLD=int(os.getenv('BACKEND_CIRCUIT_FAILURE_THRESHOLD', '3')),
+    BACKEND_CIRCUIT_RESET_TIMEOUT=float(os.getenv('BACKEND_CIRCUIT_RESET_TIMEOUT', '30')),
+    POOL_SIZE=int(os.getenv('POOL_SIZE', '20')),
+    RESPONSE_CACHE_TTL=int(os.getenv('RESPONSE_CACHE_TTL', '15')),
+    ALERT_POLL_INTERVAL=float(os.getenv('ALERT_POLL_INTERVAL', '5')),
+    ALERT_SEND_RATE=float(os.getenv('ALERT_SEND_RATE', '25')),
     LOG_LEVEL=os.getenv('LOG_LEVEL', 'INFO')
 )
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+from api_client import APIClient
+from resilience import BackendError
+
+logger = logging.getLogger(__name__)
+
+# Fired alerts fetched from the backend per poll
+BATCH_SIZE = 500
+
+# Alerts listed in one message; more are summarised
+MAX_ALERTS_PER_MESSAGE = 20
+
+# Characters removed from coin symbols to keep Markdown intact
+MARKDOWN_SPECIALS = str.maketrans('', '', '*_`[')
+
+
+def format_notification(notification: dict) -> str:
+    """One line describing a fired alert."""
+    symbol = (notification.get('symbol') or f"#{notification['coin_id']}").translate(MARKDOWN_SPECIALS)
+    value = notification.get('value')
+    convert = notification.get('convert', 'USD')
+    threshold = notification['threshold']
+    if notification['kind'] == 'change':
+        return f"🚨 **{symbol}** moved {value:+.2f}% in {notification['period']} (alert: ±{threshold:g}%)"
+    direction = "above" if notification['kind'] == 'above' else "below"
+    return f"🚨 **{symbol}** is {direction} {threshold:,.8g} {convert}: now {value:,.2f} {convert}"
+
+
+class AlertNotifier:
+    """Deliver fired price alerts from the backend to their chats.
+
+    The backend queues fired alerts; every ``poll_interval`` seconds the
+    notifier takes a batch, sends each chat one message listing its
+    alerts, and acknowledges the batch once it is delivered, so alerts are
+    delivered at least once. Messages are paced to ``rate`` per second to
+    stay within Telegram's broadcast limits, and Telegram's ``retry_after``
+    is honoured.
+    """
+
+    def __init__(self, bot: Bot, client: APIClient, poll_interval: float = 5.0, rate: float = 25.0):
+        self.bot = bot
+        self.client = client
+        self.poll_interval = poll_interval
+        self.rate = rate
+        self.sent = 0
+        self.failed = 0
+        self._next_send = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"Alert notifier started (poll every {self.poll_interval}s, {self.rate} messages/s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                while await self.deliver_batch() >= BATCH_SIZE:
+                    pass  # A backlog: keep going without waiting
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Delivering alerts failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def deliver_batch(self) -> int:
+        """Deliver one batch of fired alerts; return how many there were."""
+        data = await self.client.make_request(f"/alerts/notifications?limit={BATCH_SIZE}")
+        if not data or not data.get('data') or data.get('stale'):
+            return 0
+
+        notifications = data['data']
+        by_chat: Dict[int, List[dict]] = defaultdict(list)
+        for notification in notifications:
+            by_chat[notification['user_id']].append(notification)
+        for chat_id, fired in by_chat.items():
+            lines = [format_notification(notification) for notification in fired[:MAX_ALERTS_PER_MESSAGE]]
+            if len(fired) > MAX_ALERTS_PER_MESSAGE:
+                lines.append(f"…and {len(fired) - MAX_ALERTS_PER_MESSAGE} more alerts")
+            await self._send(chat_id, "\n".join(lines))
+
+        try:
+            await self.client.send("POST", "/alerts/notifications/ack", {"up_to": notifications[-1]['seq']})
+        except BackendError as e:
+            # Not acknowledged: the batch is delivered again after the next poll interval
+            logger.error(f"Acknowledging fired alerts failed: {e}")
+            return 0
+        return len(notifications)
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        """Send one message, paced to ``rate`` messages per second."""
+        for _ in range(2):
+            delay = self._next_send - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_send = max(self._next_send, time.monotonic()) + 1.0 / self.rate
+            try:
+                await self.bot.send_message(chat_id, text, parse_mode="Markdown")
+                self.sent += 1
+                return
+            except TelegramRetryAfter as e:
+                logger.warning(f"Telegram asked to wait {e.retry_after}s before sending alerts")
+                self._next_send = time.monotonic() + e.retry_after
+            except TelegramForbiddenError:
+                logger.info(f"Chat {chat_id} blocked the bot, dropping its alerts")
+                break
+            except TelegramAPIError as e:
+                logger.error(f"Sending alerts to chat {chat_id} failed: {e}")
+                break
+        self.failed += 1
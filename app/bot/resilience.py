@@ -0,0 +1,119 @@
+import logging
+import random
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Backend statuses worth retrying: overloaded, restarting or briefly unable to reach CoinMarketCap
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+
+# Circuit breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class BackendError(Exception):
+    """A failed backend request.
+
+    Args:
+        message: Error description
+        status: HTTP status, if the backend answered
+        retryable: Whether trying again may succeed
+        retry_after: Seconds the backend asked us to wait, if any
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """Jittered exponential backoff bounded by a deadline.
+
+    Attempt ``n`` (1-based) that failed retryably is followed by a random
+    wait up to ``base_delay * 2**(n-1)``, capped at ``max_delay``. A
+    ``Retry-After`` from the backend replaces the computed wait. No retry is
+    made once ``max_attempts`` is reached or the wait would overrun the
+    command's deadline.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 4.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, error: BackendError, remaining: float) -> Optional[float]:
+        """Seconds to wait before the next attempt; ``None`` to give up.
+
+        Args:
+            attempt: Number of the attempt that just failed (1-based)
+            error: The failure
+            remaining: Seconds left until the command's deadline
+        """
+        if not error.retryable or attempt >= self.max_attempts:
+            return None
+        if error.retry_after is not None:
+            delay = error.retry_after
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        # Leave the next attempt at least a second to run
+        return delay if delay + 1 < remaining else None
+
+
+class CircuitBreaker:
+    """Fail fast while the backend is down.
+
+    After ``failure_threshold`` consecutive retryable failures the breaker
+    opens and requests are not sent at all. After ``reset_timeout`` seconds
+    one trial request is let through; its success closes the breaker, its
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; claims the trial when half-open."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Backend circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.error(f"Backend circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Give up a claimed trial without a verdict (e.g. the command was cancelled)."""
+        self._trial_running = False
@@ -1,53 +1,33 @@
-import asyncio
 import logging
-from typing import Optional
+import re
+from urllib.parse import quote
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from aiohttp import ClientSession, ClientError, ClientResponseError, ClientTimeout
+from api_client import api_client
 from config import config
+from notifier import MARKDOWN_SPECIALS
+from resilience import BackendError
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 
-class APIClient:
-    """HTTP client for backend API communication."""
-    
-    @staticmethod
-    async def make_request(endpoint: str, timeout: int = None) -> Optional[dict]:
-        """Make HTTP request to backend API with error handling."""
-        timeout_val = timeout or config.REQUEST_TIMEOUT
-        url = f"{config.BACKEND_URL}{endpoint}"
-        
-        for attempt in range(config.MAX_RETRIES):
-            try:
-                timeout_obj = ClientTimeout(total=timeout_val)
-                async with ClientSession(timeout=timeout_obj) as session:
-                    logger.debug(f"Making request to: {url} (attempt {attempt + 1})")
-                    async with session.get(url) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            logger.debug(f"Successful response from {endpoint}")
-                            return data
-                        elif response.status == 404:
-                            logger.warning(f"Resource not found: {endpoint}")
-                            return None
-                        else:
-                            logger.error(f"HTTP {response.status} from {endpoint}")
-                            return None
-            except ClientResponseError as e:
-                logger.error(f"Response error (attempt {attempt + 1}): {e}")
-            except ClientError as e:
-                logger.error(f"Client error (attempt {attempt + 1}): {e}")
-            except Exception as e:
-                logger.error(f"Unexpected error (attempt {attempt + 1}): {e}")
-            
-            if attempt < config.MAX_RETRIES - 1:
-                await asyncio.sleep(1)  # Wait before retry
-        
-        return None
+# Only the fields the list views render
+LIST_FIELDS = "name,symbol,quote.USD.price,quote.USD.percent_change_24h"
+
+# Bars per indicator window of /analyze
+ANALYZE_WINDOW = 14
+
+UNAVAILABLE_TEXT = "⚠️ The data service is temporarily unavailable. Please try again in a minute."
+
+
+def stale_note(data: dict) -> str:
+    """Footnote for answers served from the last good response while the backend is down."""
+    if data.get('stale'):
+        return "\n\n⚠️ _Data service unavailable, showing the last known data_"
+    return ""
 
 
 def format_crypto_data(data: dict, detailed: bool = False) -> str:
@@ -113,7 +93,10 @@ async def start_command(message: Message):
         "• /top - Get top 10 cryptocurrencies\n"
         "• /crypto <id> - Get specific crypto by ID\n"
         "• /search <name> - Search for crypto by name\n"
-        "• /trending - Get trending cryptocurrencies\n\n"
+        "• /trending - Get trending cryptocurrencies\n"
+        "• /analyze <id> - Technical indicators of a crypto\n"
+        "• /alert <id> above <price> - Price alerts\n"
+        "• /watchlist, /portfolio - Your coins and holdings\n\n"
         "💡 **Examples:**\n"
         "• /crypto 1 - Get Bitcoin data\n"
         "• /crypto 1027 - Get Ethereum data\n"
@@ -133,12 +116,22 @@ async def help_command(message: Message):
         "🪙 **/crypto <id>** - Get detailed crypto data by CoinMarketCap ID\n"
         "🔍 **/search <name>** - Search cryptocurrencies by name\n"
         "🔥 **/trending** - Get trending cryptocurrencies\n"
+        "📐 **/analyze <id> [interval]** - SMA, EMA, RSI and volatility (default interval: 1h)\n"
+        "🔔 **/alert <id> above|below <price>** - Get notified when a price is reached\n"
+        "🔔 **/alert <id> change <percent> [1h|24h|7d]** - Get notified of a large move\n"
+        "📋 **/alerts** - List your price alerts; **/unalert <alert id>** deletes one\n"
+        "👀 **/watchlist [add|remove <id>]** - Show or change your watchlist\n"
+        "💼 **/portfolio [set <id> <quantity> | remove <id>]** - Value or change your portfolio\n"
         "ℹ️ **/help** - Show this help message\n\n"
         "💡 **Usage Examples:**\n"
         "• `/top` - Top 10 cryptocurrencies\n"
         "• `/top 5` - Top 5 cryptocurrencies\n"
         "• `/crypto 1` - Bitcoin details\n"
-        "• `/crypto 1027` - Ethereum details\n\n"
+        "• `/crypto 1027` - Ethereum details\n"
+        "• `/search solana` - Find Solana's ID\n"
+        "• `/analyze 1 4h` - Bitcoin indicators on 4h bars\n"
+        "• `/alert 1 above 100000` - Alert when Bitcoin reaches $100,000\n"
+        "• `/portfolio set 1 0.5` - Hold 0.5 Bitcoin in your portfolio\n\n"
         "📊 **Popular Crypto IDs:**\n"
         "• Bitcoin (BTC): 1\n"
         "• Ethereum (ETH): 1027\n"
@@ -165,9 +158,16 @@ async def top_command(message: Message):
         
         await message.answer("🔄 Fetching top cryptocurrencies...")
         
-        data = await APIClient.make_request(f"/cryptocurrency/?limit={limit}")
+        # Every /top shares one cached top-100 request; smaller limits are sliced from it
+        data = await api_client.make_request(
+            f"/cryptocurrency/?limit=100&fields={LIST_FIELDS}",
+            cache_ttl=config.RESPONSE_CACHE_TTL
+        )
         
         if not data or 'data' not in data or not data['data']:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
             await message.answer("❌ Sorry, I couldn't fetch cryptocurrency data right now. Please try again later.")
             return
         
@@ -190,6 +190,7 @@ async def top_command(message: Message):
         
         if len(response) > 4000:  # Telegram message limit
             response = response[:3900] + "\n\n... (truncated)"
+        response += stale_note(data)
         
         await message.answer(response, parse_mode="Markdown")
     
@@ -218,14 +219,17 @@ async def crypto_command(message: Message):
         
         await message.answer(f"🔄 Fetching data for cryptocurrency #{currency_id}...")
         
-        data = await APIClient.make_request(f"/cryptocurrency/{currency_id}")
+        data = await api_client.make_request(f"/cryptocurrency/{currency_id}")
         
         if not data or 'data' not in data:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
             await message.answer(f"❌ Cryptocurrency with ID {currency_id} not found. Please check the ID and try again.")
             return
         
         crypto_data = data['data']
-        formatted_data = format_crypto_data(crypto_data, detailed=True)
+        formatted_data = format_crypto_data(crypto_data, detailed=True) + stale_note(data)
         
         await message.answer(formatted_data, parse_mode="Markdown")
     
@@ -236,25 +240,79 @@ async def crypto_command(message: Message):
         await message.answer("❌ An error occurred while fetching data. Please try again later.")
 
 
+@router.message(Command('search'))
+async def search_command(message: Message):
+    """Handle /search command to find cryptocurrencies by name or symbol."""
+    try:
+        parts = message.text.split(maxsplit=1)
+        if len(parts) < 2 or not parts[1].strip():
+            await message.answer(
+                "❌ **Usage:** `/search <name>`\n\n"
+                "**Examples:**\n"
+                "• `/search bitcoin` - Find Bitcoin\n"
+                "• `/search eth` - Find by symbol",
+                parse_mode="Markdown"
+            )
+            return
+        
+        query = parts[1].strip()[:64]
+        shown_query = query.translate(str.maketrans('', '', '*_`['))  # Keep Markdown intact
+        
+        data = await api_client.make_request(f"/cryptocurrency/search?q={quote(query)}&limit=10")
+        
+        if data is None or 'data' not in data:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
+            await message.answer("❌ Sorry, I couldn't search right now. Please try again later.")
+            return
+        
+        results = data['data']
+        if not results:
+            await message.answer(f"🔍 No cryptocurrencies found for \"{shown_query}\".")
+            return
+        
+        response = f"🔍 **Results for \"{shown_query}\":**\n\n"
+        
+        for crypto in results:
+            name = crypto.get('name', 'Unknown')
+            symbol = crypto.get('symbol', '')
+            rank = crypto.get('cmc_rank') or 'N/A'
+            response += f"• **{name} ({symbol})** - #{rank}, ID `{crypto.get('id')}`\n"
+        
+        response += "\n💡 Use `/crypto <id>` for details"
+        response += stale_note(data)
+        
+        await message.answer(response, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in search_command: {e}")
+        await message.answer("❌ An error occurred while searching. Please try again later.")
+
+
 @router.message(Command('trending'))
 async def trending_command(message: Message):
     """Handle /trending command - show top 5 with highest 24h change."""
     try:
         await message.answer("🔥 Fetching trending cryptocurrencies...")
         
-        data = await APIClient.make_request("/cryptocurrency/?limit=50")
+        # Rank the top 50 by 24h change on the backend and only download the 5 winners
+        data = await api_client.make_request(
+            f"/cryptocurrency/?limit=5&sort=percent_change_24h&order=desc&max_rank=50&fields={LIST_FIELDS}",
+            cache_ttl=config.RESPONSE_CACHE_TTL
+        )
         
         if not data or 'data' not in data or not data['data']:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
             await message.answer("❌ Sorry, I couldn't fetch trending data right now. Please try again later.")
             return
         
-        # Sort by 24h percent change (highest first)
-        cryptos = data['data']
-        trending = sorted(
-            [c for c in cryptos if c.get('quote', {}).get('USD', {}).get('percent_change_24h') is not None],
-            key=lambda x: x.get('quote', {}).get('USD', {}).get('percent_change_24h', 0),
-            reverse=True
-        )[:5]
+        trending = [
+            c for c in data['data']
+            if c.get('quote', {}).get('USD', {}).get('percent_change_24h') is not None
+        ]
         
         if not trending:
             await message.answer("❌ No trending data available right now.")
@@ -265,6 +323,7 @@ async def trending_command(message: Message):
         for i, crypto in enumerate(trending, 1):
             formatted = format_crypto_data(crypto, detailed=False)
             response += f"{i}. {formatted}\n\n"
+        response += stale_note(data)
         
         await message.answer(response, parse_mode="Markdown")
     
@@ -273,6 +332,357 @@ async def trending_command(message: Message):
         await message.answer("❌ An error occurred while fetching trending data. Please try again later.")
 
 
+@router.message(Command('analyze'))
+async def analyze_command(message: Message):
+    """Handle /analyze command - technical indicators of one cryptocurrency."""
+    try:
+        parts = message.text.split()
+        interval = parts[2].lower() if len(parts) > 2 else "1h"
+        if len(parts) < 2 or not parts[1].isdigit() or not re.fullmatch(r"\d+[mhd]", interval):
+            await message.answer(
+                "❌ **Usage:** `/analyze <id> [interval]`\n\n"
+                "**Examples:**\n"
+                "• `/analyze 1` - Bitcoin on hourly bars\n"
+                "• `/analyze 1027 1d` - Ethereum on daily bars",
+                parse_mode="Markdown"
+            )
+            return
+        
+        currency_id = int(parts[1])
+        
+        data = await api_client.make_request(
+            f"/cryptocurrency/{currency_id}/indicators?kind=sma,ema,rsi,volatility"
+            f"&window={ANALYZE_WINDOW}&interval={interval}",
+            cache_ttl=config.RESPONSE_CACHE_TTL
+        )
+        
+        if not data or 'latest' not in data:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
+            await message.answer("❌ Sorry, no price history is available for this cryptocurrency yet.")
+            return
+        
+        latest = data['latest']
+        if latest.get('close') is None:
+            await message.answer(f"❌ No price history recorded for cryptocurrency #{currency_id} yet.")
+            return
+        
+        def price(value):
+            return f"${value:,.2f}" if value is not None else "N/A (not enough history)"
+        
+        response = f"📐 **Analysis of #{currency_id} ({interval} bars, {ANALYZE_WINDOW}-bar window):**\n\n"
+        response += f"💰 Close: {price(latest['close'])}\n"
+        response += f"📊 SMA: {price(latest.get('sma'))}\n"
+        response += f"📈 EMA: {price(latest.get('ema'))}\n"
+        
+        rsi = latest.get('rsi')
+        if rsi is None:
+            response += "⚖️ RSI: N/A (not enough history)\n"
+        else:
+            hint = " - overbought" if rsi > 70 else " - oversold" if rsi < 30 else ""
+            response += f"⚖️ RSI: {rsi:.1f}{hint}\n"
+        
+        volatility = latest.get('volatility')
+        response += (
+            f"🌊 Volatility (annualised): {volatility * 100:.1f}%"
+            if volatility is not None else "🌊 Volatility: N/A (not enough history)"
+        )
+        response += stale_note(data)
+        
+        await message.answer(response, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in analyze_command: {e}")
+        await message.answer("❌ An error occurred while analyzing. Please try again later.")
+
+
+ALERT_USAGE = (
+    "❌ **Usage:**\n"
+    "• `/alert <id> above <price>`\n"
+    "• `/alert <id> below <price>`\n"
+    "• `/alert <id> change <percent> [1h|24h|7d]`\n\n"
+    "**Examples:**\n"
+    "• `/alert 1 above 100000` - Bitcoin reaches $100,000\n"
+    "• `/alert 1027 change 5 1h` - Ethereum moves 5% within an hour"
+)
+
+
+def format_alert(alert: dict) -> str:
+    """One line describing a pending alert."""
+    if alert['kind'] == 'change':
+        condition = f"moves ±{alert['threshold']:g}% in {alert['period']}"
+    else:
+        condition = f"{alert['kind']} {alert['threshold']:,.8g} {alert['convert']}"
+    return f"• `{alert['id']}` - #{alert['coin_id']} {condition}"
+
+
+@router.message(Command('alert'))
+async def alert_command(message: Message):
+    """Handle /alert command - create a price alert for this chat."""
+    parts = message.text.split()
+    kind = parts[2].lower() if len(parts) > 3 else ""
+    try:
+        threshold = float(parts[3].replace(',', '').rstrip('%')) if len(parts) > 3 else 0.0
+    except ValueError:
+        threshold = 0.0
+    if not parts[1:2] or not parts[1].isdigit() or kind not in ('above', 'below', 'change') or threshold <= 0:
+        await message.answer(ALERT_USAGE, parse_mode="Markdown")
+        return
+    
+    payload = {
+        "user_id": message.chat.id,
+        "coin_id": int(parts[1]),
+        "kind": kind,
+        "threshold": threshold,
+        "period": parts[4].lower() if kind == 'change' and len(parts) > 4 else None,
+    }
+    try:
+        data = await api_client.send("POST", "/alerts", payload)
+    except BackendError as e:
+        if e.status == 400:
+            await message.answer(f"❌ {e}")
+        else:
+            await message.answer(UNAVAILABLE_TEXT)
+        return
+    except Exception as e:
+        logger.error(f"Error in alert_command: {e}")
+        await message.answer("❌ An error occurred while creating the alert. Please try again later.")
+        return
+    
+    if not data:
+        await message.answer("❌ Price alerts are not enabled on this server.")
+        return
+    
+    alert = data['data']
+    symbol = (data.get('symbol') or '').translate(MARKDOWN_SPECIALS)
+    price = data.get('price')
+    response = f"🔔 **Alert set for {symbol}:**\n{format_alert(alert)}\n"
+    if price is not None:
+        response += f"\n💰 Current price: ${price:,.2f}"
+    response += "\n\n💡 Alerts fire once; see yours with /alerts"
+    await message.answer(response, parse_mode="Markdown")
+
+
+@router.message(Command('alerts'))
+async def alerts_command(message: Message):
+    """Handle /alerts command - list this chat's pending alerts."""
+    try:
+        data = await api_client.make_request(f"/alerts?user_id={message.chat.id}")
+        
+        if not data or 'data' not in data or data.get('stale'):
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
+            await message.answer("❌ Price alerts are not enabled on this server.")
+            return
+        
+        alerts = data['data']
+        if not alerts:
+            await message.answer("🔕 You have no price alerts. Create one with `/alert <id> above <price>`.",
+                                 parse_mode="Markdown")
+            return
+        
+        response = f"🔔 **Your price alerts ({len(alerts)}):**\n\n"
+        response += "\n".join(format_alert(alert) for alert in alerts)
+        response += "\n\n💡 Delete one with `/unalert <alert id>`"
+        await message.answer(response, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in alerts_command: {e}")
+        await message.answer("❌ An error occurred while fetching your alerts. Please try again later.")
+
+
+@router.message(Command('unalert'))
+async def unalert_command(message: Message):
+    """Handle /unalert command - delete one of this chat's alerts."""
+    parts = message.text.split()
+    if len(parts) < 2 or not parts[1].isdigit():
+        await message.answer("❌ **Usage:** `/unalert <alert id>`\n\n💡 Use /alerts to see alert IDs",
+                             parse_mode="Markdown")
+        return
+    
+    alert_id = int(parts[1])
+    try:
+        data = await api_client.send("DELETE", f"/alerts/{alert_id}?user_id={message.chat.id}")
+    except BackendError:
+        await message.answer(UNAVAILABLE_TEXT)
+        return
+    except Exception as e:
+        logger.error(f"Error in unalert_command: {e}")
+        await message.answer("❌ An error occurred while deleting the alert. Please try again later.")
+        return
+    
+    if not data:
+        await message.answer(f"❌ Alert {alert_id} not found.")
+        return
+    await message.answer(f"🗑 Alert {alert_id} deleted.")
+
+
+def _sub_command(message: Message) -> list:
+    """Words after the command, the first (sub-command) lowercased."""
+    parts = message.text.split()[1:]
+    if parts:
+        parts[0] = parts[0].lower()
+    return parts
+
+
+async def _update_list(message: Message, method: str, endpoint: str, payload: dict = None) -> dict:
+    """Send a watchlist/portfolio change; answer errors and return None on failure."""
+    try:
+        data = await api_client.send(method, endpoint, payload)
+    except BackendError as e:
+        if e.status == 400:
+            await message.answer(f"❌ {e}")
+        else:
+            await message.answer(UNAVAILABLE_TEXT)
+        return None
+    if not data:
+        # 404: the coin is not in the list, or the server has these lists disabled
+        await message.answer("❌ That coin is not in your list." if method == "DELETE"
+                             else "❌ Watchlists and portfolios are not enabled on this server.")
+    return data
+
+
+@router.message(Command('watchlist'))
+async def watchlist_command(message: Message):
+    """Handle /watchlist command - show or change this chat's watchlist."""
+    try:
+        parts = _sub_command(message)
+        endpoint = f"/users/{message.chat.id}/watchlist"
+        if parts and parts[0] in ('add', 'remove') and len(parts) > 1 and parts[1].isdigit():
+            currency_id = int(parts[1])
+            if parts[0] == 'add':
+                data = await _update_list(message, "PUT", f"{endpoint}/{currency_id}")
+                if data:
+                    added = "added to" if data.get('added') else "already in"
+                    await message.answer(f"👀 #{currency_id} {added} your watchlist.")
+            else:
+                data = await _update_list(message, "DELETE", f"{endpoint}/{currency_id}")
+                if data:
+                    await message.answer(f"🗑 #{currency_id} removed from your watchlist.")
+            return
+        if parts:
+            await message.answer(
+                "❌ **Usage:** `/watchlist [add|remove <id>]`\n\n"
+                "**Examples:**\n"
+                "• `/watchlist` - Show your watchlist\n"
+                "• `/watchlist add 1027` - Watch Ethereum",
+                parse_mode="Markdown"
+            )
+            return
+        
+        data = await api_client.make_request(endpoint)
+        
+        if not data or 'data' not in data:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
+            await message.answer("❌ Watchlists are not enabled on this server.")
+            return
+        
+        if not data['data']:
+            await message.answer("👀 Your watchlist is empty. Add a coin with `/watchlist add <id>`.",
+                                 parse_mode="Markdown")
+            return
+        
+        response = "👀 **Your watchlist:**\n\n"
+        for crypto in data['data']:
+            name = crypto.get('name', 'Unknown')
+            symbol = crypto.get('symbol', '')
+            price = crypto.get('price')
+            change = crypto.get('percent_change_24h')
+            price_str = f"${price:,.2f}" if price is not None else "N/A"
+            change_str = f"{change:+.2f}%" if change is not None else "N/A"
+            change_emoji = "📈" if change and change > 0 else "📉" if change and change < 0 else "➡️"
+            response += f"🪙 **{name} ({symbol})** `{crypto.get('id')}`: {price_str} {change_emoji} {change_str}\n"
+        if data.get('missing'):
+            response += f"\n⚠️ No longer listed: {', '.join(map(str, data['missing']))}"
+        response += stale_note(data)
+        
+        await message.answer(response, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in watchlist_command: {e}")
+        await message.answer("❌ An error occurred while fetching your watchlist. Please try again later.")
+
+
+@router.message(Command('portfolio'))
+async def portfolio_command(message: Message):
+    """Handle /portfolio command - show or change this chat's portfolio."""
+    try:
+        parts = _sub_command(message)
+        endpoint = f"/users/{message.chat.id}/portfolio"
+        if parts and parts[0] == 'set' and len(parts) > 2 and parts[1].isdigit():
+            currency_id = int(parts[1])
+            try:
+                quantity = float(parts[2].replace(',', ''))
+            except ValueError:
+                quantity = 0.0
+            if quantity <= 0:
+                await message.answer("❌ Please provide a positive quantity, e.g. `/portfolio set 1 0.5`.",
+                                     parse_mode="Markdown")
+                return
+            data = await _update_list(message, "PUT", f"{endpoint}/{currency_id}", {"quantity": quantity})
+            if data:
+                await message.answer(f"💼 Holding of #{currency_id} set to {quantity:,.8g}.")
+            return
+        if parts and parts[0] == 'remove' and len(parts) > 1 and parts[1].isdigit():
+            currency_id = int(parts[1])
+            data = await _update_list(message, "DELETE", f"{endpoint}/{currency_id}")
+            if data:
+                await message.answer(f"🗑 #{currency_id} removed from your portfolio.")
+            return
+        if parts:
+            await message.answer(
+                "❌ **Usage:** `/portfolio [set <id> <quantity> | remove <id>]`\n\n"
+                "**Examples:**\n"
+                "• `/portfolio` - Value your portfolio\n"
+                "• `/portfolio set 1 0.5` - Hold 0.5 Bitcoin",
+                parse_mode="Markdown"
+            )
+            return
+        
+        data = await api_client.make_request(endpoint)
+        
+        if not data or 'data' not in data:
+            if not api_client.available:
+                await message.answer(UNAVAILABLE_TEXT)
+                return
+            await message.answer("❌ Portfolios are not enabled on this server.")
+            return
+        
+        if not data['data']:
+            await message.answer("💼 Your portfolio is empty. Add a holding with `/portfolio set <id> <quantity>`.",
+                                 parse_mode="Markdown")
+            return
+        
+        change = data.get('percent_change_24h')
+        change_emoji = "📈" if change and change > 0 else "📉" if change and change < 0 else "➡️"
+        response = f"💼 **Your portfolio: ${data['total_value']:,.2f}**\n"
+        if change is not None:
+            response += f"{change_emoji} 24h: {data['change_24h']:+,.2f} ({change:+.2f}%)\n"
+        response += "\n"
+        for holding in data['data']:
+            value = holding.get('value')
+            weight = holding.get('weight')
+            value_str = f"${value:,.2f}" if value is not None else "N/A"
+            weight_str = f" ({weight:.1f}%)" if weight is not None else ""
+            response += (
+                f"🪙 **{holding.get('symbol', '')}** `{holding.get('id')}`: "
+                f"{holding['quantity']:,.8g} = {value_str}{weight_str}\n"
+            )
+        if data.get('missing'):
+            response += f"\n⚠️ No longer listed: {', '.join(map(str, data['missing']))}"
+        response += stale_note(data)
+        
+        await message.answer(response, parse_mode="Markdown")
+    
+    except Exception as e:
+        logger.error(f"Error in portfolio_command: {e}")
+        await message.answer("❌ An error occurred while valuing your portfolio. Please try again later.")
+
+
 # Legacy command for backward compatibility
 @router.message(Command('crypto_id'))
 async def crypto_id_command(message: Message):